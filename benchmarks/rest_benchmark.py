@@ -0,0 +1,202 @@
+'''
+Benchmarks binance REST clients against a local mock Binance server: sequential
+and concurrent get_klines, duplicate concurrent get_symbol_info calls, and requests
+while the server fails some of them with 503s. Requests, request weight and
+connections seen by the server and failed calls are reported next to timings. Results are written as JSON like run_benchmarks.py
+does and can be compared the same way.
+
+    python benchmarks/rest_benchmark.py --requests 500 --output rest.json
+    python benchmarks/rest_benchmark.py --compare rest.json
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'crypto_tradebot'))
+sys.path.insert(0, BENCH_DIR)
+
+from binance.client import Client
+from rest_client import RateLimitedClient
+from run_benchmarks import git_commit, compare
+from synthetic import synthetic_klines
+
+KLINES = json.dumps(synthetic_klines(500)).encode()
+EXCHANGE_INFO = json.dumps({'symbols': [{'symbol': 'ETHUSDT', 'baseAsset': 'ETH', 'quoteAsset': 'USDT', 'filters': []}]}).encode()
+WEIGHTS = {'klines': 2, 'exchangeInfo': 20}
+
+
+class MockBinance(ThreadingHTTPServer):
+    '''
+    Binance REST API stand-in answering ping, klines and exchange info after a fixed
+    latency, with used weight headers of the current minute. Every fail_every-th
+    request gets a 503. Scripted (status, headers) are sent in place of the next
+    requests' ones, one per request. Paths with query strings are kept in log.
+    '''
+    daemon_threads = True
+
+    def __init__(self, latency=0.005, fail_every=0):
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, fail_every=0):
+        with self.lock:
+            self.fail_every = fail_every
+            self.requests = 0
+            self.connections = 0
+            self.weight = 0
+            self.minute = 0
+            self.script = []
+            self.log = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/api'.format(self.server_address[1])
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        server = self.server
+        # Body of POST requests is read so the connection can be reused
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            minute = int(time.time()//60)
+            if minute != server.minute:
+                server.minute = minute
+                server.weight = 0
+            server.weight += WEIGHTS.get(path.rsplit('/', 1)[-1], 1)
+            fail = server.fail_every and server.requests % server.fail_every == 0
+            weight = server.weight
+            server.log.append(self.path)
+            scripted = server.script.pop(0) if server.script else None
+        time.sleep(server.latency)
+        status, body = 200, b'{}'
+        headers = {'x-mbx-used-weight-1m': str(weight)}
+        if fail:
+            status, body = 503, b'{"code": -1003, "msg": "Service unavailable"}'
+        elif path.endswith('/klines'):
+            body = KLINES
+        elif path.endswith('/exchangeInfo'):
+            body = EXCHANGE_INFO
+        if scripted is not None:
+            status, scripted_headers = scripted
+            headers.update(scripted_headers)
+            if status != 200:
+                body = b'{"code": -1003, "msg": "Scripted error"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+    do_DELETE = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+'''
+Returns a client of given class talking to the mock server
+'''
+def mock_client(cls, server):
+    client = type('Mock' + cls.__name__, (cls,), {'API_URL': server.url})()
+    # Retries back off for milliseconds, not seconds. Mock server never bans, waiting
+    # for the next minute would only be measured, spent weight is reported instead.
+    if isinstance(client, RateLimitedClient):
+        client.backoff = 0.001
+        client.max_backoff = 0.01
+        client.weight_limit = 10**9
+    return client
+
+
+'''
+Runs calls on given number of threads. Returns (seconds, failed calls).
+'''
+def run_calls(calls, threads):
+    failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        for future in [executor.submit(call) for call in calls]:
+            try:
+                future.result()
+            except Exception:
+                failed += 1
+    return time.perf_counter() - start, failed
+
+
+def scenarios(n):
+    # Distinct requests, identical ones would be coalesced
+    klines = lambda client: [lambda i=i: client.get_klines(symbol='ETHUSDT', interval='1m', startTime=i) for i in range(n)]
+    symbol_info = lambda client: [lambda: client.get_symbol_info('ETHUSDT')]*n
+    return [
+        ('sequential_klines', klines, 1, 0),
+        ('concurrent_klines', klines, 16, 0),
+        ('duplicate_symbol_info', symbol_info, 32, 0),
+        ('klines_with_errors', klines, 8, 10),
+    ]
+
+
+def run(n, latency):
+    server = MockBinance(latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = []
+    try:
+        for name, calls, threads, fail_every in scenarios(n):
+            for cls in (Client, RateLimitedClient):
+                server.reset(fail_every)
+                client = mock_client(cls, server)
+                seconds, failed = run_calls(calls(client), threads)
+                label = 'rest.{}.{}'.format(name, cls.__name__)
+                results.append({'name': label, 'size': n, 'best': seconds, 'mean': seconds, 'repeat': 1,
+                                'requests': server.requests, 'weight': server.weight, 'connections': server.connections, 'failed': failed})
+                print('{:<52}{:>10.4f}s requests={:<6} weight={:<6} connections={:<4} failed={}'.format(
+                    label, seconds, server.requests, server.weight, server.connections, failed))
+                client.session.close()
+    finally:
+        server.shutdown()
+    return {'commit': git_commit(), 'time': time.time(), 'python': platform.python_version(), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark REST clients against a local mock Binance server.')
+    parser.add_argument('--requests', type=int, default=500, help='Calls per scenario')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds the mock server takes per request')
+    parser.add_argument('--output', help='JSON file to write results to, bench_results/rest-<commit>.json by default')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    report = run(args.requests, args.latency)
+    output = args.output or os.path.join('bench_results', 'rest-' + (report['commit'] or 'unknown')[:12] + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to', output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
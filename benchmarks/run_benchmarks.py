@@ -0,0 +1,156 @@
+'''
+Benchmarks strategy, backtest and data ingest hot paths on synthetic klines.
+Results are written as JSON, tagged with the current git commit, so runs on
+different commits can be compared with --compare.
+
+    python benchmarks/run_benchmarks.py --sizes 1000 100000 --output base.json
+    python benchmarks/run_benchmarks.py --sizes 1000 100000 --compare base.json
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'crypto_tradebot'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+import indicators
+from indicator_cache import default_cache
+from signals import crossover_signals, threshold_signals, position_sizes
+from strategy import Strategy
+from backtest import run_backtest
+from kline_store import KlineStore, klines_to_frame
+from user import User
+from synthetic import synthetic_frame, synthetic_klines, FakeClient
+
+DEFAULT_SIZES = [1000, 100000, 10000000]
+# Building get_klines rows is slow in itself, ingest benchmarks are capped at this size
+MAX_INGEST_SIZE = 1000000
+# Market buy/sell round trips per order path benchmark
+ORDER_ROUNDS = 1000
+
+
+'''
+Returns (best, mean) seconds of calling fn repeat times, setup runs before each call untimed
+'''
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times)/len(times)
+
+
+'''
+Returns (name, function, setup) of benchmarks on n klines
+'''
+def size_benchmarks(n, workdir):
+    df = synthetic_frame(n)
+    closes = df.close.to_numpy()
+    macd, signal, _ = indicators.macd(closes)
+    rsi = indicators.rsi(closes, 15)
+    sma_fast, sma_slow = indicators.sma(closes, 12), indicators.sma(closes, 50)
+    macd_codes = crossover_signals(macd, signal)
+    fractions = position_sizes(macd_codes, rsi)/100
+    benchmarks = [
+        ('indicator.sma', lambda: indicators.sma(closes, 12), None),
+        ('indicator.ema', lambda: indicators.ema(closes, 26), None),
+        ('indicator.rsi', lambda: indicators.rsi(closes, 15), None),
+        ('indicator.macd', lambda: indicators.macd(closes, 12, 26, 9), None),
+        ('signals.macd_crossover', lambda: crossover_signals(macd, signal), None),
+        ('signals.sma_crossover', lambda: crossover_signals(sma_fast, sma_slow), None),
+        ('signals.rsi_overbought', lambda: threshold_signals(rsi, 30, 70), None),
+        ('strategy.macd_crossover', lambda: Strategy('MACD', 'CROSSOVER', 'ETHUSDT', '1m', df), default_cache.clear),
+        ('strategy.sma_crossover', lambda: Strategy('SMA', 'CROSSOVER', 'ETHUSDT', '1m', df), default_cache.clear),
+        ('strategy.rsi_overbought', lambda: Strategy('RSI', 'OVERBOUGHT', 'ETHUSDT', '1m', df), default_cache.clear),
+        ('backtest.all_in', lambda: run_backtest(closes, macd_codes, 1000), None),
+        ('backtest.rsi_sized', lambda: run_backtest(closes, macd_codes, 1000, fractions), None),
+    ]
+    if n <= MAX_INGEST_SIZE:
+        klines = synthetic_klines(n)
+        store = KlineStore(os.path.join(workdir, str(n)))
+        store.append('ETHUSDT', '1m', klines)
+        benchmarks += [
+            ('ingest.klines_to_frame', lambda: klines_to_frame(klines), None),
+            ('ingest.store_load_frame', lambda: store.load_frame('ETHUSDT', '1m'), None),
+        ]
+    return benchmarks
+
+
+'''
+Market buy and sell round trips through User with an in-memory client
+'''
+def order_path():
+    user = User(FakeClient())
+    for _ in range(ORDER_ROUNDS):
+        user.buy_market('ETHUSDT', 30)
+        user.sell_market('ETHUSDT', 50, 1000.0)
+
+
+'''
+Returns current git commit hash, None outside a git checkout
+'''
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            for name, fn, setup in size_benchmarks(n, workdir):
+                best, mean = measure(fn, repeat, setup)
+                results.append({'name': name, 'size': n, 'best': best, 'mean': mean, 'repeat': repeat})
+                print('{:<28}{:>10}{:>12.6f}s'.format(name, n, best))
+    best, mean = measure(order_path, repeat)
+    results.append({'name': 'orders.buy_sell', 'size': ORDER_ROUNDS, 'best': best, 'mean': mean, 'repeat': repeat})
+    print('{:<28}{:>10}{:>12.6f}s'.format('orders.buy_sell', ORDER_ROUNDS, best))
+    return {'commit': git_commit(), 'time': time.time(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'results': results}
+
+
+'''
+Prints best time ratios of current results against a previous run, >1 means slower now
+'''
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['name'], r['size']): r['best'] for r in json.load(f)['results']}
+    print('Compared to', baseline_path)
+    for r in report['results']:
+        key = (r['name'], r['size'])
+        if key in baseline:
+            print('{:<28}{:>10}{:>10.2f}x'.format(r['name'], r['size'], r['best']/baseline[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark strategy, backtest and ingest hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Numbers of synthetic klines')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark, best one is reported')
+    parser.add_argument('--output', help='JSON file to write results to, bench_results/<commit>.json by default')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat)
+    output = args.output or os.path.join('bench_results', (report['commit'] or 'unknown')[:12] + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to', output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Measures live bot startup in fresh interpreters: importing main.py, and launch to
+the first trading decision with an in-memory client. Results are written as JSON
+like run_benchmarks.py does and can be compared the same way.
+
+    python benchmarks/startup.py --repeat 10 --output startup.json
+    python benchmarks/startup.py --compare startup.json
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.join(BENCH_DIR, '..', 'crypto_tradebot')
+sys.path.insert(0, BENCH_DIR)
+
+from run_benchmarks import git_commit, compare
+
+# Runs in a fresh interpreter, prints seconds spent in each phase as JSON
+FIRST_DECISION = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {bench_dir!r})
+import main
+imported = time.perf_counter()
+from synthetic import synthetic_klines, FakeClient
+klines = synthetic_klines(301)
+client = FakeClient(klines[:300])
+ready = time.perf_counter()
+bot = main.TradeBot(main.User(client), 'ETHUSDT', '1m', '1h', verbose=False)
+bot.seed_indicators()
+client.klines = klines
+bot.backfill()
+decided = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'first_decision': decided - ready}}))
+'''
+
+
+'''
+Runs code in a fresh interpreter from the bot directory, returns (wall seconds, stdout)
+'''
+def run_fresh(code):
+    start = time.perf_counter()
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=BOT_DIR, text=True)
+    return time.perf_counter() - start, out
+
+
+def run(repeat):
+    samples = {'interpreter': [], 'process.import_main': [], 'process.first_decision': [],
+               'import_main': [], 'first_decision': []}
+    code = FIRST_DECISION.format(bench_dir=BENCH_DIR)
+    for _ in range(repeat):
+        samples['interpreter'].append(run_fresh('pass')[0])
+        samples['process.import_main'].append(run_fresh('import main')[0])
+        wall, out = run_fresh(code)
+        phases = json.loads(out)
+        samples['process.first_decision'].append(wall)
+        samples['import_main'].append(phases['import'])
+        samples['first_decision'].append(phases['first_decision'])
+    results = []
+    for name, times in samples.items():
+        results.append({'name': 'startup.' + name, 'size': 1, 'best': min(times), 'mean': sum(times)/len(times), 'repeat': repeat})
+        print('{:<36}{:>12.6f}s'.format('startup.' + name, min(times)))
+    return {'commit': git_commit(), 'time': time.time(), 'python': platform.python_version(), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark live bot startup in fresh interpreters.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement, best one is reported')
+    parser.add_argument('--output', help='JSON file to write results to, bench_results/startup-<commit>.json by default')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    output = args.output or os.path.join('bench_results', 'startup-' + (report['commit'] or 'unknown')[:12] + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to', output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
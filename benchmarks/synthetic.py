@@ -0,0 +1,129 @@
+import numpy as np
+from intervals import interval_to_ms
+
+# Open time of the first synthetic kline, 2021-01-01 UTC
+START_TIME = 1609459200000
+
+
+'''
+Returns open, high, low, close, volume arrays of n klines following a geometric
+random walk, reproducible for a given seed.
+'''
+def synthetic_ohlcv(n, seed=0, price=1000.0):
+    rng = np.random.default_rng(seed)
+    close = price*np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.empty(n)
+    open_[0] = price
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0, 0.0005, n))*close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.gamma(2.0, 50.0, n)
+    return open_, high, low, close, volume
+
+
+'''
+Returns n synthetic klines as a dataframe indexed by open time, the format Strategy expects.
+'''
+def synthetic_frame(n, seed=0, interval_ms=60000):
+    # Not imported at module level so startup benchmarks can use the fake client without pandas
+    import pandas as pd
+    open_, high, low, close, volume = synthetic_ohlcv(n, seed)
+    df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume})
+    df.index = pd.to_datetime(START_TIME + np.arange(n, dtype=np.int64)*interval_ms, unit='ms')
+    df.index.name = 'date'
+    return df
+
+
+'''
+Returns n synthetic klines in get_klines format, prices as strings like the API sends them.
+'''
+def synthetic_klines(n, seed=0, interval_ms=60000, start_time=START_TIME):
+    open_, high, low, close, volume = synthetic_ohlcv(n, seed)
+    klines = []
+    for i in range(n):
+        open_time = start_time + i*interval_ms
+        klines.append([open_time, '%.8f' % open_[i], '%.8f' % high[i], '%.8f' % low[i], '%.8f' % close[i],
+                       '%.8f' % volume[i], open_time + interval_ms - 1, '%.8f' % (volume[i]*close[i]), 100,
+                       '%.8f' % (volume[i]/2), '%.8f' % (volume[i]*close[i]/2), '0'])
+    return klines
+
+
+'''
+Aggregates klines to a longer interval in milliseconds like Binance builds them,
+the last kline may still be in progress
+'''
+def aggregate_klines(klines, interval_ms):
+    bars = []
+    for line in klines:
+        bucket = line[0] - line[0] % interval_ms
+        if not bars or bars[-1][0] != bucket:
+            bars.append([bucket, line[1], line[2], line[3], line[4], 0.0, bucket + interval_ms - 1, 0.0, 0, 0.0, 0.0, '0'])
+        bar = bars[-1]
+        bar[2] = max(bar[2], line[2], key=float)
+        bar[3] = min(bar[3], line[3], key=float)
+        bar[4] = line[4]
+        bar[8] += line[8]
+        # Volumes are summed
+        for i in (5, 7, 9, 10):
+            bar[i] += float(line[i])
+    for bar in bars:
+        for i in (5, 7, 9, 10):
+            bar[i] = '%.8f' % bar[i]
+    return bars
+
+
+class FakeClient:
+    '''
+    In-memory stand-in for binance Client answering the calls User and TradeBot make,
+    orders fill instantly at a fixed price. Klines of longer intervals than the
+    stored ones are aggregated from them.
+    '''
+    def __init__(self, klines=None, price=1000.0):
+        self.klines = klines or []
+        self.price = price
+        self.calls = 0
+
+    def get_klines(self, symbol, interval, limit=500, startTime=None, endTime=None):
+        self.calls += 1
+        rows = self.klines
+        if len(rows) > 1 and interval_to_ms(interval) > rows[1][0] - rows[0][0]:
+            rows = aggregate_klines(rows, interval_to_ms(interval))
+        if startTime is not None:
+            rows = [line for line in rows if line[0] >= startTime]
+            return rows[:limit]
+        return rows[-limit:]
+
+    def get_exchange_info(self):
+        self.calls += 1
+        symbols = []
+        for base, quote in (('ETH', 'USDT'), ('BNB', 'USDT')):
+            symbols.append({'symbol': base + quote, 'baseAsset': base, 'quoteAsset': quote, 'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': '0.01000000'},
+                {'filterType': 'LOT_SIZE', 'stepSize': '0.00010000'},
+                {'filterType': 'NOTIONAL', 'minNotional': '10.00000000'}]})
+        return {'symbols': symbols}
+
+    def get_account(self):
+        self.calls += 1
+        return {'balances': [{'asset': 'USDT', 'free': '1000000', 'locked': '0'},
+                             {'asset': 'ETH', 'free': '100', 'locked': '0'},
+                             {'asset': 'BNB', 'free': '10', 'locked': '0'}]}
+
+    def get_avg_price(self, symbol):
+        self.calls += 1
+        return {'price': str(self.price)}
+
+    def order_market_buy(self, symbol, quoteOrderQty=None, quantity=None, **kwargs):
+        self.calls += 1
+        quantity = quantity if quantity is not None else quoteOrderQty/self.price
+        return self.fill(symbol, 'BUY', quantity)
+
+    def order_market_sell(self, symbol, quantity, **kwargs):
+        self.calls += 1
+        return self.fill(symbol, 'SELL', quantity)
+
+    def fill(self, symbol, side, quantity):
+        return {'symbol': symbol, 'side': side, 'status': 'FILLED', 'executedQty': str(quantity),
+                'cummulativeQuoteQty': str(quantity*self.price),
+                'fills': [{'price': str(self.price), 'qty': str(quantity), 'commission': '0', 'commissionAsset': 'BNB'}]}
@@ -1,62 +1,198 @@
+import numpy as np
 from strategy import Strategy
+from signals import BUY, SELL, SIGNAL_NAMES, position_sizes
+from trade_log import TRADE_DTYPE
+from kline_store import index_to_ms
+
+# Binance spot trading fee and its rate when fees are paid with BNB
+TRADING_FEE = 0.001
+BNB_FEE_DISCOUNT = 0.25
+
+
+'''
+Returns (indices, signal codes) of executed trades from per-kline signal codes when
+starting from BUY state and switching state at the first opposite signal.
+Trades alternate between BUY and SELL, starting with BUY.
+'''
+def pair_trades(codes):
+    idx = np.flatnonzero(codes)
+    signals = codes[idx]
+    # Only the first of consecutive same signals changes state
+    keep = np.ones(len(signals), dtype=bool)
+    keep[1:] = signals[1:] != signals[:-1]
+    idx, signals = idx[keep], signals[keep]
+    # Nothing to sell before the first buy
+    if len(signals) and signals[0] == SELL:
+        idx, signals = idx[1:], signals[1:]
+    return idx, signals
+
+
+'''
+Returns running products of a stack of 2x2 matrices, i-th result is
+mats[i] @ ... @ mats[0]. Computed in log2(len) vectorized steps.
+'''
+def cumulative_matmul(mats):
+    out = mats.copy()
+    step = 1
+    while step < len(out):
+        out[step:] = out[step:] @ out[:-step]
+        step *= 2
+    return out
+
+
+class BacktestResult:
+    '''
+    Outcome of a vectorized backtest.
+    Per-kline arrays: quote and base balances, equity (valued at closing price) and drawdown.
+    Per-trade arrays: kline index, signal code, price, traded fraction, base and quote
+    quantities, fee paid in quote asset.
+    '''
+    def __init__(self, balance, closes, trade_idx, trade_signals, fractions, quote, base, fees, quantities, quote_quantities):
+        self.initial_balance = balance
+        self.trade_idx = trade_idx
+        self.trade_signals = trade_signals
+        self.trade_prices = closes[trade_idx]
+        self.trade_fractions = fractions
+        self.fees = fees
+        self.trade_quantities = quantities
+        self.trade_quote = quote_quantities
+        self.quote = quote
+        self.base = base
+        self.equity = quote + base*closes
+        peak = np.maximum.accumulate(self.equity) if len(self.equity) else self.equity
+        self.drawdown = self.equity/peak - 1 if len(self.equity) else self.equity
+
+    @property
+    def final_balance(self):
+        return float(self.equity[-1]) if len(self.equity) else self.initial_balance
+
+    @property
+    def max_drawdown(self):
+        return float(self.drawdown.min()) if len(self.drawdown) else 0.0
+
+    @property
+    def total_fees(self):
+        return float(self.fees.sum())
+
+    @property
+    def sells(self):
+        return int(np.count_nonzero(self.trade_signals == SELL))
+
+    '''
+    Ratio of sells made at a higher price than the buy before them
+    '''
+    @property
+    def success_rate(self):
+        buy_prices = self.trade_prices[self.trade_signals == BUY][:self.sells]
+        sell_prices = self.trade_prices[self.trade_signals == SELL]
+        return float(np.mean(sell_prices > buy_prices)) if len(sell_prices) else 0.0
+
+    '''
+    Returns trades as a TRADE_DTYPE structured array, times are kline open times in
+    milliseconds taken from given per-kline times.
+    '''
+    def trades(self, times=None):
+        records = np.zeros(len(self.trade_idx), dtype=TRADE_DTYPE)
+        if times is not None:
+            records['time'] = np.asarray(times)[self.trade_idx]
+        records['signal'] = self.trade_signals
+        records['price'] = self.trade_prices
+        records['quantity'] = self.trade_quantities
+        records['quote'] = self.trade_quote
+        return records
+
+
+'''
+Backtests per-kline signal codes on closing prices without looping over klines.
+fractions gives the part of quote balance spent on a BUY or base balance sold on a SELL
+for each kline, all-in trades are made if it's not given. Signals with zero fraction
+are ignored. fee is charged on every trade's traded amount.
+'''
+def run_backtest(closes, codes, balance, fractions=None, fee=TRADING_FEE):
+    closes = np.asarray(closes, dtype=np.float64)
+    if fractions is None:
+        fractions = np.ones(len(codes))
+    codes = np.where(fractions > 0, codes, 0)
+    trade_idx, trade_signals = pair_trades(codes)
+    prices = closes[trade_idx]
+    traded = fractions[trade_idx]
+    buy = trade_signals == BUY
+    # Each trade maps (quote, base) balances linearly:
+    # BUY:  quote*(1-f),                    base + quote*f*(1-fee)/price
+    # SELL: quote + base*f*price*(1-fee),   base*(1-f)
+    mats = np.zeros((len(trade_idx), 2, 2))
+    mats[:, 0, 0] = np.where(buy, 1 - traded, 1)
+    mats[:, 0, 1] = np.where(buy, 0, traded*prices*(1 - fee))
+    mats[:, 1, 0] = np.where(buy, traded*(1 - fee)/prices, 0)
+    mats[:, 1, 1] = np.where(buy, 1, 1 - traded)
+    states = cumulative_matmul(mats) @ np.array([balance, 0.0]) if len(mats) else np.zeros((0, 2))
+    # Balances right before each trade, to compute fees
+    before = np.vstack([[balance, 0.0], states[:-1]]) if len(states) else states
+    # Quote spent on buys and received on sells, before fees
+    quote_quantities = np.where(buy, before[:, 0]*traded, before[:, 1]*traded*prices)
+    fees = quote_quantities*fee
+    # Base received on buys after fees and sold on sells
+    quantities = np.where(buy, quote_quantities*(1 - fee)/prices, before[:, 1]*traded)
+    # Balances of each kline are those after the last trade up to it
+    last = np.searchsorted(trade_idx, np.arange(len(closes)), side='right') - 1
+    quote = np.where(last >= 0, states[last, 0] if len(states) else 0, balance)
+    base = np.where(last >= 0, states[last, 1] if len(states) else 0, 0.0)
+    return BacktestResult(balance, closes, trade_idx, trade_signals, traded, quote, base, fees, quantities, quote_quantities)
+
 
 class Backtest:
     '''
     Backtest given strategy using historical data with specified start and end dates.
     Strategy object with dataset needs to be created beforehand.
+    If an RSI strategy on the same dataset is given, trades are sized by RSI tiers
+    like the live bot does instead of trading all balance.
     '''
-    def __init__(self, start_date, end_date, balance, strategy: Strategy):
+    def __init__(self, start_date, end_date, balance, strategy: Strategy, rsi: Strategy = None, fee=TRADING_FEE, bnb_discount=True):
         self.start_date = start_date
         self.end_date = end_date
         self.initial_balance = balance
         self.updated_balance = balance
         self.strategy = strategy
-        self.portfolio = []
+        self.rsi = rsi
+        # Fees paid with BNB are discounted, topup_bnb keeps BNB available for that
+        self.fee = fee*(1 - BNB_FEE_DISCOUNT) if bnb_discount else fee
+        # Executed trades as a TRADE_DTYPE structured array
+        self.portfolio = np.zeros(0, dtype=TRADE_DTYPE)
         self.success_rate = 0
+        self.result = None
 
     '''
-    Run the backtest. 
-    Starts from BUY state and buys/sells at the first signal, repeats this 
+    Run the backtest.
+    Starts from BUY state and buys/sells at the first signal, repeats this
     process for all data in dataset.
     '''
     def run(self):
-        next_order = 'BUY'
-        bought_amount = 0
-        totalSells = 0
-        signals = self.strategy.getResult()
-        for signal in signals:
-            if signal[0] < self.start_date:
-                continue
-            if signal[0] > self.end_date:
-                break
-
-            if next_order == 'BUY' and signal[2] == 'BUY':
-                next_order = 'SELL'
-                self.portfolio.append([signal[3], 'BUY'])
-                bought_amount = self.updated_balance/signal[3]
-                self.updated_balance = 0
-
-            if next_order == 'SELL' and signal[2] == 'SELL':
-                next_order = 'BUY'
-                buy_price = self.portfolio[-1][0]
-                self.portfolio.append([signal[3], 'SELL'])
-                self.updated_balance = bought_amount*signal[3]
-                bought_amount = 0
-                totalSells += 1
-                if signal[3] > buy_price:
-                    self.success_rate += 1
-
-        self.success_rate /= totalSells
-        self.updated_balance = bought_amount*self.portfolio[-1][0] + self.updated_balance
-        
+        klines = self.strategy.get_dataframe().loc[self.start_date:self.end_date]
+        signals = self.strategy.get_result()
+        # Spread signals back to a code per kline in the date range
+        codes = np.zeros(len(klines), dtype=np.int8)
+        positions = klines.index.get_indexer(signals.timestamps)
+        found = positions >= 0
+        codes[positions[found]] = signals.signals[found]
+        fractions = None
+        if self.rsi is not None:
+            rsi = self.rsi.get_dataframe().rsi.reindex(klines.index).to_numpy()
+            fractions = position_sizes(codes, rsi)/100
+        self.result = run_backtest(klines.close.to_numpy(), codes, self.initial_balance, fractions, self.fee)
+        self.portfolio = self.result.trades(index_to_ms(klines.index))
+        self.updated_balance = self.result.final_balance
+        self.success_rate = self.result.success_rate
+
     '''
     Print final results of the backtesting.
     Must be used after .run()
     '''
     def results(self):
-        for item in self.portfolio:
-            print(item[1], item[0])
+        for trade in self.portfolio:
+            print(SIGNAL_NAMES[int(trade['signal'])], trade['price'])
         print('Initial balance:', self.initial_balance)
         print('Final balance:', self.updated_balance)
         print('Change in percentage:', str(self.updated_balance/self.initial_balance*100-100) + '%')
         print('Success rate:', str(self.success_rate*100)+'%')
+        print('Fees paid:', self.result.total_fees)
+        print('Max drawdown:', str(self.result.max_drawdown*100)+'%')
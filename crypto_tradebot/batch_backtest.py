@@ -0,0 +1,361 @@
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from intervals import interval_to_ms
+from kline_store import KlineStore
+from strategies import STRATEGIES, get_strategy
+from sweep import DEFAULT_SPACE, grid, strategy_signals
+from backtest import run_backtest, TRADING_FEE
+from indicator_cache import IndicatorCache
+
+# Columns of report rows, train columns are empty for plain backtests.
+# run identifies the run configuration, window_rows is the number of rows of the window.
+REPORT_COLUMNS = ['run', 'symbol', 'window', 'window_rows', 'train_start', 'test_start', 'test_end', 'indicator',
+                  'strategy', 'params', 'train_balance', 'final_balance', 'success_rate', 'trades', 'max_drawdown', 'fees']
+# Rows per Parquet part file
+PARQUET_PART_ROWS = 1000
+
+
+'''
+Returns walk-forward windows over sorted open times in milliseconds as
+(train start, test start, test end) index triples. Windows have train and test
+lengths in milliseconds and move forward by step, test length by default.
+Without train length the whole range is a single test window.
+'''
+def walk_forward_windows(open_times, train=None, test=None, step=None):
+    n = len(open_times)
+    if n == 0:
+        return []
+    if train is None:
+        return [(0, 0, n)]
+    step = step or test
+    windows = []
+    start = int(open_times[0])
+    # Last window needs a full test period
+    while start + train + test <= open_times[-1] + 1:
+        bounds = np.searchsorted(open_times, [start, start + train, start + train + test], side='left')
+        windows.append(tuple(int(i) for i in bounds))
+        start += step
+    return windows
+
+
+'''
+Candidate (indicator, strategy, params) configurations of given strategies:
+parameter grids of the default search space, or declared default parameters.
+'''
+def candidates(strategies, search=True):
+    configs = []
+    for indicator, strategy in strategies:
+        if search and (indicator, strategy) in DEFAULT_SPACE:
+            configs += grid({(indicator, strategy): DEFAULT_SPACE[(indicator, strategy)]})
+        else:
+            configs.append((indicator, strategy, get_strategy(indicator, strategy).params()))
+    return configs
+
+
+# Kline columns memory mapped once per worker process
+_worker_data = {}
+
+
+def _arrays(root, symbol, trade_interval, start, end):
+    key = (root, symbol, trade_interval, start, end)
+    if key not in _worker_data:
+        _worker_data[key] = KlineStore(root).load_arrays(symbol, trade_interval, start, end)
+    return _worker_data[key]
+
+
+def _date(open_times, i):
+    return pd.Timestamp(int(open_times[min(i, len(open_times) - 1)]), unit='ms').isoformat() if len(open_times) else ''
+
+
+'''
+Evaluates configurations on one window of a symbol, indicators are computed from
+warmup klines before the window on. Walk-forward windows report the configuration
+with the best train result on the test period, plain windows report all of them.
+'''
+def _evaluate_window(task):
+    run, root, symbol, trade_interval, start, end, window, bounds, walk_forward, configs, warmup, balance, fee = task
+    train_start, test_start, test_end = bounds
+    arrays = _arrays(root, symbol, trade_interval, start, end)
+    closes, open_times = arrays['close'], arrays['open_time']
+    first = max(train_start - warmup, 0)
+    prices = np.asarray(closes[first:test_end], dtype=np.float64)
+    # Indicators are shared between configurations of this window only
+    cache = IndicatorCache()
+    results = []
+    for indicator, strategy, params in configs:
+        codes = strategy_signals(prices, indicator, strategy, params, cache, (symbol, window))
+        train = None
+        if walk_forward:
+            train = run_backtest(prices[train_start - first:test_start - first], codes[train_start - first:test_start - first], balance, fee=fee)
+        results.append((indicator, strategy, params, train, codes))
+    if walk_forward:
+        best = max(results, key=lambda r: (r[3].final_balance, r[3].success_rate))
+        results = [best]
+    rows = []
+    for indicator, strategy, params, train, codes in results:
+        test = run_backtest(prices[test_start - first:], codes[test_start - first:], balance, fee=fee)
+        rows.append({'run': run, 'symbol': symbol, 'window': window, 'window_rows': len(results),
+                     'train_start': _date(open_times, train_start) if train is not None else '',
+                     'test_start': _date(open_times, test_start), 'test_end': _date(open_times, test_end - 1),
+                     'indicator': indicator, 'strategy': strategy, 'params': json.dumps(params, sort_keys=True),
+                     'train_balance': train.final_balance if train is not None else '',
+                     'final_balance': test.final_balance, 'success_rate': test.success_rate, 'trades': test.sells,
+                     'max_drawdown': test.max_drawdown, 'fees': test.total_fees})
+    return rows
+
+
+'''
+Returns (run, symbol, window) keys of windows whose rows are all in the report,
+windows cut by an interruption are missing some rows and run again
+'''
+def completed_windows(rows):
+    counts = {}
+    for run, symbol, window, window_rows in rows:
+        key = (run, symbol, int(window), int(window_rows))
+        counts[key] = counts.get(key, 0) + 1
+    return {key[:3] for key, count in counts.items() if count >= key[3]}
+
+
+class CsvReport:
+    '''
+    CSV report appended window by window, so results survive an interruption.
+    Rows of a window cut by an interruption are dropped when the report is opened.
+    '''
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, newline='') as f:
+                if next(csv.reader(f), None) != REPORT_COLUMNS:
+                    raise ValueError(path + ' has other report columns, write the report to a new file')
+            self.drop_partial_line()
+            self.drop_incomplete_windows()
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, REPORT_COLUMNS)
+        if not exists:
+            self.writer.writeheader()
+
+    '''
+    Removes a last row cut by an interruption
+    '''
+    def drop_partial_line(self):
+        with open(self.path, 'r+b') as f:
+            data = f.read()
+            if not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    '''
+    Rewrites the report without rows of windows that are missing some rows
+    '''
+    def drop_incomplete_windows(self):
+        with open(self.path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        done = completed_windows(self.window_keys(rows))
+        kept = [row for row in rows if (row['run'], row['symbol'], int(row['window'])) in done]
+        if len(kept) == len(rows):
+            return
+        with open(self.path + '.tmp', 'w', newline='') as f:
+            writer = csv.DictWriter(f, REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(kept)
+        os.replace(self.path + '.tmp', self.path)
+
+    def window_keys(self, rows):
+        return [(row['run'], row['symbol'], row['window'], row['window_rows']) for row in rows]
+
+    '''
+    Returns (run, symbol, window) keys of complete windows in the report
+    '''
+    def done(self):
+        with open(self.path, newline='') as f:
+            return completed_windows(self.window_keys(csv.DictReader(f)))
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetReport:
+    '''
+    Parquet report written as a directory of part files, a part is written every
+    PARQUET_PART_ROWS rows and when the report is closed. Parts hold whole windows
+    and are renamed into place complete. Needs pyarrow.
+    '''
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.parts = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+        self.rows = []
+
+    def done(self):
+        columns = ['run', 'symbol', 'window', 'window_rows']
+        rows = []
+        for name in os.listdir(self.path):
+            if name.endswith('.parquet'):
+                table = self.pq.read_table(os.path.join(self.path, name), columns=columns)
+                rows += zip(*(table.column(column).to_pylist() for column in columns))
+        return completed_windows(rows)
+
+    def write(self, rows):
+        self.rows += rows
+        if len(self.rows) >= PARQUET_PART_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        # Train columns are empty for plain backtests
+        rows = [{key: (None if value == '' else value) for key, value in row.items()} for row in self.rows]
+        table = self.pa.Table.from_pylist(rows, schema=self.schema())
+        # Written under a temporary name first, so a part is either complete or missing
+        path = os.path.join(self.path, 'part-{:05d}.parquet'.format(self.parts))
+        self.pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.parts += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+    '''
+    Column types, fixed so parts with empty train columns read back together
+    '''
+    def schema(self):
+        pa = self.pa
+        types = {'window': pa.int64(), 'window_rows': pa.int64(), 'train_balance': pa.float64(), 'final_balance': pa.float64(),
+                 'success_rate': pa.float64(), 'trades': pa.int64(), 'max_drawdown': pa.float64(), 'fees': pa.float64()}
+        return pa.schema([(column, types.get(column, pa.string())) for column in REPORT_COLUMNS])
+
+
+'''
+Opens report at path, a Parquet dataset directory if it ends with .parquet
+'''
+def open_report(path):
+    if path.endswith('.parquet'):
+        return ParquetReport(path)
+    return CsvReport(path)
+
+
+class BatchBacktest:
+    '''
+    Backtests strategies on many symbols of a KlineStore over a process pool.
+    With train and test lengths (eg. '90d', '30d') each symbol's klines are split
+    into rolling walk-forward windows. In every window the parameter grid is
+    searched on the train period and the best configuration is backtested on the
+    test period. Otherwise each configuration is backtested on the whole range.
+    Windows are evaluated in parallel and results are streamed to the report as
+    they finish; windows already in the report are skipped, so an interrupted run
+    resumes where it stopped. Rows are tagged with a key of the run configuration,
+    a run with other settings doesn't skip windows of an earlier one.
+    '''
+    def __init__(self, root, symbols, trade_interval, strategies, start=None, end=None, train=None, test=None,
+                 step=None, search=None, warmup=1000, balance=1000, fee=TRADING_FEE, workers=None):
+        self.root = root
+        self.store = KlineStore(root)
+        self.symbols = symbols or self.store.symbols(trade_interval)
+        self.trade_interval = trade_interval
+        self.start = start
+        self.end = end
+        self.train = interval_to_ms(train) if train else None
+        self.test = interval_to_ms(test) if test else None
+        self.step = interval_to_ms(step) if step else None
+        # Parameters are searched in walk-forward runs by default
+        self.configs = candidates(strategies, self.train is not None if search is None else search)
+        self.warmup = warmup
+        self.balance = balance
+        self.fee = fee
+        self.workers = workers or os.cpu_count()
+
+    '''
+    Returns a short key of the settings that determine report rows
+    '''
+    def run_key(self):
+        settings = [self.trade_interval, self.start, self.end, self.train, self.test, self.step,
+                    self.configs, self.warmup, self.balance, self.fee]
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+
+    '''
+    Returns tasks of all windows of all symbols
+    '''
+    def tasks(self):
+        tasks = []
+        run = self.run_key()
+        for symbol in self.symbols:
+            open_times = self.store.load_arrays(symbol, self.trade_interval, self.start, self.end)['open_time']
+            for window, bounds in enumerate(walk_forward_windows(open_times, self.train, self.test, self.step)):
+                tasks.append((run, self.root, symbol, self.trade_interval, self.start, self.end, window, bounds,
+                              self.train is not None, self.configs, self.warmup, self.balance, self.fee))
+        return tasks
+
+    '''
+    Runs windows missing from the report at given path. Returns number of rows written.
+    '''
+    def run(self, path):
+        report = open_report(path)
+        try:
+            done = report.done()
+            tasks = [task for task in self.tasks() if (task[0], task[2], task[6]) not in done]
+            print(len(tasks), 'windows to backtest,', len(done), 'already in', path)
+            written = 0
+            with ProcessPoolExecutor(self.workers) as executor:
+                for future in as_completed([executor.submit(_evaluate_window, task) for task in tasks]):
+                    rows = future.result()
+                    report.write(rows)
+                    written += len(rows)
+            return written
+        finally:
+            report.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='main.py backtest', description='Backtest strategies on locally stored klines.')
+    parser.add_argument('symbol', nargs='*', help='Trade pairs: eg. "ETHUSDT", all stored pairs if none are given')
+    parser.add_argument('--data', required=True, help='KlineStore directory holding the klines')
+    parser.add_argument('--report', default='backtest_report.csv', help='Report file, a Parquet directory if it ends with .parquet')
+    parser.add_argument('--interval', default='1m', help='Kline interval: eg. "1m", "1h"')
+    parser.add_argument('--strategy', action='append', help='Indicator:strategy pair: eg. "MACD:CROSSOVER", all declared pairs by default')
+    parser.add_argument('--start', help='Start date: eg. "2021-01-01"')
+    parser.add_argument('--end', help='End date: eg. "2023-12-31"')
+    parser.add_argument('--train', help='Walk-forward train period: eg. "90d"')
+    parser.add_argument('--test', help='Walk-forward test period: eg. "30d"')
+    parser.add_argument('--step', help='Walk-forward step, test period by default')
+    parser.add_argument('--search', action='store_true', help='Search parameter grid without walk-forward windows')
+    parser.add_argument('--warmup', type=int, default=1000, help='Klines before a window used to warm up indicators')
+    parser.add_argument('--balance', type=float, default=1000, help='Initial balance of each window')
+    parser.add_argument('--fee', type=float, default=TRADING_FEE, help='Trading fee rate')
+    parser.add_argument('--workers', type=int, help='Worker processes, number of CPUs by default')
+    args = parser.parse_args(argv)
+    if bool(args.train) != bool(args.test):
+        parser.error('--train and --test must be given together')
+    strategies = list(STRATEGIES)
+    if args.strategy:
+        strategies = [tuple(pair.split(':', 1)) for pair in args.strategy]
+        for pair in strategies:
+            if pair not in STRATEGIES:
+                parser.error('Unknown strategy: ' + ':'.join(pair))
+    if args.report.endswith('.parquet') and importlib.util.find_spec('pyarrow') is None:
+        parser.error('Parquet reports need pyarrow, use a .csv report instead')
+    args.strategy = strategies
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    batch = BatchBacktest(args.data, args.symbol, args.interval, args.strategy, args.start, args.end, args.train,
+                          args.test, args.step, args.search or None, args.warmup, args.balance, args.fee, args.workers)
+    written = batch.run(args.report)
+    print(written, 'rows written to', args.report)
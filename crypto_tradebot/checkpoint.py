@@ -0,0 +1,79 @@
+import json
+import os
+from intervals import interval_to_ms
+
+# Bumped when the state layout changes, older checkpoints are ignored
+CHECKPOINT_VERSION = 3
+
+
+'''
+Writes state as JSON to a temporary file next to path, then renames it over path,
+so a crash leaves either the previous or the new checkpoint, never a partial one
+'''
+def save_checkpoint(path, state):
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+'''
+Returns state saved at path, None if there is none or it can't be read
+'''
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print('Ignoring unreadable checkpoint', path, e)
+        return None
+
+
+class Checkpoint:
+    '''
+    Local file holding a TradeBot's state: position side, incremental indicator
+    state, last processed kline and orders not executed yet. Bots save it after
+    ticks that processed klines and after submitting orders, and restore it when
+    they start, so a restarted bot resumes from its last kline instead of
+    downloading history again.
+    Orders executed after a save are found by their client order id on restore,
+    so they are never placed twice. Orders that never reached Binance are placed
+    again unless they're older than a trade interval.
+    Indicator state older than max_age klines is dropped and indicators are
+    seeded again, position side and open orders are always restored.
+    '''
+    def __init__(self, path, max_age=300):
+        self.path = path
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def save(self, bot):
+        state = bot.state()
+        state['version'] = CHECKPOINT_VERSION
+        save_checkpoint(self.path, state)
+
+    '''
+    Loads saved state into bot. Returns False if there is no checkpoint of this bot.
+    '''
+    def restore(self, bot, now):
+        state = load_checkpoint(self.path)
+        if state is None or state.get('version') != CHECKPOINT_VERSION:
+            return False
+        if (state['symbol'], state['trade_interval']) != (bot.symbol, bot.trade_interval):
+            print('Ignoring checkpoint of', state['symbol'], state['trade_interval'], 'in', self.path)
+            return False
+        last_kline_time = state['last_kline_time']
+        fresh = last_kline_time is not None and now - last_kline_time <= self.max_age*interval_to_ms(bot.trade_interval)
+        bot.load_state(state, indicators=fresh)
+        return True
+
+
+'''
+Returns the checkpoint file of a trade pair in given directory
+'''
+def checkpoint_path(directory, symbol, trade_interval):
+    return os.path.join(directory, '{}_{}.json'.format(symbol, trade_interval))
@@ -0,0 +1,94 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests import exceptions
+from user import User
+from trade_bot import TradeBot
+from intervals import interval_to_ms
+from rate_limit import WeightBudget, BudgetedClient
+from checkpoint import Checkpoint, checkpoint_path
+
+# Seconds a bot waits after a failed pass
+ERROR_BACKOFF = 30
+
+
+class TradeEngine:
+    '''
+    Runs a TradeBot for each trade pair in a single process with asyncio.
+    All bots share the user's client, thus its HTTP session, and every REST call
+    is scheduled under one request weight budget. Each bot keeps its own
+    BUY/SELL state and indicators, checkpointed to its own file in checkpoint_dir.
+    '''
+    def __init__(self, user: User, symbols, trade_interval, runtime, weight_limit=1200, workers=8, trend_intervals=None, executor=None, chart=None, checkpoint_dir=None):
+        self.user = user
+        # Blocking client calls go through the shared budget
+        self.budget = WeightBudget(weight_limit)
+        self.user.set_client(BudgetedClient(self.user.client, self.budget))
+        self.bots = [TradeBot(user, symbol, trade_interval, runtime, trend_intervals=trend_intervals, executor=executor, chart=chart,
+                              checkpoint=Checkpoint(checkpoint_path(checkpoint_dir, symbol, trade_interval)) if checkpoint_dir else None)
+                     for symbol in symbols]
+        self.trade_interval = trade_interval
+        self.runtime = self.bots[0].runtime.total_seconds()
+        self.workers = workers
+
+    '''
+    Runs all bots until runtime is reached.
+    '''
+    def run(self, startWith=None):
+        print("Trades begin for", ', '.join(bot.symbol for bot in self.bots))
+        asyncio.run(self.run_all(startWith))
+
+    async def run_all(self, startWith):
+        # python-binance client is blocking, its calls run on a shared thread pool
+        with ThreadPoolExecutor(self.workers) as executor:
+            deadline = time.time() + self.runtime
+            results = await asyncio.gather(*(self.run_bot(bot, startWith, executor, deadline) for bot in self.bots),
+                                           return_exceptions=True)
+        # A failing bot never stops the others, its error is reported when all are done
+        for bot, result in zip(self.bots, results):
+            if isinstance(result, BaseException):
+                print(bot.symbol, 'stopped:', repr(result))
+
+    '''
+    Restores or seeds the bot once, then wakes up when its next kline closes and
+    feeds klines closed since the last pass. Errors of a pass are printed and the
+    bot retries after a pause, other bots keep running.
+    '''
+    async def run_bot(self, bot: TradeBot, startWith, executor, deadline):
+        loop = asyncio.get_running_loop()
+        # Restoring may look up open orders over REST
+        if bot.checkpoint is not None:
+            try:
+                if await loop.run_in_executor(executor, bot.checkpoint.restore, bot, int(time.time()*1000)):
+                    print('Restored', bot.symbol, 'from', bot.checkpoint.path)
+            except Exception as e:
+                print(bot.symbol, 'checkpoint restore failed:', repr(e))
+        if startWith is not None:
+            bot.next_operation = startWith
+        interval = interval_to_ms(self.trade_interval)/1000
+        while time.time() < deadline:
+            try:
+                if bot.last_kline_time is None:
+                    await loop.run_in_executor(executor, bot.seed_indicators)
+                else:
+                    await loop.run_in_executor(executor, bot.backfill)
+                await loop.run_in_executor(executor, bot.save_checkpoint)
+            # Handles requests' read operation timeouts
+            except exceptions.ReadTimeout:
+                print(bot.symbol, 'Read timeout')
+                await asyncio.sleep(min(15, max(deadline - time.time(), 0)))
+                continue
+            # API errors, connection errors or a bad symbol only pause this bot
+            except Exception as e:
+                print(bot.symbol, 'error:', repr(e))
+                await asyncio.sleep(min(ERROR_BACKOFF, max(deadline - time.time(), 0)))
+                continue
+            # No closed kline to seed from yet
+            if bot.last_kline_time is None:
+                await asyncio.sleep(min(15, max(deadline - time.time(), 0)))
+                continue
+            # Next kline closes one interval after the last processed one
+            next_close = (bot.last_kline_time/1000) + 2*interval
+            await asyncio.sleep(min(max(next_close - time.time() + 1, 1), max(deadline - time.time(), 0)))
+        await loop.run_in_executor(executor, functools.partial(bot.save_checkpoint, force=True))
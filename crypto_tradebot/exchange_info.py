@@ -0,0 +1,135 @@
+import threading
+import time
+from math import log10
+
+
+class SymbolInfo:
+    '''
+    Trading rules of a trade pair parsed from exchangeInfo.
+    Filters are looked up by their filterType instead of list position.
+    '''
+    def __init__(self, info):
+        self.symbol = info['symbol']
+        self.base_asset = info['baseAsset']
+        self.quote_asset = info['quoteAsset']
+        self.filters = {f['filterType']: f for f in info['filters']}
+        self.tick_size = float(self.filters['PRICE_FILTER']['tickSize'])
+        self.step_size = float(self.filters['LOT_SIZE']['stepSize'])
+        # Older API versions name the filter MIN_NOTIONAL
+        notional = self.filters.get('NOTIONAL', self.filters.get('MIN_NOTIONAL', {}))
+        self.min_notional = float(notional.get('minNotional', 0))
+
+    '''
+    Number of decimals allowed by tick size
+    '''
+    @property
+    def tick_precision(self):
+        return -1*int(log10(self.tick_size))
+
+    '''
+    Number of decimals allowed by step size
+    '''
+    @property
+    def step_precision(self):
+        return -1*int(log10(self.step_size))
+
+
+class ExchangeInfo:
+    '''
+    Loads exchangeInfo for all trade pairs with a single request and refreshes
+    it after ttl seconds.
+    '''
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self.symbols = {}
+        self.loaded_at = None
+
+    '''
+    Reloads trading rules of all pairs
+    '''
+    def refresh(self):
+        info = self.client.get_exchange_info()
+        self.symbols = {item['symbol']: SymbolInfo(item) for item in info['symbols']}
+        self.loaded_at = time.time()
+
+    '''
+    Returns SymbolInfo of given pair, refreshing stale data first
+    '''
+    def symbol(self, pair):
+        if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+            self.refresh()
+        return self.symbols[pair]
+
+
+class BalanceCache:
+    '''
+    Account balances loaded with a single request, then kept up to date from
+    order fills and user data stream events. Reloaded after ttl seconds or
+    when invalidated.
+    '''
+    def __init__(self, client, ttl=300):
+        self.client = client
+        self.ttl = ttl
+        self.balances = {}
+        self.loaded_at = None
+        # Orders of several trade pairs may update balances concurrently
+        self.lock = threading.RLock()
+
+    '''
+    Reloads balances of all assets
+    '''
+    def refresh(self):
+        account = self.client.get_account()
+        with self.lock:
+            self.balances = {}
+            for item in account['balances']:
+                self.balances[item['asset']] = {'asset': item['asset'], 'free': float(item['free']), 'locked': float(item['locked'])}
+            self.loaded_at = time.time()
+
+    '''
+    Forces a reload on next access
+    '''
+    def invalidate(self):
+        self.loaded_at = None
+
+    '''
+    Returns balance dict of given asset, zero values if not owned
+    '''
+    def get(self, asset):
+        if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+            self.refresh()
+        if asset not in self.balances:
+            self.balances[asset] = {'asset': asset, 'free': 0.0, 'locked': 0.0}
+        return self.balances[asset]
+
+    '''
+    Applies a filled order response to cached balances
+    '''
+    def update_from_order(self, order, symbol_info: SymbolInfo):
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            base = self.get(symbol_info.base_asset)
+            quote = self.get(symbol_info.quote_asset)
+            executed = float(order['executedQty'])
+            quote_qty = float(order['cummulativeQuoteQty'])
+            if order['side'] == 'BUY':
+                base['free'] += executed
+                quote['free'] -= quote_qty
+            else:
+                base['free'] -= executed
+                quote['free'] += quote_qty
+            # Commission is taken from the commission asset's balance
+            for fill in order.get('fills', []):
+                self.get(fill['commissionAsset'])['free'] -= float(fill['commission'])
+
+    '''
+    User data stream callback, replaces balances sent by account updates
+    '''
+    def handle_event(self, msg):
+        if msg.get('e') != 'outboundAccountPosition' or self.loaded_at is None:
+            return
+        with self.lock:
+            for item in msg['B']:
+                self.balances[item['a']] = {'asset': item['a'], 'free': float(item['f']), 'locked': float(item['l'])}
@@ -0,0 +1,82 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import indicators
+
+
+'''
+Returns a short hash identifying a kline dataframe's dates and closing prices
+'''
+def fingerprint(klines):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(klines.index.asi8 if hasattr(klines.index, 'asi8') else np.asarray(klines.index)).tobytes())
+    digest.update(np.ascontiguousarray(klines.close.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    '''
+    Memoizes indicator arrays keyed by (dataset key, indicator, parameters).
+    Least recently used entries are evicted once cached arrays exceed max_bytes.
+    Cached arrays are read-only since they are shared between callers.
+    Dataset key can be anything identifying the closing prices, eg. fingerprint(klines).
+    '''
+    def __init__(self, max_bytes=256*1024*1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    Returns cached value of key, computing and storing it on a miss.
+    Value is a numpy array or a tuple of them.
+    '''
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        arrays = value if isinstance(value, tuple) else (value,)
+        for array in arrays:
+            array.flags.writeable = False
+        self.entries[key] = value
+        self.nbytes += sum(array.nbytes for array in arrays)
+        # Evict least recently used entries, the newest one is always kept
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in (evicted if isinstance(evicted, tuple) else (evicted,)))
+        return value
+
+    '''
+    Removes all entries
+    '''
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def sma(self, dataset, closes, period):
+        return self.get((dataset, 'sma', period), lambda: indicators.sma(closes, period))
+
+    def ema(self, dataset, closes, period):
+        return self.get((dataset, 'ema', period), lambda: indicators.ema(closes, period))
+
+    def rsi(self, dataset, closes, period=15):
+        return self.get((dataset, 'rsi', period), lambda: indicators.rsi(closes, period))
+
+    '''
+    Returns (macd, signal, histogram), fast and slow EMAs are shared with other
+    indicators through the cache.
+    '''
+    def macd(self, dataset, closes, pfast=12, pslow=26, psignal=9):
+        def compute():
+            line = self.ema(dataset, closes, pfast) - self.ema(dataset, closes, pslow)
+            signal = indicators.ema(line, psignal)
+            return line, signal, line - signal
+        return self.get((dataset, 'macd', pfast, pslow, psignal), compute)
+
+
+# Cache shared by Strategy objects in this process
+default_cache = IndicatorCache()
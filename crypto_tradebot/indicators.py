@@ -0,0 +1,289 @@
+from collections import deque
+from math import nan, isnan
+import numpy as np
+from signals import BUY, SELL, HOLD
+
+
+'''
+Simple moving average of a numpy array, NaN until period values are seen.
+'''
+def sma(values, period):
+    # pandas is imported on first use, the live bot only needs streaming indicators
+    import pandas as pd
+    return pd.Series(values, dtype=np.float64).rolling(period).mean().to_numpy()
+
+
+'''
+Exponential moving average of a numpy array, seeded with the average of the
+first period valid values like btalib does. Leading NaNs are skipped.
+Smoothing factor defaults to 2/(period+1).
+'''
+def ema(values, period, alpha=None):
+    import pandas as pd
+    values = np.asarray(values, dtype=np.float64)
+    alpha = 2.0/(period + 1) if alpha is None else alpha
+    out = np.full(len(values), nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) < period:
+        return out
+    seed = valid[0] + period - 1
+    tail = values[seed:].copy()
+    tail[0] = values[valid[0]:seed + 1].mean()
+    out[seed:] = pd.Series(tail).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out
+
+
+'''
+Wilder's smoothed moving average of a numpy array, EMA with smoothing factor 1/period.
+'''
+def smma(values, period):
+    return ema(values, period, alpha=1.0/period)
+
+
+'''
+Relative strength index of closing prices.
+'''
+def rsi(close, period=15):
+    diff = np.diff(np.asarray(close, dtype=np.float64), prepend=nan)
+    up = smma(np.maximum(diff, 0.0), period)
+    down = smma(np.maximum(-diff, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0/(1.0 + up/down)
+
+
+'''
+MACD of closing prices, returns (macd, signal, histogram) arrays.
+'''
+def macd(close, pfast=12, pslow=26, psignal=9):
+    line = ema(close, pfast) - ema(close, pslow)
+    signal = ema(line, psignal)
+    return line, signal, line - signal
+
+
+class StreamingSMA:
+    '''
+    Simple moving average updated one value at a time in O(1).
+    Value is NaN until period values have been seen.
+    '''
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.value = nan
+
+    '''
+    Adds a new value and returns the updated average.
+    '''
+    def update(self, value):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+        if len(self.window) == self.period:
+            self.value = self.total/self.period
+        return self.value
+
+    '''
+    Returns internal state as a JSON serializable dict
+    '''
+    def state(self):
+        return {'window': list(self.window), 'total': self.total, 'value': self.value}
+
+    '''
+    Restores state returned by state()
+    '''
+    def load_state(self, state):
+        self.window = deque(state['window'], maxlen=self.period)
+        self.total = state['total']
+        self.value = state['value']
+
+
+class StreamingEMA:
+    '''
+    Exponential moving average updated one value at a time in O(1).
+    Seeded with the average of the first period values like btalib does,
+    smoothing factor defaults to 2/(period+1).
+    '''
+    def __init__(self, period, alpha=None):
+        self.period = period
+        self.alpha = 2.0/(period + 1) if alpha is None else alpha
+        self.count = 0
+        self.total = 0.0
+        self.value = nan
+
+    '''
+    Adds a new value and returns the updated average.
+    '''
+    def update(self, value):
+        if self.count < self.period:
+            # Collect seed values
+            self.count += 1
+            self.total += value
+            if self.count == self.period:
+                self.value = self.total/self.period
+        else:
+            self.value = (1.0 - self.alpha)*self.value + self.alpha*value
+        return self.value
+
+    def state(self):
+        return {'count': self.count, 'total': self.total, 'value': self.value}
+
+    def load_state(self, state):
+        self.count = state['count']
+        self.total = state['total']
+        self.value = state['value']
+
+
+class StreamingSMMA(StreamingEMA):
+    '''
+    Wilder's smoothed moving average, an EMA with smoothing factor 1/period.
+    '''
+    def __init__(self, period):
+        super().__init__(period, alpha=1.0/period)
+
+
+class StreamingRSI:
+    '''
+    Relative strength index updated one close at a time in O(1).
+    Up/down moves are smoothed with Wilder's moving average.
+    '''
+    def __init__(self, period=15):
+        self.period = period
+        self.up = StreamingSMMA(period)
+        self.down = StreamingSMMA(period)
+        self.last_close = None
+        self.value = nan
+
+    '''
+    Adds a new closing price and returns the updated RSI.
+    '''
+    def update(self, close):
+        if self.last_close is None:
+            self.last_close = close
+            return self.value
+        diff = close - self.last_close
+        self.last_close = close
+        up = self.up.update(max(diff, 0.0))
+        down = self.down.update(max(-diff, 0.0))
+        if isnan(up) or isnan(down):
+            return self.value
+        # No down moves in the window, RSI saturates unless there are no moves at all
+        if down == 0:
+            self.value = 100.0 if up > 0 else nan
+        else:
+            self.value = 100.0 - 100.0/(1.0 + up/down)
+        return self.value
+
+    def state(self):
+        return {'up': self.up.state(), 'down': self.down.state(), 'last_close': self.last_close, 'value': self.value}
+
+    def load_state(self, state):
+        self.up.load_state(state['up'])
+        self.down.load_state(state['down'])
+        self.last_close = state['last_close']
+        self.value = state['value']
+
+
+class StreamingMACD:
+    '''
+    MACD updated one close at a time in O(1).
+    Signal line is the EMA of MACD values once both fast and slow EMAs are valid.
+    '''
+    def __init__(self, pfast=12, pslow=26, psignal=9):
+        self.fast = StreamingEMA(pfast)
+        self.slow = StreamingEMA(pslow)
+        self.signal_ema = StreamingEMA(psignal)
+        self.macd = nan
+        self.signal = nan
+        self.histogram = nan
+
+    '''
+    Adds a new closing price and returns updated (macd, signal, histogram).
+    '''
+    def update(self, close):
+        fast = self.fast.update(close)
+        slow = self.slow.update(close)
+        if not isnan(fast) and not isnan(slow):
+            self.macd = fast - slow
+            self.signal = self.signal_ema.update(self.macd)
+            self.histogram = self.macd - self.signal
+        return self.macd, self.signal, self.histogram
+
+    def state(self):
+        return {'fast': self.fast.state(), 'slow': self.slow.state(), 'signal_ema': self.signal_ema.state(),
+                'macd': self.macd, 'signal': self.signal, 'histogram': self.histogram}
+
+    def load_state(self, state):
+        self.fast.load_state(state['fast'])
+        self.slow.load_state(state['slow'])
+        self.signal_ema.load_state(state['signal_ema'])
+        self.macd = state['macd']
+        self.signal = state['signal']
+        self.histogram = state['histogram']
+
+
+class CrossoverState:
+    '''
+    Tracks whether a fast line is above a slow line and reports crossovers,
+    same rules as signals.crossover_signals applied one row at a time.
+    '''
+    def __init__(self):
+        self.greater = False
+
+    '''
+    Returns BUY on an upward crossover, SELL on a downward one, HOLD otherwise.
+    '''
+    def update(self, fast, slow):
+        if isnan(fast) or isnan(slow):
+            return HOLD
+        if fast > slow and not self.greater:
+            self.greater = True
+            return BUY
+        if fast <= slow and self.greater:
+            self.greater = False
+            return SELL
+        return HOLD
+
+    def state(self):
+        return {'greater': self.greater}
+
+    def load_state(self, state):
+        self.greater = state['greater']
+
+
+class LiveIndicators:
+    '''
+    Indicator state used by the live bot: MACD 12-26-9 crossovers and RSI 15.
+    Seeded once from history, then fed only newly closed klines.
+    '''
+    def __init__(self):
+        self.macd = StreamingMACD(12, 26, 9)
+        self.rsi = StreamingRSI(15)
+        self.crossover = CrossoverState()
+
+    '''
+    Feeds historical closing prices without emitting signals.
+    '''
+    def seed(self, closes):
+        for close in closes:
+            self.update(close)
+
+    '''
+    Feeds a closed kline's closing price.
+    Returns (macd signal code, rsi value) for that kline.
+    '''
+    def update(self, close):
+        macd, signal, _ = self.macd.update(close)
+        rsi = self.rsi.update(close)
+        return self.crossover.update(macd, signal), rsi
+
+    '''
+    Returns state of all indicators, so they can be restored without history
+    '''
+    def state(self):
+        return {'macd': self.macd.state(), 'rsi': self.rsi.state(), 'crossover': self.crossover.state()}
+
+    def load_state(self, state):
+        self.macd.load_state(state['macd'])
+        self.rsi.load_state(state['rsi'])
+        self.crossover.load_state(state['crossover'])
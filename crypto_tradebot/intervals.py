@@ -0,0 +1,9 @@
+# Milliseconds per unit of Binance kline interval strings
+UNIT_MS = {'s': 1000, 'm': 60*1000, 'h': 60*60*1000, 'd': 24*60*60*1000, 'w': 7*24*60*60*1000}
+
+
+'''
+Converts kline interval strings like '1m', '4h', '1d' to milliseconds
+'''
+def interval_to_ms(interval):
+    return int(interval[:-1])*UNIT_MS[interval[-1]]
@@ -0,0 +1,169 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from intervals import interval_to_ms
+
+# Stored columns and their on-disk dtypes
+COLUMNS = {
+    'open_time': np.dtype('<i8'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<f8'),
+}
+
+# Maximum klines returned by a single get_klines request
+PAGE_LIMIT = 1000
+
+
+'''
+Converts klines in get_klines format to a dataframe of open, high, low, close
+columns indexed by open time.
+Volume column is added if requested.
+'''
+def klines_to_frame(klines, volume=False):
+    width = 6 if volume else 5
+    # Single numpy conversion instead of per-cell float() calls
+    rows = np.array([line[:width] for line in klines], dtype=np.float64).reshape(-1, width)
+    df = pd.DataFrame(rows[:, 1:], columns=['open','high','low','close','volume'][:width-1])
+    df.index = pd.to_datetime(rows[:, 0].astype(np.int64), unit='ms')
+    df.index.name = 'date'
+    return df
+
+
+'''
+Converts dates given as milliseconds, strings, datetimes or timestamps to milliseconds
+'''
+def to_ms(date):
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    return pd.Timestamp(date).value // 10**6
+
+
+'''
+Returns open times in milliseconds of a DatetimeIndex, whatever its unit is:
+pandas>=2 keeps the millisecond unit of indexes loaded by KlineStore.load_frame
+'''
+def index_to_ms(index):
+    return index.values.astype('datetime64[ms]').astype(np.int64)
+
+
+class KlineStore:
+    '''
+    Local kline history, one directory per symbol and interval holding a raw
+    little-endian file per column. Files are only appended to and load_arrays
+    returns read-only memory maps, so loading any date range doesn't copy or parse data.
+    '''
+    def __init__(self, root):
+        self.root = root
+
+    '''
+    Returns path of a column file
+    '''
+    def path(self, symbol, trade_interval, column):
+        return os.path.join(self.root, symbol, trade_interval, column + '.bin')
+
+    '''
+    Returns symbols that have klines stored on given interval
+    '''
+    def symbols(self, trade_interval):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(symbol for symbol in os.listdir(self.root) if self.length(symbol, trade_interval) > 0)
+
+    '''
+    Returns number of stored klines.
+    Columns can differ in length after an interrupted append, shortest one is used.
+    '''
+    def length(self, symbol, trade_interval):
+        lengths = []
+        for column, dtype in COLUMNS.items():
+            path = self.path(symbol, trade_interval, column)
+            lengths.append(os.path.getsize(path)//dtype.itemsize if os.path.exists(path) else 0)
+        return min(lengths)
+
+    '''
+    Returns open time of the last stored kline, None if nothing is stored
+    '''
+    def last_open_time(self, symbol, trade_interval):
+        n = self.length(symbol, trade_interval)
+        if n == 0:
+            return None
+        open_time = np.memmap(self.path(symbol, trade_interval, 'open_time'), dtype=COLUMNS['open_time'], mode='r', shape=(n,))
+        return int(open_time[-1])
+
+    '''
+    Appends klines in get_klines format, klines not newer than the last stored one are skipped.
+    Returns number of klines appended.
+    '''
+    def append(self, symbol, trade_interval, klines):
+        last = self.last_open_time(symbol, trade_interval)
+        if last is not None:
+            klines = [line for line in klines if line[0] > last]
+        if not klines:
+            return 0
+        os.makedirs(os.path.join(self.root, symbol, trade_interval), exist_ok=True)
+        n = self.length(symbol, trade_interval)
+        rows = np.array([line[:6] for line in klines], dtype=np.float64)
+        # open_time is parsed separately to keep millisecond precision
+        open_time = np.array([line[0] for line in klines], dtype=COLUMNS['open_time'])
+        for i, (column, dtype) in enumerate(COLUMNS.items()):
+            path = self.path(symbol, trade_interval, column)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Drop partial tail left by an interrupted append
+                f.truncate(n*dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                (open_time if i == 0 else rows[:, i].astype(dtype)).tofile(f)
+        return len(klines)
+
+    '''
+    Downloads closed klines after the last stored one, or after start date when
+    nothing is stored yet, page by page until end date or now.
+    Returns number of klines appended.
+    '''
+    def update(self, client, symbol, trade_interval, start=None, end=None):
+        last = self.last_open_time(symbol, trade_interval)
+        if last is not None:
+            start_time = last + 1
+        else:
+            start_time = to_ms(start) if start is not None else 0
+        end_time = to_ms(end) if end is not None else None
+        appended = 0
+        while True:
+            klines = client.get_klines(symbol=symbol, interval=trade_interval, startTime=start_time, endTime=end_time, limit=PAGE_LIMIT)
+            now = int(time.time()*1000)
+            # Only closed klines are stored
+            closed = [line for line in klines if line[6] < now]
+            appended += self.append(symbol, trade_interval, closed)
+            if len(klines) < PAGE_LIMIT or len(closed) < len(klines):
+                return appended
+            start_time = klines[-1][0] + interval_to_ms(trade_interval)
+
+    '''
+    Returns stored columns between start and end dates (inclusive) as read-only memory maps.
+    '''
+    def load_arrays(self, symbol, trade_interval, start=None, end=None):
+        n = self.length(symbol, trade_interval)
+        if n == 0:
+            return {column: np.empty(0, dtype) for column, dtype in COLUMNS.items()}
+        arrays = {column: np.memmap(self.path(symbol, trade_interval, column), dtype=dtype, mode='r', shape=(n,))
+                  for column, dtype in COLUMNS.items()}
+        first = 0 if start is None else int(np.searchsorted(arrays['open_time'], to_ms(start), side='left'))
+        last = n if end is None else int(np.searchsorted(arrays['open_time'], to_ms(end), side='right'))
+        return {column: array[first:last] for column, array in arrays.items()}
+
+    '''
+    Returns stored klines between start and end dates (inclusive) as a dataframe
+    indexed by open time, the format Strategy expects.
+    Unlike load_arrays this copies the range: pandas consolidates the price columns
+    into one block and converts open times to nanosecond datetimes. Use load_arrays
+    where memory maps are enough.
+    '''
+    def load_frame(self, symbol, trade_interval, start=None, end=None):
+        arrays = self.load_arrays(symbol, trade_interval, start, end)
+        df = pd.DataFrame({column: arrays[column] for column in ['open','high','low','close','volume']})
+        df.index = pd.DatetimeIndex(arrays['open_time'].view('datetime64[ms]'))
+        df.index.name = 'date'
+        return df
@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+
+
+# Queued in place of a kline when the socket gave up reconnecting
+STREAM_ERROR = None
+
+
+class KlineStream:
+    '''
+    Pushes closed klines of a trade pair from Binance kline websocket into a queue.
+    Any object with BinanceSocketManager's start_kline_socket/start/stop_socket/close
+    methods can be given as socket_manager, eg. ReplaySocketManager for offline runs.
+    '''
+    def __init__(self, client, symbol, trade_interval, socket_manager=None):
+        self.symbol = symbol
+        self.trade_interval = trade_interval
+        self.queue = queue.Queue()
+        self.conn_key = None
+        if socket_manager is None:
+            # Twisted reactor is only needed for live sockets
+            from binance.websockets import BinanceSocketManager
+            socket_manager = BinanceSocketManager(client)
+        self.manager = socket_manager
+
+    '''
+    Opens kline socket and starts socket manager thread
+    '''
+    def start(self):
+        self.open_socket()
+        self.manager.start()
+
+    '''
+    Opens kline socket for the trade pair
+    '''
+    def open_socket(self):
+        self.conn_key = self.manager.start_kline_socket(self.symbol, self.handle_message, interval=self.trade_interval)
+
+    '''
+    Reopens kline socket after it gave up reconnecting
+    '''
+    def restart(self):
+        self.manager.stop_socket(self.conn_key)
+        self.open_socket()
+
+    '''
+    Closes the socket and stops the twisted reactor if it's used
+    '''
+    def stop(self):
+        self.manager.close()
+        if not isinstance(self.manager, ReplaySocketManager):
+            from twisted.internet import reactor
+            reactor.callFromThread(reactor.stop)
+
+    '''
+    Socket callback, queues (open time, open, high, low, close, volume) of closed klines
+    '''
+    def handle_message(self, msg):
+        if msg.get('e') == 'error':
+            self.queue.put(STREAM_ERROR)
+        elif msg.get('e') == 'kline' and msg['k']['x']:
+            k = msg['k']
+            self.queue.put((k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])))
+
+    '''
+    Returns next closed kline or STREAM_ERROR, raises queue.Empty on timeout
+    '''
+    def get(self, timeout=1):
+        return self.queue.get(timeout=timeout)
+
+
+class ReplaySocketManager(threading.Thread):
+    '''
+    Stand-in for BinanceSocketManager that replays kline messages from memory,
+    used to run stream mode without network access.
+    Messages are sent to the socket callback in order with given delay in seconds.
+    '''
+    def __init__(self, messages, delay=0):
+        super().__init__(daemon=True)
+        self.messages = messages
+        self.delay = delay
+        self.callback = None
+        self.closed = threading.Event()
+
+    '''
+    Builds kline socket messages from klines in get_klines format.
+    Each kline is sent once while still open and once closed.
+    '''
+    @classmethod
+    def from_klines(cls, symbol, trade_interval, klines, delay=0):
+        messages = []
+        for line in klines:
+            for closed in (False, True):
+                messages.append({'e': 'kline', 'E': line[6], 's': symbol, 'k': {
+                    't': line[0], 'T': line[6], 's': symbol, 'i': trade_interval,
+                    'o': line[1], 'h': line[2], 'l': line[3], 'c': line[4], 'v': line[5],
+                    'x': closed}})
+        return cls(messages, delay)
+
+    def start_kline_socket(self, symbol, callback, interval='1m'):
+        self.callback = callback
+        return '{}@kline_{}'.format(symbol.lower(), interval)
+
+    def stop_socket(self, conn_key):
+        pass
+
+    def run(self):
+        for msg in self.messages:
+            if self.closed.is_set():
+                return
+            self.callback(msg)
+            if self.delay:
+                time.sleep(self.delay)
+
+    def close(self):
+        self.closed.set()
@@ -0,0 +1,179 @@
+import multiprocessing
+import queue
+from collections import deque
+import numpy as np
+from signals import BUY, SELL
+
+# Queued to stop the chart process
+STOP = None
+
+
+class LiveChart:
+    '''
+    Live chart of closing prices with BUY/SELL markers and MACD lines of one or more
+    trade pairs, rendered by a separate process so drawing never runs on the trading
+    loop. update() only puts a small tuple on a bounded queue without waiting; updates
+    are dropped while the queue is full.
+    The last window klines of each pair are shown.
+    '''
+    def __init__(self, window=300, max_queue=10000, interval=0.2):
+        # Spawned process doesn't inherit the parent's threads and sockets
+        context = multiprocessing.get_context('spawn')
+        self.queue = context.Queue(max_queue)
+        self.process = context.Process(target=run_chart, args=(self.queue, window, interval), daemon=True)
+        self.dropped = 0
+
+    def start(self):
+        self.process.start()
+
+    '''
+    Sends a closed kline's closing price, MACD lines and signal code
+    '''
+    def update(self, symbol, open_time, close, macd, signal, code):
+        try:
+            self.queue.put_nowait((symbol, open_time, close, macd, signal, code))
+        except queue.Full:
+            self.dropped += 1
+
+    '''
+    Closes the chart and waits for its process to exit
+    '''
+    def stop(self, timeout=5):
+        try:
+            self.queue.put(STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class SymbolPanel:
+    '''
+    Price and MACD axes of a trade pair with their last window values.
+    Lines are animated artists, only they are redrawn on updates.
+    '''
+    def __init__(self, symbol, price_ax, macd_ax, window):
+        self.symbol = symbol
+        self.window = window
+        self.closes = deque(maxlen=window)
+        self.macd = deque(maxlen=window)
+        self.signal = deque(maxlen=window)
+        self.codes = deque(maxlen=window)
+        price_ax.set_title(symbol)
+        price_ax.tick_params(labelbottom=False)
+        price_ax.set_xlim(0, window - 1)
+        macd_ax.set_xlim(0, window - 1)
+        self.axes = (price_ax, macd_ax)
+        self.close_line, = price_ax.plot([], [], color='w', linewidth=1, animated=True)
+        self.buys, = price_ax.plot([], [], 'go', animated=True)
+        self.sells, = price_ax.plot([], [], 'ro', animated=True)
+        self.macd_line, = macd_ax.plot([], [], label='MACD', animated=True)
+        self.signal_line, = macd_ax.plot([], [], label='MACD Signal', animated=True)
+        self.artists = (self.close_line, self.buys, self.sells, self.macd_line, self.signal_line)
+
+    def append(self, close, macd, signal, code):
+        self.closes.append(close)
+        self.macd.append(macd)
+        self.signal.append(signal)
+        self.codes.append(code)
+
+    '''
+    Moves current values into the lines. Returns True if an axis had to be
+    rescaled, which needs a full redraw.
+    '''
+    def refresh(self):
+        closes = np.fromiter(self.closes, dtype=np.float64, count=len(self.closes))
+        codes = np.fromiter(self.codes, dtype=np.int8, count=len(self.codes))
+        # Newest kline is at the right edge
+        x = np.arange(self.window - len(closes), self.window)
+        self.close_line.set_data(x, closes)
+        self.buys.set_data(x[codes == BUY], closes[codes == BUY])
+        self.sells.set_data(x[codes == SELL], closes[codes == SELL])
+        macd = np.fromiter(self.macd, dtype=np.float64, count=len(self.macd))
+        signal = np.fromiter(self.signal, dtype=np.float64, count=len(self.signal))
+        self.macd_line.set_data(x, macd)
+        self.signal_line.set_data(x, signal)
+        rescaled = self.rescale(self.axes[0], closes)
+        return self.rescale(self.axes[1], np.concatenate((macd, signal))) or rescaled
+
+    '''
+    Widens y limits with some margin when values leave them
+    '''
+    @staticmethod
+    def rescale(ax, values):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return False
+        low, high = values.min(), values.max()
+        bottom, top = ax.get_ylim()
+        if bottom <= low and high <= top:
+            return False
+        margin = (high - low)*0.1 or abs(high)*0.01 or 1
+        ax.set_ylim(low - margin, high + margin)
+        return True
+
+
+'''
+Chart process: draws a row of price and MACD axes per trade pair, panels are added
+as new pairs show up. Queued updates are applied in batches every interval seconds,
+then animated lines are blitted over the cached background. Figure is fully redrawn
+only when panels are added or axes rescaled.
+'''
+def run_chart(updates, window=300, interval=0.2):
+    import matplotlib.pyplot as plt
+    plt.style.use('dark_background')
+    plt.ion()
+    fig = plt.figure('Trade bot')
+    panels = {}
+    background = None
+    plt.show(block=False)
+    while True:
+        batch = []
+        try:
+            batch.append(updates.get(timeout=interval))
+            while True:
+                batch.append(updates.get_nowait())
+        except queue.Empty:
+            pass
+        if STOP in batch:
+            plt.close(fig)
+            return
+        if not plt.fignum_exists(fig.number):
+            # Window was closed, keep draining updates so senders never block
+            continue
+        redraw = background is None
+        for symbol, open_time, close, macd, signal, code in batch:
+            if symbol not in panels:
+                panels[symbol] = None
+                layout(fig, panels, window)
+                redraw = True
+            panels[symbol].append(close, macd, signal, code)
+        for panel in panels.values():
+            redraw = panel.refresh() or redraw
+        if redraw:
+            fig.canvas.draw()
+            background = fig.canvas.copy_from_bbox(fig.bbox)
+        else:
+            fig.canvas.restore_region(background)
+        for panel in panels.values():
+            for artist in panel.artists:
+                artist.axes.draw_artist(artist)
+        fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+
+
+'''
+Recreates axes of all panels in a grid of price/MACD rows, keeping their values
+'''
+def layout(fig, panels, window):
+    fig.clear()
+    rows = len(panels)
+    for i, (symbol, old) in enumerate(list(panels.items())):
+        price_ax = fig.add_subplot(rows*2, 1, 2*i + 1)
+        macd_ax = fig.add_subplot(rows*2, 1, 2*i + 2, sharex=price_ax)
+        panel = SymbolPanel(symbol, price_ax, macd_ax, window)
+        if old is not None:
+            for values in zip(old.closes, old.macd, old.signal, old.codes):
+                panel.append(*values)
+        panels[symbol] = panel
@@ -1,17 +1,30 @@
 import argparse
-from trade_bot import *
+import sys
+from user import User
+from trade_bot import TradeBot
+from order_executor import OrderExecutor
+from metrics import registry
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Define running conditions for the bot.')
-    parser.add_argument('symbol', help='Trade pair: eg. "ETHUSDT", "BTCBUSD"')
+    parser.add_argument('symbol', nargs='+', help='Trade pairs: eg. "ETHUSDT", "BTCBUSD", more than one runs them in a single process')
     parser.add_argument('runtime', help='Duration of the bot: eg. "4h", "30m"')
     parser.add_argument('--interval', help='Kline intervals used to calculate indicators: eg. "1m", "1d"')
     parser.add_argument('--initial_state', help='Initial state of the bot: either BUY or SELL')
+    parser.add_argument('--stream', action='store_true', help='Act on kline websocket events instead of polling REST')
+    parser.add_argument('--metrics_port', type=int, help='Serve Prometheus metrics on http://localhost:<port>/metrics')
+    parser.add_argument('--metrics_file', help='Dump metrics as JSON to given file every minute')
+    parser.add_argument('--chart', action='store_true', help='Show a live chart of prices, MACD and trades')
+    parser.add_argument('--checkpoint', help='Directory to save bot state in and resume it from on restart')
+    parser.add_argument('--trend_interval', action='append', help='Only buy above the 50 EMA of bars on this interval built from klines: eg. "1h", can be given more than once')
     args = parser.parse_args()
+    if args.stream and len(args.symbol) > 1:
+        parser.error('--stream supports a single trade pair')
 
     interval = '1m'
-    initial_state = 'BUY'
+    # Restored from the checkpoint, or BUY, unless given
+    initial_state = None
 
     if args.initial_state and (args.initial_state == 'BUY' or args.initial_state == 'SELL'):
         initial_state = args.initial_state
@@ -19,13 +32,54 @@ def parse_args():
     if args.interval:
         interval = args.interval
     
-    return [args.symbol, interval, args.runtime, initial_state]
+    return [args.symbol, interval, args.runtime, initial_state, args.stream, args.metrics_port, args.metrics_file, args.trend_interval, args.chart, args.checkpoint]
 
 def main():
     args = parse_args()
+    # Latency histograms and REST call counters
+    if args[5]:
+        registry.serve(args[5])
+    if args[6]:
+        registry.start_json_dump(args[6])
     user = User()
-    bot = TradeBot(user, args[0], args[1], args[2])
-    bot.run(args[3])
+    # Orders are placed in the background, trading loops never wait on them
+    executor = OrderExecutor(user)
+    executor.start()
+    # Chart is drawn by its own process, bots only queue updates for it
+    chart = None
+    # Queued orders are executed and worker threads stopped even if the bot fails or is interrupted
+    try:
+        if args[8]:
+            from live_chart import LiveChart
+            chart = LiveChart()
+            chart.start()
+        # Several trade pairs share one process, client and request weight budget
+        if len(args[0]) > 1:
+            from engine import TradeEngine
+            engine = TradeEngine(user, args[0], args[1], args[2], trend_intervals=args[7], executor=executor, chart=chart, checkpoint_dir=args[9])
+            engine.run(args[3])
+        else:
+            checkpoint = None
+            if args[9]:
+                from checkpoint import Checkpoint, checkpoint_path
+                checkpoint = Checkpoint(checkpoint_path(args[9], args[0][0], args[1]))
+            bot = TradeBot(user, args[0][0], args[1], args[2], trend_intervals=args[7], executor=executor, chart=chart, checkpoint=checkpoint)
+            stream = None
+            if args[4]:
+                from kline_stream import KlineStream
+                stream = KlineStream(user.client, args[0][0], args[1])
+                # Account updates keep cached balances current, the bot starts the socket manager
+                user.start_balance_stream(stream.manager)
+            bot.run(args[3], stream)
+    finally:
+        executor.stop()
+        if chart is not None:
+            chart.stop()
 
 if __name__ == '__main__':
-    main()
+    # "main.py backtest ..." runs offline backtests, anything else starts the bot
+    if len(sys.argv) > 1 and sys.argv[1] == 'backtest':
+        from batch_backtest import main as backtest_main
+        backtest_main(sys.argv[2:])
+    else:
+        main()
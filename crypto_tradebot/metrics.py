@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from rate_limit import request_weight
+
+# Latency histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+'''
+Formats labels in Prometheus text format, eg. {stage="order"}
+'''
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in labels) + '}'
+
+
+class Counter:
+    '''
+    Monotonically increasing value per label set.
+    '''
+    kind = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def to_dict(self):
+        with self.lock:
+            return {format_labels(key) or '': value for key, value in self.values.items()}
+
+
+class Gauge(Counter):
+    '''
+    Value per label set that can go up and down.
+    '''
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram:
+    '''
+    Cumulative bucket counts, sum and count of observed values per label set.
+    '''
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # label set -> [bucket counts, sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0]*len(self.buckets), 0.0, 0]
+            state = self.values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    '''
+    Context manager observing elapsed seconds of its block
+    '''
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((self.name + '_bucket', key + (('le', bound),), bucket_count))
+                samples.append((self.name + '_bucket', key + (('le', '+Inf'),), count))
+                samples.append((self.name + '_sum', key, total))
+                samples.append((self.name + '_count', key, count))
+        return samples
+
+    def to_dict(self):
+        with self.lock:
+            return {format_labels(key) or '': {'buckets': dict(zip(map(str, self.buckets), counts)), 'sum': total, 'count': count}
+                    for key, (counts, total, count) in self.values.items()}
+
+
+class MetricsRegistry:
+    '''
+    Holds metrics of the process and exports them as Prometheus text or JSON.
+    '''
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description):
+        return self.register(Counter(name, description))
+
+    def gauge(self, name, description):
+        return self.register(Gauge(name, description))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    '''
+    Returns all metrics in Prometheus text exposition format
+    '''
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append('# HELP {} {}'.format(metric.name, metric.description))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(name, format_labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        return {'time': time.time(), 'metrics': {name: metric.to_dict() for name, metric in list(self.metrics.items())}}
+
+    '''
+    Writes all metrics to given path as JSON
+    '''
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    '''
+    Dumps metrics to given path every interval seconds on a daemon thread
+    '''
+    def start_json_dump(self, path, interval=60):
+        def dump():
+            while True:
+                time.sleep(interval)
+                self.dump_json(path)
+        thread = threading.Thread(target=dump, daemon=True)
+        thread.start()
+        return thread
+
+    '''
+    Serves Prometheus text on http://host:port/metrics from a daemon thread
+    '''
+    def serve(self, port, host=''):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Registry used by the bot
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('tradebot_stage_seconds', 'Latency of trading loop stages')
+SIGNAL_TO_ORDER_SECONDS = registry.histogram('tradebot_signal_to_order_seconds', 'Time from kline close to order response')
+REST_SECONDS = registry.histogram('binance_rest_seconds', 'Round trip time of REST calls')
+REST_REQUESTS = registry.counter('binance_rest_requests_total', 'REST calls made')
+REST_ERRORS = registry.counter('binance_rest_errors_total', 'REST calls that raised')
+REQUEST_WEIGHT = registry.counter('binance_request_weight_total', 'Request weight spent by REST calls')
+USED_WEIGHT = registry.gauge('binance_used_weight_1m', 'Used request weight reported by Binance for the current minute')
+
+
+class InstrumentedClient:
+    '''
+    Wraps a binance client to count calls, spent request weight and errors, and
+    time each call. Other attributes are passed through. Used weight reported in
+    response headers is kept in USED_WEIGHT by RateLimitedClient, which sees the
+    response of each request; the client's last response may be another thread's.
+    '''
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        weight = request_weight(name)
+
+        def call(*args, **kwargs):
+            REST_REQUESTS.inc(method=name)
+            REQUEST_WEIGHT.inc(weight, method=name)
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                REST_ERRORS.inc(method=name)
+                raise
+            finally:
+                REST_SECONDS.observe(time.perf_counter() - start, method=name)
+        return call
@@ -0,0 +1,228 @@
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from binance.exceptions import BinanceAPIException, BinanceOrderException
+from requests import exceptions
+from user import User
+from metrics import STAGE_SECONDS
+
+# Binance error codes of requests that may succeed when retried
+RETRY_CODES = {-1000, -1001, -1003, -1006, -1007, -1008, -1015, -1021}
+# Errors after which the order may or may not have reached the matching engine
+UNKNOWN_OUTCOME = (exceptions.ReadTimeout, exceptions.ConnectionError)
+
+# Queued in place of a symbol to stop a worker
+STOP = None
+# Returned by OrderExecutor.attempt when the request should be tried again
+RETRY = object()
+
+
+'''
+Returns a client order id unique to this order, Binance allows up to 36 characters
+'''
+def new_client_order_id(symbol):
+    return '{}-{}'.format(symbol[:10], uuid.uuid4().hex[:24])
+
+
+'''
+True if the request that raised given exception may be retried
+'''
+def is_retryable(e):
+    if isinstance(e, UNKNOWN_OUTCOME):
+        return True
+    if isinstance(e, BinanceAPIException):
+        # Rate limits, server errors and transient API errors
+        return e.status_code in (429, 418) or e.status_code >= 500 or e.code in RETRY_CODES
+    return False
+
+
+class OrderRequest:
+    '''
+    Market order waiting to be executed. Client order id is assigned once, so
+    every retry of the request refers to the same order. A request resubmitted
+    with its client order id, eg. after a restart, may have been placed already.
+    '''
+    def __init__(self, symbol, side, percentage, price=None, callback=None, client_order_id=None):
+        self.symbol = symbol
+        self.side = side
+        self.percentage = percentage
+        self.price = price
+        # Called with (request, order) after execution, order is False if it failed
+        self.callback = callback
+        self.client_order_id = client_order_id or new_client_order_id(symbol)
+        self.resubmitted = client_order_id is not None
+        self.submitted = time.time()
+        self.attempts = 0
+
+
+class OrderExecutor:
+    '''
+    Executes market orders on worker threads so signal evaluation never waits
+    on order round trips. Orders of a trade pair are executed one at a time in
+    submission order, orders of different pairs run concurrently.
+    Failed requests are retried with jittered exponential backoff. Before a retry
+    the order is looked up by its client order id, so a request that timed out
+    after reaching Binance isn't placed twice. No worker waits out the backoff,
+    the pair's later orders stay queued behind the request until it's retried.
+    BNB used for fees is topped up on a separate thread after orders.
+    '''
+    def __init__(self, user: User, workers=4, retries=3, backoff=0.5, max_backoff=8, topup=(0.004, 0.003)):
+        self.user = user
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # (min balance, topup quantity) of BNB, None disables top-ups
+        self.topup = topup
+        # A pair's requests wait in order, the pair is queued while it has requests
+        # and isn't being executed or waiting for a retry
+        self.queue = queue.Queue()
+        self.pending = {}
+        self.active = set()
+        self.lock = threading.Lock()
+        # Notified when a request is done
+        self.done = threading.Condition(self.lock)
+        self.topups = queue.Queue()
+        self.topup_pending = set()
+        self.threads = []
+
+    '''
+    Starts worker and top-up threads
+    '''
+    def start(self):
+        for _ in range(self.workers):
+            self.threads.append(threading.Thread(target=self.work, daemon=True))
+        self.threads.append(threading.Thread(target=self.work_topups, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    '''
+    Executes requests submitted so far, then stops the threads
+    '''
+    def stop(self):
+        if self.threads:
+            # Requests waiting for a retry are queued again later, so workers stop once all are done
+            with self.done:
+                while any(self.pending.values()):
+                    self.done.wait()
+        for _ in range(self.workers):
+            self.queue.put(STOP)
+        self.topups.put(STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    '''
+    Queues a market order and returns its OrderRequest immediately
+    '''
+    def submit(self, symbol, side, percentage, price=None, callback=None, client_order_id=None):
+        request = OrderRequest(symbol, side, percentage, price, callback, client_order_id)
+        with self.lock:
+            self.pending.setdefault(symbol, deque()).append(request)
+            if symbol in self.active:
+                return request
+            self.active.add(symbol)
+        self.queue.put(symbol)
+        return request
+
+    '''
+    Executes the first request of each queued pair. Only one worker holds a pair
+    at a time, which keeps its orders in submission order.
+    '''
+    def work(self):
+        while True:
+            symbol = self.queue.get()
+            if symbol is STOP:
+                return
+            with self.lock:
+                request = self.pending[symbol][0]
+            order = self.attempt(request)
+            if order is RETRY:
+                # Pair is queued again after the backoff, the worker moves on meanwhile
+                timer = threading.Timer(self.retry_delay(request.attempts), self.queue.put, (symbol,))
+                timer.daemon = True
+                timer.start()
+                continue
+            self.finish(symbol, request, order)
+
+    '''
+    Makes one attempt at placing the requested order.
+    Returns the order, False if it failed or RETRY on transient errors.
+    '''
+    def attempt(self, request: OrderRequest):
+        request.attempts += 1
+        try:
+            # Previous attempt may have been placed without us getting the response
+            if request.attempts > 1 or request.resubmitted:
+                order = self.user.find_order(request.symbol, request.client_order_id)
+                if order is not None:
+                    return order
+            return self.user.market_order(request.symbol, request.side, request.percentage, request.price,
+                                          client_order_id=request.client_order_id, topup=False)
+        except (BinanceAPIException, BinanceOrderException) + UNKNOWN_OUTCOME as e:
+            if not is_retryable(e) or request.attempts > self.retries:
+                print(request.symbol, request.side, 'order failed:', e)
+                return False
+            print(request.symbol, request.side, 'order retry', request.attempts, e)
+            return RETRY
+        except Exception as e:
+            # Eg. unknown symbol or bad quantity, retrying won't help
+            print(request.symbol, request.side, 'order failed:', repr(e))
+            return False
+
+    '''
+    Schedules a top-up after a placed order, calls back and hands the pair's
+    next request to the workers. Errors are logged so the worker keeps running.
+    '''
+    def finish(self, symbol, request, order):
+        try:
+            if order != False and self.topup is not None:
+                self.schedule_topup(self.user.exchange_info.symbol(symbol).quote_asset)
+        except Exception as e:
+            print(symbol, 'BNB topup not scheduled:', repr(e))
+        try:
+            if request.callback is not None:
+                request.callback(request, order)
+        except Exception as e:
+            print(symbol, request.side, 'order callback failed:', repr(e))
+        finally:
+            with self.lock:
+                self.pending[symbol].popleft()
+                queued = bool(self.pending[symbol])
+                if not queued:
+                    self.active.discard(symbol)
+                self.done.notify_all()
+            if queued:
+                self.queue.put(symbol)
+
+    '''
+    Exponential backoff with full jitter
+    '''
+    def retry_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff*2**attempt))
+
+    '''
+    Queues a BNB top-up for given quote asset unless one is already waiting
+    '''
+    def schedule_topup(self, asset):
+        with self.lock:
+            if asset in self.topup_pending:
+                return
+            self.topup_pending.add(asset)
+        self.topups.put(asset)
+
+    def work_topups(self):
+        while True:
+            asset = self.topups.get()
+            if asset is STOP:
+                return
+            with self.lock:
+                self.topup_pending.discard(asset)
+            try:
+                with STAGE_SECONDS.time(stage='topup_bnb'):
+                    self.user.topup_bnb(self.topup[0], self.topup[1], asset)
+            except Exception as e:
+                print('BNB topup failed:', repr(e))
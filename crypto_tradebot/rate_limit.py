@@ -0,0 +1,75 @@
+import threading
+import time
+
+# Request weights of client methods on Binance API, 1 if not listed
+REQUEST_WEIGHTS = {
+    'get_klines': 2,
+    'get_exchange_info': 20,
+    'get_symbol_info': 20,
+    'get_account': 20,
+    'get_asset_balance': 20,
+    'get_avg_price': 2,
+    'get_order': 4,
+    'order_market_buy': 1,
+    'order_market_sell': 1,
+    'create_order': 1,
+}
+
+
+'''
+Returns request weight of given client method
+'''
+def request_weight(method):
+    return REQUEST_WEIGHTS.get(method, 1)
+
+
+class WeightBudget:
+    '''
+    Thread-safe request weight budget per time window, mirroring Binance's
+    per-minute weight limit. acquire() blocks until the weight fits in the window.
+    '''
+    def __init__(self, limit=1200, window=60):
+        self.limit = limit
+        self.window = window
+        self.window_start = 0
+        self.used = 0
+        self.lock = threading.Lock()
+
+    '''
+    Waits until given weight can be spent in the current window and spends it.
+    '''
+    def acquire(self, weight):
+        with self.lock:
+            while True:
+                now = time.time()
+                window_start = now - now % self.window
+                # New window, weight used so far is reset
+                if window_start != self.window_start:
+                    self.window_start = window_start
+                    self.used = 0
+                # Requests heavier than the limit are allowed alone in a window
+                if self.used + weight <= self.limit or self.used == 0:
+                    self.used += weight
+                    return
+                time.sleep(self.window_start + self.window - now)
+
+
+class BudgetedClient:
+    '''
+    Wraps a binance client so every method call first acquires its request weight
+    from a shared WeightBudget. Other attributes are passed through.
+    '''
+    def __init__(self, client, budget: WeightBudget):
+        self.client = client
+        self.budget = budget
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        weight = request_weight(name)
+
+        def call(*args, **kwargs):
+            self.budget.acquire(weight)
+            return attr(*args, **kwargs)
+        return call
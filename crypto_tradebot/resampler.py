@@ -0,0 +1,107 @@
+import numpy as np
+from intervals import interval_to_ms
+from indicators import StreamingEMA
+
+# Higher timeframes built from 1m klines by default
+DEFAULT_INTERVALS = ('5m', '15m', '1h', '4h', '1d')
+
+
+class Resampler:
+    '''
+    Builds higher timeframe OHLCV bars incrementally from one stream of closed klines.
+    Bars are aligned to UTC like Binance's (weekly bars are not supported) and are
+    emitted as soon as the last base kline of their period closes. A bar missing
+    klines is emitted when a kline of a later period arrives.
+    Bars are [open time, open, high, low, close, volume] lists.
+    '''
+    def __init__(self, intervals=DEFAULT_INTERVALS, base_interval='1m'):
+        self.base_ms = interval_to_ms(base_interval)
+        self.interval_ms = {interval: interval_to_ms(interval) for interval in intervals}
+        # Bar being built for each interval
+        self.bars = {interval: None for interval in intervals}
+        self.listeners = {interval: [] for interval in intervals}
+
+    '''
+    Registers callback(interval, bar) called for each completed bar of interval
+    '''
+    def on_bar(self, interval, callback):
+        self.listeners[interval].append(callback)
+
+    '''
+    Adds a closed base kline. Returns list of (interval, bar) completed by it.
+    '''
+    def update(self, open_time, open, high, low, close, volume=0.0):
+        completed = []
+        for interval, ms in self.interval_ms.items():
+            bucket = open_time - open_time % ms
+            bar = self.bars[interval]
+            # Kline belongs to a later period, current bar won't get more klines
+            if bar is not None and bar[0] != bucket:
+                completed.append((interval, bar))
+                bar = None
+            if bar is None:
+                bar = [bucket, open, high, low, close, volume]
+            else:
+                bar[2] = max(bar[2], high)
+                bar[3] = min(bar[3], low)
+                bar[4] = close
+                bar[5] += volume
+            # Last kline of the period closes the bar
+            if open_time + self.base_ms >= bucket + ms:
+                completed.append((interval, bar))
+                bar = None
+            self.bars[interval] = bar
+        for interval, bar in completed:
+            for callback in self.listeners[interval]:
+                callback(interval, bar)
+        return completed
+
+    '''
+    Returns bars being built, listeners aren't part of the state
+    '''
+    def state(self):
+        return {'bars': self.bars}
+
+    def load_state(self, state):
+        self.bars.update({interval: bar for interval, bar in state['bars'].items() if interval in self.bars})
+
+    '''
+    Sets the bar being built for interval, eg. from an open kline of that interval
+    when seeding. Later base klines of its period update and complete it.
+    '''
+    def start_bar(self, interval, bar):
+        self.bars[interval] = list(bar)
+
+
+class TrendFilter:
+    '''
+    Higher timeframe trend filter: BUYs are only allowed while price is above
+    the EMA of higher timeframe closes. SELLs are never blocked, BUYs are blocked
+    until the EMA has period bars.
+    '''
+    def __init__(self, interval='1h', period=50):
+        self.interval = interval
+        self.ema = StreamingEMA(period)
+
+    '''
+    Resampler callback feeding completed bars
+    '''
+    def on_bar(self, interval, bar):
+        self.ema.update(bar[4])
+
+    def state(self):
+        return {'ema': self.ema.state()}
+
+    def load_state(self, state):
+        self.ema.load_state(state['ema'])
+
+    '''
+    True once the EMA has enough bars
+    '''
+    def ready(self):
+        return not np.isnan(self.ema.value)
+
+    def allows(self, operation, close):
+        if operation != 'BUY':
+            return True
+        return self.ready() and close > self.ema.value
@@ -0,0 +1,183 @@
+import copy
+import random
+import threading
+import time
+from concurrent.futures import Future
+from requests import exceptions
+from requests.adapters import HTTPAdapter
+from binance.client import Client
+from binance.exceptions import BinanceAPIException
+from metrics import USED_WEIGHT
+
+# Statuses of GET requests that may succeed when retried: rate limits and server errors
+RETRY_STATUS = {418, 429, 500, 502, 503, 504}
+# Requests that may be retried when they fail on the network
+NETWORK_ERRORS = (exceptions.Timeout, exceptions.ConnectionError)
+
+
+'''
+Returns seconds to wait given by a response's Retry-After header, 0 if it has none
+'''
+def retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
+
+
+'''
+Returns used request weight of the current minute reported by a response, None if it has none
+'''
+def used_weight(response):
+    used = response.headers.get('x-mbx-used-weight-1m', response.headers.get('x-mbx-used-weight'))
+    return int(used) if used is not None else None
+
+
+class RateLimitedClient(Client):
+    '''
+    Binance client that can be shared by threads for its whole lifetime:
+    - One session with a connection pool of pool_size keep-alive connections.
+    - Used request weight reported by Binance is tracked, once less than reserve
+      weight is left requests wait for the next minute instead of getting a 429.
+    - After a 429 or 418 every request waits until its Retry-After time.
+    - Identical unsigned GET requests in flight at the same time are sent once,
+      each caller gets its own copy of the response. Signed requests return
+      account data and are always sent.
+    - GET requests failing on the network, rate limits or server errors are
+      retried with jittered exponential backoff. Other requests like orders are
+      never retried here, OrderExecutor retries them without placing them twice.
+    Each attempt is built, signed and sent by Client._request. self.response is
+    kept per thread, so Client reads back the response of its own request.
+    '''
+    def __init__(self, api_key=None, api_secret=None, requests_params=None, weight_limit=1200, reserve=100,
+                 retries=3, backoff=0.5, max_backoff=8, pool_size=16, timeout=10):
+        self.weight_limit = weight_limit
+        self.reserve = reserve
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        # Weight used in the current minute, counted locally and corrected by response headers
+        self.used_weight = 0
+        self.weight_minute = 0
+        # Requests wait until this time after a 429 or 418
+        self.blocked_until = 0
+        # Key of each unsigned GET request in flight -> [Future of its response, waiting callers]
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Client pings the API on construction, so the state above is set first.
+        # Global requests params are applied over Client's default timeout.
+        super().__init__(api_key, api_secret, dict({'timeout': timeout}, **(requests_params or {})))
+
+    @property
+    def response(self):
+        return getattr(self.local, 'response', None)
+
+    @response.setter
+    def response(self, response):
+        self.local.response = response
+
+    def _init_session(self):
+        session = super()._init_session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        # Every response is tracked as it arrives, on the thread that sent its request
+        session.hooks['response'].append(lambda response, *args, **kwargs: self.track(response))
+        return session
+
+    '''
+    Sends a request, identical unsigned GET requests in flight share one response
+    '''
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        if method != 'get' or signed:
+            return self.send(method, uri, signed, force_params, kwargs)
+        data = kwargs.get('data')
+        key = (uri, repr(sorted(data.items())) if data else None)
+        with self.lock:
+            shared = self.inflight.get(key)
+            if shared is not None:
+                shared[1] += 1
+            else:
+                future = Future()
+                self.inflight[key] = [future, 0]
+        if shared is not None:
+            # Callers may change their response, they don't share it
+            return copy.deepcopy(shared[0].result())
+        try:
+            result = self.send(method, uri, signed, force_params, kwargs)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                waiters = self.inflight.pop(key)[1]
+        # Waiters copy the result, it's only copied here if they may still be copying
+        return copy.deepcopy(result) if waiters else result
+
+    '''
+    Sends a request through Client._request, retrying GET requests on transient
+    errors. Returns decoded JSON.
+    '''
+    def send(self, method, uri, signed, force_params, kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.throttle()
+            # Client._request signs data in place, so each attempt is signed
+            # with a new timestamp on a copy
+            data = kwargs.get('data')
+            request = dict(kwargs, data=dict(data)) if isinstance(data, dict) else dict(kwargs)
+            try:
+                return super()._request(method, uri, signed, force_params, **request)
+            except NETWORK_ERRORS:
+                if method != 'get' or attempt > self.retries:
+                    raise
+                delay = self.retry_delay(attempt)
+            except BinanceAPIException as e:
+                if method != 'get' or e.status_code not in RETRY_STATUS or attempt > self.retries:
+                    raise
+                delay = max(self.retry_delay(attempt), retry_after(e.response))
+            time.sleep(delay)
+
+    '''
+    Waits until the request fits in the weight limit of the current minute
+    and no ban is in effect, then counts it
+    '''
+    def throttle(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                minute = now - now % 60
+                if minute != self.weight_minute:
+                    self.weight_minute = minute
+                    self.used_weight = 0
+                if now >= self.blocked_until and self.used_weight + self.reserve < self.weight_limit:
+                    # Exact weight is known once Binance responds
+                    self.used_weight += 1
+                    return
+                wait = self.blocked_until - now if now < self.blocked_until else minute + 60 - now
+            time.sleep(wait)
+
+    '''
+    Takes used weight and bans from a response
+    '''
+    def track(self, response):
+        used = used_weight(response)
+        now = time.time()
+        with self.lock:
+            if used is not None and now - now % 60 == self.weight_minute:
+                self.used_weight = max(self.used_weight, used)
+            if response.status_code in (429, 418):
+                self.blocked_until = max(self.blocked_until, now + (retry_after(response) or self.max_backoff))
+        if used is not None:
+            USED_WEIGHT.set(used)
+
+    '''
+    Exponential backoff with full jitter
+    '''
+    def retry_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff*2**attempt))
@@ -0,0 +1,126 @@
+from enum import IntEnum
+import numpy as np
+
+
+class Signal(IntEnum):
+    '''
+    Signal codes stored in place of 'BUY'/'SELL' strings, int8 in arrays
+    '''
+    SELL = -1
+    HOLD = 0
+    BUY = 1
+
+
+BUY = Signal.BUY
+SELL = Signal.SELL
+HOLD = Signal.HOLD
+SIGNAL_NAMES = {signal.value: signal.name for signal in Signal}
+
+# RSI tiers sizing the live bot's trades: (RSI bound, percentage of balance to trade)
+# Buys need RSI at or below the bound, sells at or above it; first matching tier wins
+BUY_TIERS = ((30, 70), (50, 30))
+SELL_TIERS = ((70, 100), (50, 50))
+
+
+class SignalResult:
+    '''
+    Columnar BUY/SELL signals of a strategy, each column is a typed numpy array:
+    timestamps (datetime64), values (indicator value, float64), signals (int8 codes)
+    and closes (closing price, float64).
+    Integer indexing returns a (date, indicator value, signal, closing price) row so
+    callers can keep reading results row by row.
+    '''
+    def __init__(self, timestamps, values, signals, closes):
+        self.timestamps = timestamps
+        self.values = values
+        self.signals = signals
+        self.closes = closes
+
+    '''
+    Keeps the rows of given columns where a BUY or SELL signal occurs.
+    '''
+    @classmethod
+    def from_codes(cls, timestamps, values, codes, closes):
+        mask = codes != HOLD
+        return cls(np.asarray(timestamps)[mask],
+                   np.asarray(values, dtype=np.float64)[mask],
+                   codes[mask],
+                   np.asarray(closes, dtype=np.float64)[mask])
+
+    def __len__(self):
+        return len(self.signals)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return SignalResult(self.timestamps[item], self.values[item], self.signals[item], self.closes[item])
+        return (self.timestamps[item], self.values[item], SIGNAL_NAMES[int(self.signals[item])], self.closes[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+'''
+Returns int8 signal codes for each row of given lines.
+BUY where fast line passes above slow line, SELL where it drops back to or below it.
+Rows where either line is NaN are skipped without changing the crossover state and
+fast line is initially considered below the slow line.
+'''
+def crossover_signals(fast, slow):
+    fast = np.asarray(fast, dtype=np.float64)
+    slow = np.asarray(slow, dtype=np.float64)
+    codes = np.zeros(len(fast), dtype=np.int8)
+    # Positions where both lines are valid
+    valid = np.flatnonzero(~(np.isnan(fast) | np.isnan(slow)))
+    above = fast[valid] > slow[valid]
+    # State before each valid row, starting from below
+    previous = np.zeros_like(above)
+    previous[1:] = above[:-1]
+    crossed = above != previous
+    codes[valid[crossed & above]] = BUY
+    codes[valid[crossed & ~above]] = SELL
+    return codes
+
+
+'''
+Returns int8 signal codes for each row of given values.
+BUY where value is below lower threshold, SELL where it is above upper threshold.
+'''
+def threshold_signals(values, lower, upper):
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.zeros(len(values), dtype=np.int8)
+    # NaN comparisons are False, so invalid rows stay HOLD
+    codes[values > upper] = SELL
+    codes[values < lower] = BUY
+    return codes
+
+
+'''
+Returns percentage of balance to trade for given operation ('BUY' or 'SELL') and RSI,
+0 if RSI is outside every tier.
+'''
+def position_size(operation, rsi):
+    if operation == 'BUY':
+        for bound, percentage in BUY_TIERS:
+            if rsi <= bound:
+                return percentage
+    elif operation == 'SELL':
+        for bound, percentage in SELL_TIERS:
+            if rsi >= bound:
+                return percentage
+    return 0
+
+
+'''
+Returns percentage of balance to trade for each row of signal codes and RSI values,
+0 where there is no signal or RSI is outside every tier.
+'''
+def position_sizes(codes, rsi):
+    rsi = np.asarray(rsi, dtype=np.float64)
+    sizes = np.zeros(len(codes))
+    # Looser tiers first so stricter ones overwrite them
+    for bound, percentage in reversed(BUY_TIERS):
+        sizes[(codes == BUY) & (rsi <= bound)] = percentage
+    for bound, percentage in reversed(SELL_TIERS):
+        sizes[(codes == SELL) & (rsi >= bound)] = percentage
+    return sizes
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from user import User
+from trade_bot import TradeBot
+from backtest import TRADING_FEE, BNB_FEE_DISCOUNT
+from intervals import interval_to_ms
+from kline_store import index_to_ms
+
+# Trade pairs' filters used when none are given
+DEFAULT_FILTERS = [
+    {'filterType': 'PRICE_FILTER', 'tickSize': '0.01000000'},
+    {'filterType': 'LOT_SIZE', 'stepSize': '0.00010000'},
+    {'filterType': 'NOTIONAL', 'minNotional': '10.00000000'},
+]
+
+
+class SimulatedClient:
+    '''
+    Offline exchange answering the binance client calls User makes.
+    Market orders fill immediately at the current price moved against the order
+    by slippage. Fees are paid in BNB with discount while BNB balance covers them,
+    otherwise in the received asset like Binance does.
+    prices holds the current price of each trade pair, replay updates it every kline.
+    '''
+    def __init__(self, symbols, balances, prices, fee=TRADING_FEE, slippage=0.0005):
+        # symbol -> (base asset, quote asset)
+        self.symbols = symbols
+        self.balances = {asset: float(amount) for asset, amount in balances.items()}
+        self.prices = prices
+        self.fee = fee
+        self.slippage = slippage
+        self.orders = []
+        self.time = 0
+
+    def get_exchange_info(self):
+        return {'symbols': [{'symbol': symbol, 'baseAsset': base, 'quoteAsset': quote, 'filters': DEFAULT_FILTERS}
+                            for symbol, (base, quote) in self.symbols.items()]}
+
+    def get_account(self):
+        return {'balances': [{'asset': asset, 'free': str(free), 'locked': '0'} for asset, free in self.balances.items()]}
+
+    def get_avg_price(self, symbol):
+        return {'price': str(self.prices[symbol])}
+
+    def order_market_buy(self, symbol, quoteOrderQty=None, quantity=None, **kwargs):
+        price = self.prices[symbol]*(1 + self.slippage)
+        if quantity is None:
+            quantity = quoteOrderQty/price
+        return self.fill(symbol, 'BUY', quantity, price)
+
+    def order_market_sell(self, symbol, quantity, **kwargs):
+        return self.fill(symbol, 'SELL', quantity, self.prices[symbol]*(1 - self.slippage))
+
+    '''
+    Moves balances for a filled order and returns an order response like Binance's
+    '''
+    def fill(self, symbol, side, quantity, price):
+        base, quote = self.symbols[symbol]
+        cost = quantity*price
+        sign = 1 if side == 'BUY' else -1
+        self.balances[base] = self.balances.get(base, 0.0) + sign*quantity
+        self.balances[quote] = self.balances.get(quote, 0.0) - sign*cost
+        # Fee in BNB needs the BNB price in quote asset
+        bnb_pair = 'BNB' + quote
+        bnb_fee = cost*self.fee*(1 - BNB_FEE_DISCOUNT)/self.prices[bnb_pair] if bnb_pair in self.prices else None
+        if bnb_fee is not None and self.balances.get('BNB', 0.0) >= bnb_fee:
+            commission, commission_asset = bnb_fee, 'BNB'
+        elif side == 'BUY':
+            commission, commission_asset = quantity*self.fee, base
+        else:
+            commission, commission_asset = cost*self.fee, quote
+        self.balances[commission_asset] -= commission
+        order = {'symbol': symbol, 'side': side, 'status': 'FILLED', 'transactTime': self.time,
+                 'executedQty': str(quantity), 'cummulativeQuoteQty': str(cost),
+                 'fills': [{'price': str(price), 'qty': str(quantity), 'commission': str(commission), 'commissionAsset': commission_asset}]}
+        self.orders.append(order)
+        return order
+
+
+class ReplayResult:
+    '''
+    Orders placed during a replay and the resulting balances.
+    '''
+    def __init__(self, client: SimulatedClient, base, quote, last_close, bnb_price, initial_equity):
+        self.orders = client.orders
+        self.balances = client.balances
+        self.initial_equity = initial_equity
+        # Equity in quote asset, base and BNB valued at their last prices
+        self.final_equity = client.balances.get(quote, 0.0) + client.balances.get(base, 0.0)*last_close
+        if base != 'BNB':
+            self.final_equity += client.balances.get('BNB', 0.0)*bnb_price
+
+
+'''
+Replays stored klines through TradeBot's decision logic on a simulated exchange.
+klines is a dataframe indexed by open time with a close column, eg. from
+KlineStore.load_frame. First warmup klines only seed indicators, ValueError is
+raised if no kline is left after them. Trend filters are built from the replayed
+klines, warmup ones included, and block BUYs until they have enough bars.
+BNB is valued at bnb_price in quote asset for fee payments and top-ups.
+'''
+def replay(klines: pd.DataFrame, symbol, base, quote, trade_interval='1m', balance=1000.0,
+           startWith='BUY', warmup=300, bnb_price=300.0, bnb_balance=0.01, fee=TRADING_FEE, slippage=0.0005,
+           trend_intervals=None):
+    if len(klines) <= warmup:
+        raise ValueError('Replay needs more klines than warmup: got {} klines, warmup is {}'.format(len(klines), warmup))
+    open_times = index_to_ms(klines.index)
+    closes = klines.close.to_numpy(dtype=np.float64)
+    # Missing columns fall back to closing prices
+    opens, highs, lows = (klines[column].to_numpy(dtype=np.float64) if column in klines else closes for column in ('open', 'high', 'low'))
+    volumes = klines.volume.to_numpy(dtype=np.float64) if 'volume' in klines else np.zeros(len(closes))
+    prices = {symbol: closes[0], 'BNB' + quote: bnb_price}
+    client = SimulatedClient({symbol: (base, quote), 'BNB' + quote: ('BNB', quote)},
+                             {quote: balance, 'BNB': bnb_balance}, prices, fee, slippage)
+    bot = TradeBot(User(client, verbose=False), symbol, trade_interval, '0s', verbose=False, trend_intervals=trend_intervals)
+    interval = interval_to_ms(trade_interval)
+    # Bot's clock follows replayed klines
+    bot.clock = lambda: client.time/1000
+    bot.next_operation = startWith
+    bot.indicators.seed(closes[:warmup])
+    if bot.resampler is not None:
+        for i in range(warmup):
+            bot.resampler.update(int(open_times[i]), opens[i], highs[i], lows[i], closes[i], volumes[i])
+    bot.last_kline_time = int(open_times[warmup - 1]) if warmup else None
+    initial_equity = balance + bnb_balance*bnb_price
+    rows = zip(open_times[warmup:].tolist(), closes[warmup:].tolist(), opens[warmup:].tolist(),
+               highs[warmup:].tolist(), lows[warmup:].tolist(), volumes[warmup:].tolist())
+    for open_time, close, open_, high, low, volume in rows:
+        prices[symbol] = close
+        # Decisions are made right after the kline closes
+        client.time = open_time + interval
+        bot.on_kline(open_time, open_, high, low, close, volume)
+    return ReplayResult(client, base, quote, closes[-1], bnb_price, initial_equity)
@@ -0,0 +1,255 @@
+import numpy as np
+from indicator_cache import IndicatorCache
+from signals import BUY, SELL, HOLD, crossover_signals, threshold_signals
+
+# Declared indicators, signal rules and strategies by name
+INDICATORS = {}
+RULES = {}
+STRATEGIES = {}
+
+
+class Indicator:
+    '''
+    Indicator computing one or more named lines from closing prices.
+    compute(cache, dataset, closes, params) returns a tuple of arrays in lines order.
+    Column and label formats are filled with parameters, eg. '{fast}sma'.
+    '''
+    def __init__(self, name, compute, defaults, lines, columns, labels):
+        self.name = name
+        self.compute = compute
+        self.defaults = defaults
+        self.lines = lines
+        self.columns = columns
+        self.labels = labels
+
+    '''
+    Returns parameters of this indicator from given ones, defaults fill the missing
+    '''
+    def params(self, params=None):
+        params = params or {}
+        return {key: params.get(key, value) for key, value in self.defaults.items()}
+
+    '''
+    Returns dataframe column names of lines for given parameters
+    '''
+    def column_names(self, params=None):
+        params = self.params(params)
+        return [column.format(**params) for column in self.columns]
+
+    def label_names(self, params=None):
+        params = self.params(params)
+        return [label.format(**params) for label in self.labels]
+
+
+class Rule:
+    '''
+    Signal rule turning indicator lines into int8 signal codes.
+    evaluate(lines, params) gets the lines a strategy feeds it in order.
+    levels are parameters drawn as horizontal lines when plotting, (parameter, label, color).
+    '''
+    def __init__(self, name, evaluate, defaults, levels=(), marks=True):
+        self.name = name
+        self.evaluate = evaluate
+        self.defaults = defaults
+        self.levels = levels
+        # Signals are marked on plots
+        self.marks = marks
+
+
+class StrategySpec:
+    '''
+    Indicator-rule pair, inputs are the indicator lines fed to the rule.
+    First input is the value reported with signals.
+    '''
+    def __init__(self, indicator: Indicator, name, rule: Rule, inputs):
+        self.indicator = indicator
+        self.name = name
+        self.rule = rule
+        self.inputs = inputs
+
+    '''
+    Returns full parameters of indicator and rule, defaults fill the missing
+    '''
+    def params(self, params=None):
+        params = params or {}
+        merged = self.indicator.params(params)
+        merged.update({key: params.get(key, value) for key, value in self.rule.defaults.items()})
+        return merged
+
+
+'''
+Decorator declaring an indicator, see Indicator
+'''
+def register_indicator(name, defaults, lines, columns=None, labels=None):
+    def decorator(compute):
+        INDICATORS[name] = Indicator(name, compute, defaults, lines, columns or lines, labels or columns or lines)
+        return compute
+    return decorator
+
+
+'''
+Decorator declaring a signal rule, see Rule
+'''
+def register_rule(name, defaults=None, levels=(), marks=True):
+    def decorator(evaluate):
+        RULES[name] = Rule(name, evaluate, defaults or {}, levels, marks)
+        return evaluate
+    return decorator
+
+
+'''
+Declares a strategy applying a registered rule to lines of a registered indicator
+'''
+def register_strategy(indicator, name, rule, inputs):
+    STRATEGIES[(indicator, name)] = StrategySpec(INDICATORS[indicator], name, RULES[rule], inputs)
+
+
+'''
+Returns declared strategy, raises ValueError for unknown ones
+'''
+def get_strategy(indicator, name):
+    if (indicator, name) not in STRATEGIES:
+        raise ValueError('Unknown strategy: ' + indicator + ' ' + name)
+    return STRATEGIES[(indicator, name)]
+
+
+'''
+Returns name of the first declared strategy of an indicator, None if it has none.
+Used when only the indicator is known.
+'''
+def default_strategy(indicator):
+    for key_indicator, strategy_name in STRATEGIES:
+        if key_indicator == indicator:
+            return strategy_name
+    return None
+
+
+'''
+Returns last non-HOLD code up to each row, HOLD before the first signal
+'''
+def signal_state(codes):
+    codes = np.asarray(codes)
+    last = np.where(codes != HOLD, np.arange(len(codes)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, codes[np.maximum(last, 0)], HOLD).astype(np.int8)
+
+
+'''
+Combines signal codes of several strategies.
+'any' signals where any strategy does, rows where they disagree are held.
+'all' buys once every strategy's last signal is BUY and sells as soon as any
+strategy's last signal turns to SELL.
+'''
+def combine_signals(codes, mode='all'):
+    codes = np.vstack(codes)
+    if len(codes) == 1:
+        return codes[0]
+    if mode == 'any':
+        buy = (codes == BUY).any(axis=0)
+        sell = (codes == SELL).any(axis=0)
+        return np.where(buy & ~sell, BUY, np.where(sell & ~buy, SELL, HOLD)).astype(np.int8)
+    if mode != 'all':
+        raise ValueError('Unknown combine mode: ' + mode)
+    state = np.vstack([signal_state(row) for row in codes])
+    combined = np.where((state == BUY).all(axis=0), BUY, np.where((state == SELL).any(axis=0), SELL, HOLD)).astype(np.int8)
+    # Signal only where combined state changes
+    changed = np.empty(len(combined), dtype=bool)
+    changed[0] = combined[0] != HOLD
+    changed[1:] = combined[1:] != combined[:-1]
+    return np.where(changed, combined, HOLD).astype(np.int8)
+
+
+class CompiledStrategy:
+    '''
+    One or more strategies bound to parameters and evaluated in a single pass over
+    closing prices. Each distinct indicator configuration is computed once and
+    shared between strategies, lower level arrays such as EMAs are shared through
+    the cache. Signal codes of several strategies are combined with combine_signals.
+    '''
+    def __init__(self, parts, mode='all'):
+        # (StrategySpec, full parameters) pairs
+        self.parts = parts
+        self.mode = mode
+
+    '''
+    Returns {(indicator name, indicator params): lines} of all strategies' indicators.
+    A shared cache is only used with the dataset key closes are cached under.
+    '''
+    def lines(self, closes, cache=None, dataset=None):
+        # Without a dataset key entries of different closes would collide
+        if cache is None or dataset is None:
+            cache = IndicatorCache()
+        closes = np.asarray(closes, dtype=np.float64)
+        results = {}
+        for spec, params in self.parts:
+            key = self.indicator_key(spec, params)
+            if key not in results:
+                results[key] = spec.indicator.compute(cache, dataset, closes, spec.indicator.params(params))
+        return results
+
+    '''
+    Returns combined signal codes for closing prices
+    '''
+    def evaluate(self, closes, cache=None, dataset=None):
+        return self.run(closes, cache, dataset)[1]
+
+    '''
+    Returns (indicator lines as in lines(), combined signal codes)
+    '''
+    def run(self, closes, cache=None, dataset=None):
+        lines = self.lines(closes, cache, dataset)
+        codes = []
+        for spec, params in self.parts:
+            indicator_lines = lines[self.indicator_key(spec, params)]
+            inputs = [indicator_lines[spec.indicator.lines.index(name)] for name in spec.inputs]
+            codes.append(spec.rule.evaluate(inputs, params))
+        return lines, combine_signals(codes, self.mode)
+
+    @staticmethod
+    def indicator_key(spec, params):
+        return (spec.indicator.name, tuple(sorted(spec.indicator.params(params).items())))
+
+
+'''
+Compiles (indicator, strategy) or (indicator, strategy, params) tuples into a
+CompiledStrategy, missing parameters take their declared defaults.
+'''
+def compile_strategy(*parts, mode='all'):
+    bound = []
+    for part in parts:
+        spec = get_strategy(part[0], part[1])
+        bound.append((spec, spec.params(part[2] if len(part) > 2 else None)))
+    return CompiledStrategy(bound, mode)
+
+
+@register_indicator('RSI', {'period': 15}, ('rsi',), labels=('RSI',))
+def rsi_lines(cache, dataset, closes, params):
+    return (cache.rsi(dataset, closes, params['period']),)
+
+
+@register_indicator('SMA', {'fast': 12, 'slow': 50}, ('fast', 'slow'), ('{fast}sma', '{slow}sma'), ('{fast} SMA', '{slow} SMA'))
+def sma_lines(cache, dataset, closes, params):
+    return cache.sma(dataset, closes, params['fast']), cache.sma(dataset, closes, params['slow'])
+
+
+@register_indicator('MACD', {'pfast': 12, 'pslow': 26, 'psignal': 9}, ('macd', 'signal', 'histogram'),
+                    ('macd', 'macdSignal', 'macdHist'), ('MACD', 'MACD Signal', 'MACD Histogram'))
+def macd_lines(cache, dataset, closes, params):
+    return cache.macd(dataset, closes, params['pfast'], params['pslow'], params['psignal'])
+
+
+# BUY where first line crosses above the second, SELL where it drops back
+@register_rule('CROSSOVER')
+def crossover_rule(lines, params):
+    return crossover_signals(lines[0], lines[1])
+
+
+# BUY below lower band, SELL above upper band
+@register_rule('THRESHOLD', {'lower': 30, 'upper': 70}, levels=(('upper', 'Overbought', 'r'), ('lower', 'Oversold', 'g')), marks=False)
+def threshold_rule(lines, params):
+    return threshold_signals(lines[0], params['lower'], params['upper'])
+
+
+register_strategy('MACD', 'CROSSOVER', 'CROSSOVER', ('macd', 'signal'))
+register_strategy('SMA', 'CROSSOVER', 'CROSSOVER', ('fast', 'slow'))
+register_strategy('RSI', 'OVERBOUGHT', 'THRESHOLD', ('rsi',))
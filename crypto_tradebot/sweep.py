@@ -0,0 +1,150 @@
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from indicator_cache import IndicatorCache
+from strategies import compile_strategy
+from backtest import run_backtest, TRADING_FEE
+
+# Default search space for each indicator-strategy pair, values to try per parameter
+DEFAULT_SPACE = {
+    ('MACD', 'CROSSOVER'): {'pfast': [8, 12, 16], 'pslow': [21, 26, 34], 'psignal': [5, 9, 13]},
+    ('SMA', 'CROSSOVER'): {'fast': [5, 12, 20], 'slow': [30, 50, 100, 200]},
+    ('RSI', 'OVERBOUGHT'): {'period': [7, 14, 15, 21], 'lower': [20, 25, 30], 'upper': [70, 75, 80]},
+}
+
+
+'''
+Returns False for configurations whose fast period isn't shorter than the slow one
+'''
+def valid_config(params):
+    if 'pfast' in params and params['pfast'] >= params['pslow']:
+        return False
+    if 'fast' in params and params['fast'] >= params['slow']:
+        return False
+    return True
+
+
+'''
+Returns every (indicator, strategy, params) combination of the search space
+'''
+def grid(space=DEFAULT_SPACE):
+    configs = []
+    for (indicator, strategy), params in space.items():
+        for values in itertools.product(*params.values()):
+            config = dict(zip(params.keys(), values))
+            if valid_config(config):
+                configs.append((indicator, strategy, config))
+    return configs
+
+
+'''
+Returns n random (indicator, strategy, params) combinations of the search space
+'''
+def random_configs(space=DEFAULT_SPACE, n=100, seed=None):
+    rng = random.Random(seed)
+    pairs = list(space.keys())
+    configs = []
+    while len(configs) < n:
+        indicator, strategy = rng.choice(pairs)
+        config = {name: rng.choice(values) for name, values in space[(indicator, strategy)].items()}
+        if valid_config(config):
+            configs.append((indicator, strategy, config))
+    return configs
+
+
+'''
+Returns per-kline signal codes of an indicator-strategy pair with given parameters.
+Indicators are memoized in given cache under dataset key, so configurations sharing
+periods don't recompute them.
+'''
+def strategy_signals(closes, indicator, strategy, params, cache=None, dataset=None):
+    return compile_strategy((indicator, strategy, params)).evaluate(closes, cache, dataset)
+
+
+class SharedCloses:
+    '''
+    Closing prices of each symbol copied once into shared memory blocks,
+    so worker processes read them without pickling.
+    '''
+    def __init__(self, closes):
+        self.blocks = {}
+        # symbol -> (block name, length) handed to workers
+        self.specs = {}
+        for symbol, values in closes.items():
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(len(values), dtype=np.float64, buffer=block.buf)[:] = values
+            self.blocks[symbol] = block
+            self.specs[symbol] = (block.name, len(values))
+
+    '''
+    Releases and removes shared memory blocks
+    '''
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Shared memory views attached once per worker process
+_worker_blocks = {}
+_worker_closes = {}
+# Indicators computed in this worker, keyed by symbol
+_worker_cache = IndicatorCache()
+
+
+def _attach(specs):
+    for symbol, (name, length) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _worker_blocks[symbol] = block
+        _worker_closes[symbol] = np.ndarray(length, dtype=np.float64, buffer=block.buf)
+
+
+def _evaluate(task):
+    symbol, indicator, strategy, params, balance, fee = task
+    closes = _worker_closes[symbol]
+    codes = strategy_signals(closes, indicator, strategy, params, _worker_cache, symbol)
+    result = run_backtest(closes, codes, balance, fee=fee)
+    return {'symbol': symbol, 'indicator': indicator, 'strategy': strategy, 'params': params,
+            'final_balance': result.final_balance, 'success_rate': result.success_rate,
+            'trades': result.sells, 'max_drawdown': result.max_drawdown}
+
+
+class ParameterSweep:
+    '''
+    Backtests indicator-strategy configurations on many symbols over a process pool.
+    Takes a dict of symbol -> kline dataframe (or closing price array) and ranks
+    results by final balance and success rate.
+    '''
+    def __init__(self, klines, balance=1000, fee=TRADING_FEE, workers=None):
+        self.closes = {symbol: getattr(data, 'close', data) for symbol, data in klines.items()}
+        self.balance = balance
+        self.fee = fee
+        self.workers = workers or os.cpu_count()
+
+    '''
+    Runs given configurations on every symbol, all grid combinations of the default
+    search space if none are given. Returns results sorted from best to worst.
+    '''
+    def run(self, configs=None):
+        if configs is None:
+            configs = grid()
+        tasks = [(symbol, indicator, strategy, params, self.balance, self.fee)
+                 for symbol in self.closes for indicator, strategy, params in configs]
+        with SharedCloses(self.closes) as shared:
+            with ProcessPoolExecutor(self.workers, initializer=_attach, initargs=(shared.specs,)) as executor:
+                # Large chunks keep per-task IPC small next to the backtests
+                chunksize = max(1, len(tasks)//(self.workers*4))
+                results = list(executor.map(_evaluate, tasks, chunksize=chunksize))
+        results.sort(key=lambda r: (r['final_balance'], r['success_rate']), reverse=True)
+        return results
@@ -1,7 +1,14 @@
 from user import User
-from strategy import Strategy
-import pandas as pd
+from indicators import LiveIndicators
+from signals import Signal, SIGNAL_NAMES, HOLD, position_size
+from trade_log import RingBuffer, TradeRecord, SIGNAL_DTYPE, TRADE_DTYPE
+from intervals import interval_to_ms
+from kline_stream import STREAM_ERROR
+from resampler import Resampler, TrendFilter
+from metrics import STAGE_SECONDS, SIGNAL_TO_ORDER_SECONDS
 from datetime import datetime, timedelta
+import queue
+import threading
 import time
 from requests import exceptions
 
@@ -10,7 +17,7 @@ class TradeBot:
     '''
     User object needs to be created beforehand
     '''
-    def __init__(self, user: User, symbol, trade_interval, runtime):
+    def __init__(self, user: User, symbol, trade_interval, runtime, verbose=True, trend_intervals=None, trend_period=50, executor=None, history=10000, chart=None, checkpoint=None):
         # User object containing client
         self.user = user
         # Trading pair eg.'BTCUSDT', 'ETHBUSD'
@@ -19,6 +26,39 @@ class TradeBot:
         self.trade_interval = trade_interval
         # Runtime eg.'15m', '4h'
         self.runtime = self.calculate_timedelta(runtime)
+        # Incremental MACD/RSI state, seeded once from history
+        self.indicators = LiveIndicators()
+        # Open time of the last closed kline fed to indicators
+        self.last_kline_time = None
+        # Closing price of the last closed kline
+        self.last_close = None
+        # Operation to perform next (either BUY or SELL)
+        self.next_operation = 'BUY'
+        # Print positions after trades
+        self.verbose = verbose
+        # Current time in seconds, replaced when replaying history
+        self.clock = time.time
+        # OrderExecutor placing orders in the background, orders block trading if not given
+        self.executor = executor
+        # Client order id -> order submitted to the executor and not executed yet
+        self.open_orders = {}
+        self.order_lock = threading.Lock()
+        # Last signals and trades, memory stays constant however long the bot runs
+        self.signals = RingBuffer(history, SIGNAL_DTYPE)
+        self.trades = RingBuffer(history, TRADE_DTYPE, TradeRecord)
+        # LiveChart drawing closed klines in another process
+        self.chart = chart
+        # Checkpoint the bot's state is saved to and restored from
+        self.checkpoint = checkpoint
+        self.saved_kline_time = None
+        # Optional higher timeframe trend filters, eg. ['15m', '1h', '4h'], a BUY needs all
+        # of them to agree. Their bars are built from this bot's klines.
+        self.trends = [TrendFilter(interval, trend_period) for interval in trend_intervals or ()]
+        self.resampler = None
+        if self.trends:
+            self.resampler = Resampler([trend.interval for trend in self.trends], trade_interval)
+            for trend in self.trends:
+                self.resampler.on_bar(trend.interval, trend.on_bar)
 
     '''
     Converts given time in formats like '1m', '2h' to timedelta
@@ -35,104 +75,332 @@ class TradeBot:
     Returns a pandas dataframe of klines
     '''
     def create_dataframe(self):
+        from kline_store import klines_to_frame
         # Gets klines, I3 indicators may be wrong results with low limits
-        klines = self.user.client.get_klines(symbol=self.symbol,interval=self.trade_interval,limit=300)
-        # Remove unnecessary columns
-        for line in klines:
-            for i in range(5):
-                line[i] = float(line[i])
-            del line[5:]
-        df = pd.DataFrame(klines,columns=['date','open','high','low','close'])
-        # Set date column as index
-        df.set_index('date', inplace=True)
-        df.index = pd.to_datetime(df.index, unit='ms')
-        return df
-
-    '''
-    Graphs given indicator
+        with STAGE_SECONDS.time(stage='kline_fetch'):
+            klines = self.user.client.get_klines(symbol=self.symbol,interval=self.trade_interval,limit=300)
+        with STAGE_SECONDS.time(stage='dataframe'):
+            return klines_to_frame(klines)
+
+    '''
+    Graphs given indicator with its first declared strategy
     Current indicators: 'MACD', 'RSI', 'SMA'
     '''
     def plot(self, indicator):
-        klines = self.create_dataframe()
-        if indicator == 'MACD':
-            st = Strategy('MACD','CROSSOVER',self.symbol,self.trade_interval,klines)
-        elif indicator == 'SMA':
-            st = Strategy('SMA','CROSSOVER',self.symbol,self.trade_interval,klines)
-        elif indicator == 'RSI':
-            st = Strategy('RSI','OVERBOUGHT',self.symbol,self.trade_interval,klines)
-        else:
+        # Plotting modules are only loaded when plotting
+        from strategies import default_strategy
+        from strategy import Strategy
+        strategy = default_strategy(indicator)
+        if strategy is None:
             return False
+        klines = self.create_dataframe()
+        st = Strategy(indicator,strategy,self.symbol,self.trade_interval,klines)
         st.plotIndicator()
 
+    '''
+    Seeds indicators from historical klines, only closed klines are used.
+    Returns False if there is no closed kline yet (eg. a new listing), seeding is
+    retried on the next tick then.
+    '''
+    def seed_indicators(self):
+        with STAGE_SECONDS.time(stage='kline_fetch'):
+            klines = self.user.client.get_klines(symbol=self.symbol,interval=self.trade_interval,limit=300)
+        now = int(time.time()*1000)
+        # Last kline is still open, its close time is in the future
+        closed = [line for line in klines if line[6] < now]
+        if not closed:
+            print(self.symbol, 'has no closed klines yet, seeding later')
+            return False
+        self.indicators.seed(float(line[4]) for line in closed)
+        self.seed_trends(now)
+        self.last_kline_time = closed[-1][0]
+        return True
+
+    '''
+    Seeds trend filters from klines of their own intervals, seeding their EMAs from
+    this bot's klines would take period bars worth of them, eg. 12000 1m klines
+    for a 4h EMA(50). The open kline of each interval becomes the bar in progress,
+    later klines of this bot update and complete it. Only its close is used by the
+    filter, which later klines replace.
+    '''
+    def seed_trends(self, now):
+        for trend in self.trends:
+            # Two periods of bars, the EMA is warm after the first one
+            limit = min(2*trend.ema.period + 1, 1000)
+            with STAGE_SECONDS.time(stage='kline_fetch'):
+                klines = self.user.client.get_klines(symbol=self.symbol,interval=trend.interval,limit=limit)
+            for line in klines:
+                if line[6] < now:
+                    trend.on_bar(trend.interval, [line[0]] + [float(value) for value in line[1:6]])
+                else:
+                    self.resampler.start_bar(trend.interval, [line[0]] + [float(value) for value in line[1:6]])
+            if not trend.ready():
+                print(self.symbol, trend.interval, 'trend has less than', trend.ema.period, 'bars, BUYs wait until it has them')
+
+    '''
+    Returns (open time, open, high, low, close, volume) of klines closed since the last processed one
+    '''
+    def fetch_closed_klines(self):
+        with STAGE_SECONDS.time(stage='kline_fetch'):
+            klines = self.user.client.get_klines(symbol=self.symbol,interval=self.trade_interval,startTime=self.last_kline_time+1)
+        now = int(time.time()*1000)
+        return [(line[0], float(line[1]), float(line[2]), float(line[3]), float(line[4]), float(line[5])) for line in klines if line[6] < now]
+
+    '''
+    Updates indicators with a closed kline and trades on the resulting signal
+    unless trade is False. Arguments follow kline column order, open, high, low
+    and volume are only used to build higher timeframe bars.
+    '''
+    def on_kline(self, open_time, open_, high, low, close, volume=0.0, trade=True):
+        with STAGE_SECONDS.time(stage='indicators'):
+            macd_signal, rsi_indicator = self.indicators.update(close)
+            if self.resampler is not None:
+                self.resampler.update(open_time, open_, high, low, close, volume)
+        self.last_kline_time = open_time
+        self.last_close = close
+        if macd_signal != HOLD:
+            self.signals.append(open_time + interval_to_ms(self.trade_interval), macd_signal, rsi_indicator, close)
+        if self.chart is not None:
+            self.chart.update(self.symbol, open_time, close, self.indicators.macd.macd, self.indicators.macd.signal, macd_signal)
+        if trade:
+            self.trade(SIGNAL_NAMES[macd_signal], rsi_indicator)
+
+    '''
+    True if the kline opened at open_time closed within one interval of now,
+    signals of older klines are stale
+    '''
+    def is_live(self, open_time):
+        return self.clock() < open_time/1000 + 2*interval_to_ms(self.trade_interval)/1000
+
+    '''
+    Performs the trade or doesn't based on macd_signal.
+    Amount to be traded is determined by the RSI indicator,
+    above 70 and below 30 are considered as the low-risk zones.
+    '''
+    def trade(self, macd_signal, rsi_indicator):
+        if self.next_operation == macd_signal:
+            # Any higher timeframe trend can veto buys
+            if not all(trend.allows(macd_signal, self.last_close) for trend in self.trends):
+                return
+            percentage = position_size(macd_signal, rsi_indicator)
+            if not percentage:
+                return
+            side = self.next_operation
+            self.next_operation = 'SELL' if side == 'BUY' else 'BUY'
+            close_time = self.last_kline_time/1000 + interval_to_ms(self.trade_interval)/1000
+            # Orders of klines that aren't live would inflate the signal to order latency
+            if not self.is_live(self.last_kline_time):
+                close_time = None
+            if self.executor is not None:
+                price = self.last_close if side == 'SELL' else None
+                self.submit_order(side, percentage, price, close_time)
+                # Position side changed, a restart must not trade it again
+                self.save_checkpoint(force=True)
+            elif side == 'BUY':
+                self.on_order(self.user.buy_market(self.symbol, percentage), side, close_time)
+            else:
+                self.on_order(self.user.sell_market(self.symbol, percentage, self.last_close), side, close_time)
+
+    '''
+    Submits a market order to the executor and keeps it in open orders until executed.
+    Given client order id resubmits an order that may have been placed already.
+    '''
+    def submit_order(self, side, percentage, price, close_time, client_order_id=None, submitted=None):
+        # Callback waits for the order to be registered
+        with self.order_lock:
+            request = self.executor.submit(self.symbol, side, percentage, price, client_order_id=client_order_id,
+                                           callback=lambda request, order: self.on_request(request, order, close_time))
+            self.open_orders[request.client_order_id] = {'client_order_id': request.client_order_id, 'side': side,
+                                                         'percentage': percentage, 'price': price, 'close_time': close_time,
+                                                         'submitted': self.clock() if submitted is None else submitted}
+
+    def on_request(self, request, order, close_time):
+        with self.order_lock:
+            self.open_orders.pop(request.client_order_id, None)
+        self.on_order(order, request.side, close_time)
+
+    '''
+    Recovers an open order of a previous run. The order is looked up by its client
+    order id and placed again only if it didn't reach Binance. An order that didn't
+    reach Binance within a trade interval has a stale signal, it's dropped and the
+    position side is reverted. Orders whose lookup or placement fails stay in open
+    orders, so the next checkpoint keeps them for the next restart.
+    '''
+    def recover_order(self, order):
+        side = order['side']
+        try:
+            placed = self.user.find_order(self.symbol, order['client_order_id'])
+            if placed is None:
+                if self.clock() - order['submitted'] > interval_to_ms(self.trade_interval)/1000:
+                    print(self.symbol, side, 'order', order['client_order_id'], 'was not placed, dropping stale order')
+                    self.next_operation = side
+                    return
+                if self.executor is not None:
+                    # Latency of orders of a previous run isn't observed
+                    self.submit_order(side, order['percentage'], order['price'], None, order['client_order_id'],
+                                      order['submitted'])
+                    return
+                placed = self.user.market_order(self.symbol, side, order['percentage'], order['price'],
+                                                client_order_id=order['client_order_id'])
+        except Exception as e:
+            print(self.symbol, side, 'order', order['client_order_id'], 'not recovered:', repr(e))
+            with self.order_lock:
+                self.open_orders[order['client_order_id']] = order
+            return
+        self.on_order(placed, side, None)
+
+    '''
+    Returns the bot's state as a JSON serializable dict
+    '''
+    def state(self):
+        with self.order_lock:
+            open_orders = list(self.open_orders.values())
+        state = {'symbol': self.symbol, 'trade_interval': self.trade_interval, 'next_operation': self.next_operation,
+                 'last_kline_time': self.last_kline_time, 'last_close': self.last_close,
+                 'indicators': self.indicators.state(), 'open_orders': open_orders}
+        if self.trends:
+            state['trend'] = {'intervals': [trend.interval for trend in self.trends], 'period': self.trends[0].ema.period,
+                              'filters': [trend.state() for trend in self.trends], 'resampler': self.resampler.state()}
+        return state
+
+    '''
+    Restores state returned by state(). Position side and open orders are always
+    restored, indicators and the last kline only if indicators is True and the
+    trend filters are configured the same way.
+    '''
+    def load_state(self, state, indicators=True):
+        self.next_operation = state['next_operation']
+        trend = state.get('trend')
+        if not self.trends:
+            indicators = indicators and trend is None
+        else:
+            configured = ([trend.interval for trend in self.trends], self.trends[0].ema.period)
+            indicators = indicators and trend is not None and (trend['intervals'], trend['period']) == configured
+        if indicators:
+            self.indicators.load_state(state['indicators'])
+            self.last_kline_time = state['last_kline_time']
+            self.last_close = state['last_close']
+            if self.trends:
+                for trend_filter, filter_state in zip(self.trends, trend['filters']):
+                    trend_filter.load_state(filter_state)
+                self.resampler.load_state(trend['resampler'])
+        for order in state['open_orders']:
+            self.recover_order(order)
+
+    '''
+    Saves state to the checkpoint if a kline was processed since the last save
+    '''
+    def save_checkpoint(self, force=False):
+        if self.checkpoint is None or (not force and self.last_kline_time == self.saved_kline_time):
+            return
+        self.checkpoint.save(self)
+        self.saved_kline_time = self.last_kline_time
+
+    '''
+    Records a placed order, called from executor threads when orders run in the background
+    '''
+    def on_order(self, order, side, close_time):
+        if order != False:
+            # Latency from kline close to the filled order, close time is None for non-live klines
+            if close_time is not None:
+                SIGNAL_TO_ORDER_SECONDS.observe(self.clock() - close_time)
+            record = TradeRecord.from_order(order, Signal[side], int(self.clock()*1000))
+            self.trades.append(*record.as_tuple())
+            self.showMessage(order)
+
+    '''
+    Feeds klines closed since the last processed one from REST. Klines missed
+    during an outage, a reconnect or a restart only update indicators, the newest
+    one trades if it's live, so old crossovers aren't traded at today's price.
+    '''
+    def backfill(self):
+        klines = self.fetch_closed_klines()
+        for i, kline in enumerate(klines):
+            self.on_kline(*kline, trade=i == len(klines) - 1 and self.is_live(kline[0]))
+
+    '''
+    Processes next event of a KlineStream.
+    Klines missed while the socket was reconnecting are backfilled from REST.
+    '''
+    def process_stream(self, stream):
+        try:
+            event = stream.get(timeout=1)
+        except queue.Empty:
+            return
+        # Socket gave up reconnecting, reopen it and catch up from REST
+        if event is STREAM_ERROR:
+            stream.restart()
+            self.backfill()
+            return
+        open_time = event[0]
+        # Gap since the last processed kline, fill it before this one
+        if open_time > self.last_kline_time + interval_to_ms(self.trade_interval):
+            self.backfill()
+        # Skip klines already processed through REST
+        if open_time > self.last_kline_time:
+            self.on_kline(*event, trade=self.is_live(open_time))
+
     '''
     Runs trade bot which only has one state(BUY or SELL) at a time. 
-    Initial state can be given as a parameter.
+    Initial state can be given as a parameter, otherwise it's restored from the
+    checkpoint or BUY.
+    Polls REST every 15 seconds unless a KlineStream is given, in which case
+    it acts on kline close events as they arrive.
+    A restored bot skips seeding and only feeds klines closed since its checkpoint.
     '''
-    def run(self, startWith='BUY'):
+    def run(self, startWith=None, stream=None):
         print("Trades begin")
+        if self.checkpoint is not None and self.checkpoint.restore(self, int(self.clock()*1000)):
+            print('Restored', self.symbol, 'from', self.checkpoint.path)
+        if startWith is not None:
+            self.next_operation = startWith
         start_time = datetime.utcnow()
-        reset_interval = self.calculate_timedelta('2h')
-        uptime = datetime.utcnow() - start_time
-        # Terminate when given time is reached
+        if stream is not None:
+            stream.start()
+        try:
+            self.loop(start_time, stream)
+        finally:
+            # Socket thread is closed on errors and Ctrl-C too
+            if stream is not None:
+                stream.stop()
+            self.save_checkpoint(force=True)
+
+    '''
+    Trading loop of run(), terminates when runtime is reached
+    '''
+    def loop(self, start_time, stream=None):
         while (self.runtime > datetime.utcnow() - start_time):
             try:
-                # Reset the client every 2 hours
-                if uptime > reset_interval:
-                    self.user.reset_client()
-                    uptime -= reset_interval
-                    
-                # Create dataframe and fill MACD, RSI columns
-                klines = self.create_dataframe()
-                macd = Strategy('MACD','CROSSOVER',self.symbol,self.trade_interval,klines)
-                rsi = Strategy('RSI','OVERBOUGHT',self.symbol,self.trade_interval,klines)
-                # Macd indicator to determine to buy or sell
-                macd_signal = 'HOLD'
-                # Operation to perform next (either BUY or SELL)
-                next_operation = startWith
-                # Rsi value for last kline
-                rsi_indicator = rsi.get_result()[-1][1]
-                # Make sure timestamps match
-                if macd.get_result()[-1][0] == klines.index[-1]: 
-                    macd_signal = macd.get_result()[-1][2]
+                # Seed indicators once, afterwards only feed newly closed klines
+                if self.last_kline_time is None:
+                    if not self.seed_indicators() and stream is not None:
+                        time.sleep(15)
+                elif stream is None:
+                    self.backfill()
                 else:
-                    macd_signal = 'HOLD'
-                
-                # Perform the trade or don't based on macd_signal
-                # Amount to be traded is determined by the RSI indicator
-                # Above 70 and below 30 are considered as the low-risk zones
-                if next_operation == macd_signal:
-                    order = False
-                    if next_operation == 'BUY':
-                        if rsi_indicator <= 30:
-                            order = self.user.buy_market(self.symbol, 70)
-                            next_operation = 'SELL'
-                        elif rsi_indicator <= 50:
-                            order = self.user.buy_market(self.symbol, 30)
-                            next_operation = 'SELL'
-                    elif next_operation == 'SELL':
-                        if rsi_indicator >= 70:
-                            order = self.user.sell_market(self.symbol, 100)
-                            next_operation = 'BUY'
-                        elif rsi_indicator >= 50:
-                            order = self.user.sell_market(self.symbol, 50)
-                            next_operation = 'BUY'   
-                    if order != False:
-                        self.showMessage(order)
-            # Handles requests' read operation timeouts
+                    self.process_stream(stream)
+                self.save_checkpoint()
+            # Handles requests' read operation timeouts the client gave up retrying
             except exceptions.ReadTimeout:
                 print('Read timeout')
+                if stream is not None:
+                    time.sleep(15)
             # Sleep in order to avoid timeouts
-            time.sleep(15)
+            if stream is None:
+                time.sleep(15)
 
     '''
     Shows information about the trade performed
     '''
     def showMessage(self, order):
+        if not self.verbose:
+            return
         if order == False:
             print('Error: trade did not occur')
         else:
             print('Position after trade:')
-            base = self.user.get_balance(self.symbol)['base']
-            quote = self.user.get_balance(self.symbol)['quote']
+            balance = self.user.get_balance(self.symbol)
+            base = balance['base']
+            quote = balance['quote']
             print(base['asset'],'Free:',base['free'],'Locked:',base['locked'])
             print(quote['asset'],'Free:',quote['free'],'Locked:',quote['locked'])
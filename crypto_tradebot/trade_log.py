@@ -0,0 +1,89 @@
+import threading
+import numpy as np
+from signals import SIGNAL_NAMES
+
+# Packed record layouts, times are milliseconds since epoch and signals are int8 codes
+SIGNAL_DTYPE = np.dtype([('time', 'i8'), ('signal', 'i1'), ('value', 'f8'), ('price', 'f8')])
+TRADE_DTYPE = np.dtype([('time', 'i8'), ('signal', 'i1'), ('price', 'f8'), ('quantity', 'f8'), ('quote', 'f8')])
+
+
+class TradeRecord:
+    '''
+    Single trade: time, signal code, average price, base quantity and quote quantity.
+    '''
+    __slots__ = ('time', 'signal', 'price', 'quantity', 'quote')
+
+    def __init__(self, time, signal, price, quantity, quote):
+        self.time = int(time)
+        self.signal = int(signal)
+        self.price = float(price)
+        self.quantity = float(quantity)
+        self.quote = float(quote)
+
+    '''
+    Builds a record from a filled order response, time is used if the response has none
+    '''
+    @classmethod
+    def from_order(cls, order, signal, time):
+        quantity = float(order['executedQty'])
+        quote = float(order['cummulativeQuoteQty'])
+        price = quote/quantity if quantity else 0.0
+        return cls(order.get('transactTime', time), signal, price, quantity, quote)
+
+    @property
+    def side(self):
+        return SIGNAL_NAMES[self.signal]
+
+    def as_tuple(self):
+        return (self.time, self.signal, self.price, self.quantity, self.quote)
+
+    def __repr__(self):
+        return 'TradeRecord({} {} @ {} quantity={} quote={})'.format(self.side, self.time, self.price, self.quantity, self.quote)
+
+
+class RingBuffer:
+    '''
+    Fixed capacity log of records in a preallocated structured array, the oldest
+    records are overwritten once it's full so memory stays constant.
+    Iterating yields record(*fields) if a record class is given, rows otherwise.
+    Records may be appended from order callbacks on executor threads, so access is locked.
+    '''
+    def __init__(self, capacity, dtype=TRADE_DTYPE, record=None):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.record = record
+        # Number of records ever appended
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def append(self, *fields):
+        with self.lock:
+            self.data[self.count % self.capacity] = fields
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    '''
+    Returns a copy of kept records from oldest to newest
+    '''
+    def array(self):
+        with self.lock:
+            if self.count <= self.capacity:
+                return self.data[:self.count].copy()
+            start = self.count % self.capacity
+            return np.concatenate((self.data[start:], self.data[:start]))
+
+    '''
+    Returns the newest record, None if empty
+    '''
+    def last(self):
+        with self.lock:
+            if not self.count:
+                return None
+            row = self.data[(self.count - 1) % self.capacity].copy()
+        return self.record(*row.tolist()) if self.record is not None else row
+
+    def __iter__(self):
+        for row in self.array():
+            yield self.record(*row.tolist()) if self.record is not None else row
@@ -1,98 +1,159 @@
-from binance.client import Client
+import threading
 from binance.exceptions import BinanceAPIException, BinanceOrderException
 from binance.enums import *
-from math import log10
+from exchange_info import ExchangeInfo, BalanceCache
+from metrics import InstrumentedClient, STAGE_SECONDS
 import userdata
 
 
+class LazyClient:
+    '''
+    Client proxy creating the client on first use, so starting up doesn't wait for
+    binance client's import and its connection check.
+    '''
+    def __init__(self, factory):
+        self.factory = factory
+        self.client = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.factory()
+        return getattr(self.client, name)
+
+
 class User:
     '''
-    Instantiates user using API keys on userdata.py
+    Instantiates user using API keys on userdata.py, or with given client.
+    Client is created when it's first used.
+    Top-ups and skipped orders are printed if verbose is set.
     '''
-    def __init__(self):
-        self.client = self.create_client()
+    def __init__(self, client=None, verbose=True):
+        self.verbose = verbose
+        self.client = client if client is not None else LazyClient(self.create_client)
+        # Trading rules and balances are cached to save REST round trips
+        self.exchange_info = ExchangeInfo(self.client)
+        self.balances = BalanceCache(self.client)
     
     '''
     Create binance client
     '''
     def create_client(self):
+        # binance.client loads slowly, it's only imported once a client is needed
+        from rest_client import RateLimitedClient
         # Read keys from userdata.py
-        client =  Client(userdata.api_public, userdata.api_secret)
+        # Its pooled connections are kept for the whole run, it never needs to be reset
+        client =  RateLimitedClient(userdata.api_public, userdata.api_secret)
         # Uncomment following line to test on testnet
         # NOTE: Testnet requires different API keys
         # client.API_URL = "https://testnet.binance.vision/api"
-        return client
+        # Count and time every REST call
+        return InstrumentedClient(client)
 
     '''
-    Reset binance client to avoid timeouts
+    Replace binance client, caches use the new client afterwards
     '''
-    def reset_client(self):
-        self.client = self.create_client()
+    def set_client(self, client):
+        self.client = client
+        self.exchange_info.client = client
+        self.balances.client = client
+
+    '''
+    Keep cached balances up to date from user data stream.
+    Socket manager needs to be started by the caller.
+    '''
+    def start_balance_stream(self, socket_manager):
+        return socket_manager.start_user_socket(self.balances.handle_event)
 
     '''
     Returns users balance for assets in given trade pair
     '''
     def get_balance(self, pair):
         # Get symbol info to determine base and quote assets
-        symbol_info = self.client.get_symbol_info(pair)
-        # Get user's balance on base asset
-        base = self.client.get_asset_balance(symbol_info['baseAsset'])
-        # If no base asset owned, create dict with 0 values
-        if base == None:
-            base = {'asset':symbol_info['baseAsset'], 'free':0, 'locked':0}
-        # Get user's balance on quote asset
-        quote = self.client.get_asset_balance(symbol_info['quoteAsset'])
-        # If no quote asset owned, create dict with 0 values
-        if quote == None:
-            quote = {'asset':symbol_info['quoteAsset'], 'free':0, 'locked':0}
+        symbol_info = self.exchange_info.symbol(pair)
+        base = self.balances.get(symbol_info.base_asset)
+        quote = self.balances.get(symbol_info.quote_asset)
         return {'base':base, 'quote':quote}
 
     '''
     Place market buy order for given percentage of maximum possible amount
     '''
     def buy_market(self, pair, percentage):
-        # Calculate quantity to be bought of quote asset
-        precision = -1*int(log10(float(self.client.get_symbol_info(pair)['filters'][0]['tickSize'])))
-        # Get balance on quote asset
-        quote_balance = float(self.get_balance(pair)['quote']['free'])
-        qt = round(quote_balance*percentage/100, precision)
-        # Check if calculated quantity is greater than minimum allowed
-        if qt < float(self.client.get_symbol_info('ETHUSDT')['filters'][3]['minNotional']):
-            print('Insufficient balance')
-            return False
-        # Constant topup values set for trading in BUSD 10-200 range
-        self.topup_bnb(0.004, 0.003, self.get_balance(pair)['quote']['asset'])
         try:
-            return self.client.order_market_buy(symbol=pair, quoteOrderQty=qt)
-        except BinanceAPIException as e:
-            print(e)
-        except BinanceOrderException as e:
+            return self.market_order(pair, SIDE_BUY, percentage)
+        except (BinanceAPIException, BinanceOrderException) as e:
             print(e)
         return False
         
     '''
-    Place market sell order for given percentage of maximum possible amount
+    Place market sell order for given percentage of maximum possible amount.
+    Minimum amount check uses given price, average price is requested if it's not given.
     '''
-    def sell_market(self, pair, percentage):
-        # Calculate quantity to be sold of base asset
-        avg_price = float(self.client.get_avg_price(pair)['price'])
-        precision = -1*int(log10(float(self.client.get_symbol_info(pair)['filters'][2]['stepSize'])))
-        base_balance = float(self.get_balance(pair)['base']['free'])
-        qt = round(base_balance*percentage/100, precision)
+    def sell_market(self, pair, percentage, price=None):
+        try:
+            return self.market_order(pair, SIDE_SELL, percentage, price)
+        except (BinanceAPIException, BinanceOrderException) as e:
+            print(e)
+        return False
+
+    '''
+    Place market order of given side for percentage of maximum possible amount,
+    buys spend quote asset and sells spend base asset. Returns False if balance is
+    insufficient, API errors are raised. Given client order id makes the order
+    traceable with find_order. BNB is topped up beforehand if topup is set.
+    '''
+    def market_order(self, pair, side, percentage, price=None, client_order_id=None, topup=True):
+        symbol_info = self.exchange_info.symbol(pair)
+        if side == SIDE_BUY:
+            # Calculate quantity to be bought of quote asset
+            quote_balance = float(self.balances.get(symbol_info.quote_asset)['free'])
+            qt = round(quote_balance*percentage/100, symbol_info.tick_precision)
+            notional = qt
+        else:
+            # Calculate quantity to be sold of base asset
+            if price is None:
+                price = float(self.client.get_avg_price(symbol=pair)['price'])
+            base_balance = float(self.balances.get(symbol_info.base_asset)['free'])
+            qt = round(base_balance*percentage/100, symbol_info.step_precision)
+            notional = qt*price
         # Check if calculated quantity is greater than minimum allowed
-        if qt*avg_price < float(self.client.get_symbol_info('ETHUSDT')['filters'][3]['minNotional']):
-            print('Insufficient balance')
+        if notional < symbol_info.min_notional:
+            if self.verbose:
+                print('Insufficient balance')
             return False
-        # Constant topup values set for trading in BUSD 10-200 range
-        self.topup_bnb(0.004, 0.003, self.get_balance(pair)['quote']['asset'])
+        if topup:
+            # Constant topup values set for trading in BUSD 10-200 range
+            with STAGE_SECONDS.time(stage='topup_bnb'):
+                self.topup_bnb(0.004, 0.003, symbol_info.quote_asset)
+        params = {} if client_order_id is None else {'newClientOrderId': client_order_id}
         try:
-            order =  self.client.order_market_sell(symbol=pair, quantity=qt)
-            return order
+            with STAGE_SECONDS.time(stage='order'):
+                if side == SIDE_BUY:
+                    order = self.client.order_market_buy(symbol=pair, quoteOrderQty=qt, **params)
+                else:
+                    order = self.client.order_market_sell(symbol=pair, quantity=qt, **params)
+        except BinanceAPIException:
+            self.balances.invalidate()
+            raise
+        self.balances.update_from_order(order, symbol_info)
+        return order
+
+    '''
+    Returns the order placed with given client order id, None if there is no such order.
+    Fills aren't included, so cached balances are reloaded when an order is found.
+    '''
+    def find_order(self, pair, client_order_id):
+        try:
+            order = self.client.get_order(symbol=pair, origClientOrderId=client_order_id)
         except BinanceAPIException as e:
-            print(e)
-        except BinanceOrderException as e:
-            print(e)    
-        return False
+            # Order does not exist
+            if e.code == -2013:
+                return None
+            raise
+        self.balances.invalidate()
+        return order
 
     '''
     Top-up BNB balance to pay for commission fees with lower rates
@@ -102,8 +163,10 @@ class User:
         bnb = float(self.get_balance('BNB'+symbol)['base']['free'])
         # If balance is lower than specified amount, buy with quantity topup
         if bnb < min_balance:
-            qty = round(topup - bnb, 5)
+            qty = round(topup, 5)
             order = self.client.order_market_buy(symbol='BNB'+symbol, quantity=qty)
-            print('BUY',qty,'BNB','to topup')
+            self.balances.update_from_order(order, self.exchange_info.symbol('BNB'+symbol))
+            if self.verbose:
+                print('BUY',qty,'BNB','to topup')
             return order
         return False
@@ -0,0 +1,19 @@
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Bot modules import each other by name, like main.py run from crypto_tradebot/
+sys.path.insert(0, os.path.join(ROOT, 'crypto_tradebot'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+class MissingOrder:
+    '''
+    Response Binance sends for an unknown order
+    '''
+    status_code = 400
+    text = '{"code": -2013, "msg": "Order does not exist."}'
+
+    def json(self):
+        return json.loads(self.text)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import synthetic_klines, START_TIME
+from kline_store import KlineStore, index_to_ms
+from strategy import Strategy
+from signals import BUY, SELL, position_sizes
+from backtest import Backtest, run_backtest, cumulative_matmul, TRADING_FEE
+
+MINUTE = 60000
+
+
+def stored_frame(tmp_path, n):
+    store = KlineStore(str(tmp_path))
+    klines = synthetic_klines(n, seed=3)
+    store.append('ETHUSDT', '1m', klines)
+    return store.load_frame('ETHUSDT', '1m'), klines
+
+
+def test_index_to_ms():
+    times = START_TIME + MINUTE*np.arange(3)
+    for index in (pd.to_datetime(times, unit='ms'), pd.DatetimeIndex(times.astype('datetime64[ms]'))):
+        assert index_to_ms(index).tolist() == times.tolist()
+
+
+def test_backtest_trade_times_are_kline_open_times(tmp_path):
+    # Index unit is milliseconds on pandas>=2, nanoseconds before
+    df, klines = stored_frame(tmp_path, 3000)
+    backtest = Backtest(df.index[0], df.index[-1], 1000, Strategy('MACD', 'CROSSOVER', 'ETHUSDT', '1m', df))
+    backtest.run()
+    assert len(backtest.portfolio) > 2
+    expected = [klines[i][0] for i in backtest.result.trade_idx]
+    assert backtest.portfolio['time'].tolist() == expected
+
+
+'''
+Backtest loop run_backtest replaced: starts in BUY state and trades at each
+signal of the current state whose fraction isn't zero. Returns (equity per kline,
+trades as (index, code, price, base quantity, quote quantity, fee)).
+'''
+def reference_backtest(closes, codes, balance, fractions=None, fee=TRADING_FEE):
+    quote, base, state = balance, 0.0, BUY
+    equity, trades = [], []
+    for i, (close, code) in enumerate(zip(closes, codes)):
+        fraction = 1.0 if fractions is None else fractions[i]
+        if code == state and fraction > 0:
+            if state == BUY:
+                spent = quote*fraction
+                quantity = spent*(1 - fee)/close
+                quote, base, state = quote - spent, base + quantity, SELL
+                trades.append((i, BUY, close, quantity, spent, spent*fee))
+            else:
+                quantity = base*fraction
+                received = quantity*close
+                quote, base, state = quote + received*(1 - fee), base - quantity, BUY
+                trades.append((i, SELL, close, quantity, received, received*fee))
+        equity.append(quote + base*close)
+    return np.array(equity), trades
+
+
+def random_series(n, seed, density=0.05):
+    rng = np.random.default_rng(seed)
+    closes = 1000*np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    codes = np.where(rng.random(n) < density, rng.choice([BUY, SELL], n), 0).astype(np.int8)
+    return closes, codes, rng
+
+
+def assert_matches_reference(result, closes, codes, balance, fractions=None, fee=TRADING_FEE):
+    equity, trades = reference_backtest(closes, codes, balance, fractions, fee)
+    np.testing.assert_allclose(result.equity, equity, rtol=1e-11)
+    assert result.trade_idx.tolist() == [trade[0] for trade in trades]
+    assert result.trade_signals.tolist() == [trade[1] for trade in trades]
+    if trades:
+        _, _, prices, quantities, quote, fees = (np.array(column) for column in zip(*trades))
+        np.testing.assert_allclose(result.trade_prices, prices, rtol=1e-12)
+        np.testing.assert_allclose(result.trade_quantities, quantities, rtol=1e-11)
+        np.testing.assert_allclose(result.trade_quote, quote, rtol=1e-11)
+        np.testing.assert_allclose(result.fees, fees, rtol=1e-11)
+    drawdown = equity/np.maximum.accumulate(equity) - 1 if len(equity) else equity
+    assert result.max_drawdown == pytest.approx(drawdown.min() if len(drawdown) else 0.0, abs=1e-12)
+    sells = [trade for trade in trades if trade[1] == SELL]
+    assert result.sells == len(sells)
+    wins = [sell[2] > buy[2] for buy, sell in zip(trades[::2], trades[1::2])]
+    assert result.success_rate == pytest.approx(np.mean(wins) if wins else 0.0)
+
+
+def test_cumulative_matmul_matches_sequential_products():
+    mats = np.random.default_rng(0).normal(size=(37, 2, 2))
+    product = np.eye(2)
+    for mat, running in zip(mats, cumulative_matmul(mats)):
+        product = mat @ product
+        np.testing.assert_allclose(running, product, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize('fee', [0.0, TRADING_FEE, 0.01])
+def test_run_backtest_matches_loop_with_fees(fee):
+    closes, codes, _ = random_series(5000, 1)
+    result = run_backtest(closes, codes, 1000.0, fee=fee)
+    assert result.sells > 20
+    assert_matches_reference(result, closes, codes, 1000.0, fee=fee)
+
+
+def test_run_backtest_matches_loop_with_rsi_position_sizing():
+    closes, codes, rng = random_series(5000, 2, density=0.2)
+    rsi = rng.uniform(0, 100, len(closes))
+    fractions = position_sizes(codes, rsi)/100
+    # Some signals fall outside every tier and aren't traded
+    assert ((codes != 0) & (fractions == 0)).any()
+    assert ((fractions > 0) & (fractions < 1)).any()
+    result = run_backtest(closes, codes, 1000.0, fractions)
+    assert_matches_reference(result, closes, codes, 1000.0, fractions)
+
+
+def test_run_backtest_that_never_sells():
+    closes, _, _ = random_series(300, 3)
+    codes = np.zeros(300, dtype=np.int8)
+    codes[[5, 50, 100]] = BUY
+    result = run_backtest(closes, codes, 1000.0)
+    assert result.trade_idx.tolist() == [5]
+    assert result.sells == 0
+    assert result.success_rate == 0.0
+    # Position is valued at the last close
+    assert result.final_balance == pytest.approx(result.trade_quantities[0]*closes[-1])
+    assert_matches_reference(result, closes, codes, 1000.0)
+
+
+@pytest.mark.parametrize('n', [0, 200])
+def test_run_backtest_without_trades(n):
+    closes, _, _ = random_series(n, 4)
+    codes = np.zeros(n, dtype=np.int8)
+    # Sells before any buy have nothing to sell
+    codes[n//2:n//2 + 3] = SELL
+    result = run_backtest(closes, codes, 1000.0)
+    assert len(result.trade_idx) == 0
+    assert result.final_balance == 1000.0
+    assert result.max_drawdown == 0.0
+    assert result.total_fees == 0.0
+    assert_matches_reference(result, closes, codes, 1000.0)
@@ -0,0 +1,60 @@
+import csv
+from synthetic import synthetic_klines
+from kline_store import KlineStore
+from batch_backtest import BatchBacktest, CsvReport, walk_forward_windows
+
+DAY = 24*60*60000
+
+
+def stored_klines(tmp_path, n=3*24*60):
+    root = str(tmp_path / 'klines')
+    KlineStore(root).append('ETHUSDT', '1m', synthetic_klines(n))
+    return root
+
+
+def read_report(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_walk_forward_windows():
+    open_times = [i*60000 for i in range(3*24*60)]
+    windows = walk_forward_windows(open_times, DAY, DAY // 2)
+    assert windows[0] == (0, 24*60, 36*60)
+    # Last window needs a full test period
+    assert windows[-1] == (24*60, 48*60, 60*60)
+    assert len(windows) == 3
+    assert walk_forward_windows(open_times) == [(0, 0, len(open_times))]
+
+
+def test_run_resumes_and_keeps_runs_apart(tmp_path):
+    root = stored_klines(tmp_path)
+    report = str(tmp_path / 'report.csv')
+    strategies = [('MACD', 'CROSSOVER'), ('RSI', 'OVERBOUGHT')]
+    batch = BatchBacktest(root, ['ETHUSDT'], '1m', strategies, workers=1)
+    assert batch.run(report) == 2
+    # Same settings skip finished windows
+    assert batch.run(report) == 0
+    # Other settings run again next to the first run's rows
+    other = BatchBacktest(root, ['ETHUSDT'], '1m', strategies, fee=0.002, workers=1)
+    assert other.run(report) == 2
+    rows = read_report(report)
+    assert len(rows) == 4
+    assert {row['run'] for row in rows} == {batch.run_key(), other.run_key()}
+
+
+def test_interrupted_window_runs_again(tmp_path):
+    root = stored_klines(tmp_path)
+    report = str(tmp_path / 'report.csv')
+    batch = BatchBacktest(root, ['ETHUSDT'], '1m', [('MACD', 'CROSSOVER'), ('RSI', 'OVERBOUGHT')], workers=1)
+    batch.run(report)
+    # Interruption left the first row of the window and half of the second
+    with open(report, 'rb') as f:
+        data = f.read()
+    lines = data.split(b'\n')
+    with open(report, 'wb') as f:
+        f.write(b'\n'.join(lines[:2]) + b'\n' + lines[2][:10])
+    assert CsvReport(report).done() == set()
+    assert batch.run(report) == 2
+    rows = read_report(report)
+    assert [row['strategy'] for row in rows] == ['CROSSOVER', 'OVERBOUGHT']
@@ -0,0 +1,86 @@
+import time
+import pytest
+from binance.exceptions import BinanceAPIException
+from synthetic import FakeClient
+from conftest import MissingOrder
+from user import User
+from trade_bot import TradeBot
+from checkpoint import Checkpoint, checkpoint_path
+
+
+class RecoveryClient(FakeClient):
+    '''
+    Fake client knowing orders placed by client order id, get_order raises lookup_error if set
+    '''
+    def __init__(self, placed=None, lookup_error=None):
+        super().__init__()
+        self.placed = dict(placed or {})
+        self.lookup_error = lookup_error
+        self.orders = []
+
+    def order_market_buy(self, symbol, quoteOrderQty=None, quantity=None, **kwargs):
+        self.orders.append(kwargs.get('newClientOrderId'))
+        return super().order_market_buy(symbol, quoteOrderQty, quantity)
+
+    def get_order(self, symbol, origClientOrderId):
+        if self.lookup_error is not None:
+            raise self.lookup_error
+        if origClientOrderId in self.placed:
+            return self.placed[origClientOrderId]
+        raise BinanceAPIException(MissingOrder())
+
+
+def open_order(age=0):
+    return {'client_order_id': 'ETHUSDT-abc', 'side': 'BUY', 'percentage': 10, 'price': None, 'close_time': None,
+            'submitted': time.time() - age}
+
+
+'''
+Returns a bot restored from a checkpoint holding given open order, its position
+side was switched to SELL when the order was submitted
+'''
+def restored_bot(tmp_path, client, order):
+    path = checkpoint_path(str(tmp_path), 'ETHUSDT', '1m')
+    saved = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False)
+    saved.next_operation = 'SELL'
+    saved.open_orders[order['client_order_id']] = order
+    Checkpoint(path).save(saved)
+    bot = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False)
+    assert Checkpoint(path).restore(bot, time.time()*1000)
+    return bot
+
+
+def test_placed_order_is_not_placed_again(tmp_path):
+    client = RecoveryClient(placed={'ETHUSDT-abc': FakeClient().fill('ETHUSDT', 'BUY', 0.1)})
+    bot = restored_bot(tmp_path, client, open_order())
+    assert client.orders == []
+    assert len(bot.trades) == 1
+    assert bot.next_operation == 'SELL'
+
+
+def test_missing_order_is_placed_with_its_client_order_id(tmp_path):
+    client = RecoveryClient()
+    bot = restored_bot(tmp_path, client, open_order(age=10))
+    assert client.orders == ['ETHUSDT-abc']
+    assert len(bot.trades) == 1
+
+
+def test_stale_missing_order_is_dropped(tmp_path):
+    client = RecoveryClient()
+    bot = restored_bot(tmp_path, client, open_order(age=120))
+    assert client.orders == []
+    # Order never reached Binance, position side is reverted to BUY and the stale
+    # signal isn't replayed, the bot waits for a new one
+    assert bot.next_operation == 'BUY'
+    assert bot.open_orders == {}
+
+
+@pytest.mark.parametrize('error', [ConnectionError('down'), ValueError('bad response')])
+def test_failed_lookup_keeps_the_order(tmp_path, error):
+    client = RecoveryClient(lookup_error=error)
+    order = open_order()
+    bot = restored_bot(tmp_path, client, order)
+    assert client.orders == []
+    assert bot.open_orders == {order['client_order_id']: order}
+    # Next checkpoint keeps it for the next restart
+    assert bot.state()['open_orders'] == [order]
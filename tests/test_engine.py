@@ -0,0 +1,25 @@
+import time
+from synthetic import synthetic_klines, FakeClient
+from user import User
+import engine
+
+
+class FailingClient(FakeClient):
+    '''
+    Fake client that rejects one symbol like Binance rejects unknown symbols
+    '''
+    def get_klines(self, symbol, interval, **kwargs):
+        if symbol == 'BADUSDT':
+            raise ValueError('Invalid symbol')
+        return super().get_klines(symbol, interval, **kwargs)
+
+
+def test_failing_pair_does_not_stop_the_others(monkeypatch):
+    monkeypatch.setattr(engine, 'ERROR_BACKOFF', 0.1)
+    start = (int(time.time()*1000)//60000 - 305)*60000
+    client = FailingClient(synthetic_klines(300, start_time=start))
+    trade_engine = engine.TradeEngine(User(client), ['ETHUSDT', 'BADUSDT'], '1m', '1s')
+    trade_engine.run()
+    good, bad = trade_engine.bots
+    assert good.last_kline_time == start + 299*60000
+    assert bad.last_kline_time is None
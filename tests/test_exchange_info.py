@@ -0,0 +1,142 @@
+import pytest
+from synthetic import FakeClient
+from exchange_info import SymbolInfo, ExchangeInfo, BalanceCache
+from user import User
+
+# Trimmed exchangeInfo response, filters in the order Binance sends them
+EXCHANGE_INFO = {'timezone': 'UTC', 'serverTime': 1609459200000, 'symbols': [
+    {'symbol': 'ETHBUSD', 'status': 'TRADING', 'baseAsset': 'ETH', 'baseAssetPrecision': 8,
+     'quoteAsset': 'BUSD', 'quotePrecision': 8, 'filters': [
+        {'filterType': 'PRICE_FILTER', 'minPrice': '0.01000000', 'maxPrice': '1000000.00000000', 'tickSize': '0.01000000'},
+        {'filterType': 'PERCENT_PRICE', 'multiplierUp': '5', 'multiplierDown': '0.2', 'avgPriceMins': 5},
+        {'filterType': 'LOT_SIZE', 'minQty': '0.00010000', 'maxQty': '9000000.00000000', 'stepSize': '0.00010000'},
+        {'filterType': 'MIN_NOTIONAL', 'minNotional': '10.00000000', 'applyToMarket': True, 'avgPriceMins': 5},
+        {'filterType': 'MARKET_LOT_SIZE', 'minQty': '0.00000000', 'maxQty': '2500.00000000', 'stepSize': '0.00000000'}]},
+    {'symbol': 'BNBBUSD', 'status': 'TRADING', 'baseAsset': 'BNB', 'quoteAsset': 'BUSD', 'filters': [
+        {'filterType': 'LOT_SIZE', 'minQty': '0.00100000', 'maxQty': '9000000.00000000', 'stepSize': '0.00100000'},
+        {'filterType': 'PRICE_FILTER', 'minPrice': '0.10000000', 'maxPrice': '100000.00000000', 'tickSize': '0.10000000'},
+        {'filterType': 'NOTIONAL', 'minNotional': '5.00000000', 'applyMinToMarket': True}]},
+    {'symbol': 'SHIBBUSD', 'status': 'TRADING', 'baseAsset': 'SHIB', 'quoteAsset': 'BUSD', 'filters': [
+        {'filterType': 'PRICE_FILTER', 'minPrice': '0.00000001', 'maxPrice': '1.00000000', 'tickSize': '0.00000001'},
+        {'filterType': 'LOT_SIZE', 'minQty': '1.00000000', 'maxQty': '92141578.00000000', 'stepSize': '1.00000000'}]}]}
+
+
+class CannedClient(FakeClient):
+    '''
+    Fake client answering with the canned exchangeInfo, orders fill at price
+    with a BNB commission. (symbol, side, quantity sent) of orders are kept in orders.
+    '''
+    def __init__(self, balances, price=2000.0):
+        super().__init__(price=price)
+        self.balances = balances
+        self.orders = []
+
+    def get_exchange_info(self):
+        self.calls += 1
+        return EXCHANGE_INFO
+
+    def get_account(self):
+        self.calls += 1
+        return {'balances': [{'asset': asset, 'free': free, 'locked': '0.00000000'} for asset, free in self.balances.items()]}
+
+    def order_market_buy(self, symbol, quoteOrderQty=None, quantity=None, **kwargs):
+        self.orders.append((symbol, 'BUY', quoteOrderQty if quantity is None else quantity))
+        return super().order_market_buy(symbol, quoteOrderQty, quantity)
+
+    def order_market_sell(self, symbol, quantity, **kwargs):
+        self.orders.append((symbol, 'SELL', quantity))
+        return super().order_market_sell(symbol, quantity)
+
+    def fill(self, symbol, side, quantity):
+        order = super().fill(symbol, side, quantity)
+        order['fills'][0]['commission'] = '0.00010000'
+        return order
+
+
+def symbols():
+    return {item['symbol']: SymbolInfo(item) for item in EXCHANGE_INFO['symbols']}
+
+
+def test_filters_are_parsed_by_type():
+    info = symbols()
+    eth = info['ETHBUSD']
+    assert (eth.base_asset, eth.quote_asset) == ('ETH', 'BUSD')
+    assert (eth.tick_size, eth.step_size, eth.min_notional) == (0.01, 0.0001, 10.0)
+    assert (eth.tick_precision, eth.step_precision) == (2, 4)
+    bnb = info['BNBBUSD']
+    # NOTIONAL replaced MIN_NOTIONAL in newer API versions
+    assert (bnb.tick_precision, bnb.step_precision, bnb.min_notional) == (1, 3, 5.0)
+    shib = info['SHIBBUSD']
+    # Pairs without a notional filter have no minimum
+    assert (shib.tick_precision, shib.step_precision, shib.min_notional) == (8, 0, 0.0)
+
+
+def test_exchange_info_is_loaded_once_until_stale():
+    client = CannedClient({})
+    info = ExchangeInfo(client, ttl=3600)
+    assert info.symbol('ETHBUSD').step_size == 0.0001
+    assert info.symbol('BNBBUSD').tick_size == 0.1
+    assert client.calls == 1
+    info.loaded_at -= 3601
+    info.symbol('ETHBUSD')
+    assert client.calls == 2
+    with pytest.raises(KeyError):
+        info.symbol('XRPBUSD')
+
+
+def test_orders_are_rounded_to_filters():
+    client = CannedClient({'BUSD': '1234.56789000', 'ETH': '1.23456789', 'BNB': '1.00000000'})
+    user = User(client, verbose=False)
+    # Quote quantity of buys is rounded to tick size
+    user.market_order('ETHBUSD', 'BUY', 33, topup=False)
+    assert client.orders[-1] == ('ETHBUSD', 'BUY', 407.41)
+    # Base quantity of sells is rounded to step size, balance includes the bought 0.203705 ETH
+    user.market_order('ETHBUSD', 'SELL', 50, price=2000.0, topup=False)
+    assert client.orders[-1] == ('ETHBUSD', 'SELL', 0.7191)
+    user = User(CannedClient({'BUSD': '100.00000000', 'SHIB': '123456.78900000'}, price=0.00001), verbose=False)
+    user.market_order('SHIBBUSD', 'SELL', 100, price=0.00001, topup=False)
+    assert user.client.orders == [('SHIBBUSD', 'SELL', 123457.0)]
+
+
+def test_orders_below_min_notional_are_skipped():
+    client = CannedClient({'BUSD': '20.00000000', 'ETH': '0.00900000', 'BNB': '1.00000000'})
+    user = User(client, verbose=False)
+    # 9.99 BUSD buy and 0.0045 ETH sell worth 9 BUSD are below 10 BUSD
+    assert user.market_order('ETHBUSD', 'BUY', 49.95, topup=False) is False
+    assert user.market_order('ETHBUSD', 'SELL', 50, price=2000.0, topup=False) is False
+    assert client.orders == []
+    assert user.market_order('ETHBUSD', 'BUY', 50, topup=False) is not False
+
+
+def test_fills_update_cached_balances():
+    client = CannedClient({'BUSD': '1000.00000000', 'ETH': '0.50000000', 'BNB': '0.01000000'})
+    cache = BalanceCache(client)
+    info = symbols()['ETHBUSD']
+    # Nothing to update before balances are loaded
+    cache.update_from_order(client.fill('ETHBUSD', 'BUY', 0.1), info)
+    assert cache.loaded_at is None
+    assert cache.get('ETH')['free'] == 0.5
+    cache.update_from_order(client.fill('ETHBUSD', 'BUY', 0.1), info)
+    assert cache.get('ETH')['free'] == pytest.approx(0.6)
+    assert cache.get('BUSD')['free'] == pytest.approx(800.0)
+    assert cache.get('BNB')['free'] == pytest.approx(0.0099)
+    cache.update_from_order(client.fill('ETHBUSD', 'SELL', 0.25), info)
+    assert cache.get('ETH')['free'] == pytest.approx(0.35)
+    assert cache.get('BUSD')['free'] == pytest.approx(1300.0)
+    assert cache.get('BNB')['free'] == pytest.approx(0.0098)
+    # Unowned assets read as zero, fills and events don't reload balances
+    assert cache.get('XRP') == {'asset': 'XRP', 'free': 0.0, 'locked': 0.0}
+    assert client.calls == 1
+
+
+def test_invalidate_and_stream_events():
+    client = CannedClient({'BUSD': '1000.00000000', 'ETH': '0.50000000'})
+    cache = BalanceCache(client)
+    cache.get('BUSD')
+    cache.handle_event({'e': 'outboundAccountPosition', 'B': [{'a': 'BUSD', 'f': '900.00000000', 'l': '100.00000000'}]})
+    cache.handle_event({'e': 'executionReport', 'B': [{'a': 'ETH', 'f': '0', 'l': '0'}]})
+    assert cache.get('BUSD') == {'asset': 'BUSD', 'free': 900.0, 'locked': 100.0}
+    assert cache.get('ETH')['free'] == 0.5
+    cache.invalidate()
+    assert cache.get('BUSD')['free'] == 1000.0
+    assert client.calls == 2
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from synthetic import synthetic_frame
+import indicators
+from strategy import Strategy
+
+# Values btalib 1.0.0 computed on synthetic_frame(200).close at rows 60, 120 and 199,
+# with the index of the first valid value
+ROWS = [60, 120, 199]
+EXPECTED = {
+    'sma12': ([1005.635362266806, 1006.9924671672975, 1003.7432746297189], 11),
+    'sma50': ([999.383664756613, 1008.2784587907549, 1005.2681111034511], 49),
+    'ema12': ([1004.648370910562, 1007.9632389302881, 1003.6578162353937], 11),
+    'rsi15': ([57.58483117740188, 62.22249259781724, 43.20714631615145], 15),
+    'macd': ([1.7845202283220942, 0.1300518516095508, -0.7667516560222793], 25),
+    'macd_signal': ([1.9681931332056999, -0.324676621537669, -0.6552541940167345], 33),
+    'macd_histogram': ([-0.18367290488360566, 0.4547284731472198, -0.11149746200554489], 33),
+}
+
+
+@pytest.fixture(scope='module')
+def closes():
+    return synthetic_frame(200).close.to_numpy()
+
+
+def batch_lines(closes):
+    line, signal, histogram = indicators.macd(closes, 12, 26, 9)
+    return {'sma12': indicators.sma(closes, 12), 'sma50': indicators.sma(closes, 50), 'ema12': indicators.ema(closes, 12),
+            'rsi15': indicators.rsi(closes, 15), 'macd': line, 'macd_signal': signal, 'macd_histogram': histogram}
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_batch_indicators_match_btalib(closes, name):
+    values, first = EXPECTED[name]
+    line = batch_lines(closes)[name]
+    assert np.isnan(line[:first]).all()
+    assert not np.isnan(line[first:]).any()
+    assert line[ROWS] == pytest.approx(values, rel=1e-12)
+
+
+def test_streaming_indicators_match_batch(closes):
+    lines = batch_lines(closes)
+    sma, ema = indicators.StreamingSMA(12), indicators.StreamingEMA(12)
+    rsi, macd = indicators.StreamingRSI(15), indicators.StreamingMACD(12, 26, 9)
+    streamed = {name: [] for name in lines if name != 'sma50'}
+    for close in closes:
+        streamed['sma12'].append(sma.update(close))
+        streamed['ema12'].append(ema.update(close))
+        streamed['rsi15'].append(rsi.update(close))
+        line, signal, histogram = macd.update(close)
+        streamed['macd'].append(line)
+        streamed['macd_signal'].append(signal)
+        streamed['macd_histogram'].append(histogram)
+    for name, values in streamed.items():
+        np.testing.assert_allclose(values, lines[name], rtol=1e-9, err_msg=name)
+
+
+'''
+Signals of the loops Strategy.calculate_strategy ran before it was vectorized,
+as (date, indicator value, signal, closing price) rows
+'''
+def reference_signals(df, indicator):
+    rows = []
+    # Positional access, the frame is indexed by date
+    dates, close = df.index, df.close.to_numpy()
+    if indicator == 'RSI':
+        rsi = df.rsi.to_numpy()
+        for i in range(len(df)):
+            if not np.isnan(rsi[i]):
+                if rsi[i] > 70:
+                    rows.append((dates[i], rsi[i], 'SELL', close[i]))
+                elif rsi[i] < 30:
+                    rows.append((dates[i], rsi[i], 'BUY', close[i]))
+        return rows
+    fast, slow = ('macd', 'macdSignal') if indicator == 'MACD' else ('12sma', '50sma')
+    fast, slow = df[fast].to_numpy(), df[slow].to_numpy()
+    greater = False
+    for i in range(len(df)):
+        if not np.isnan(fast[i]) and not np.isnan(slow[i]):
+            if fast[i] > slow[i] and not greater:
+                rows.append((dates[i], fast[i], 'BUY', close[i]))
+                greater = True
+            elif fast[i] <= slow[i] and greater:
+                rows.append((dates[i], fast[i], 'SELL', close[i]))
+                greater = False
+    return rows
+
+
+@pytest.mark.parametrize('indicator,strategy', [('MACD', 'CROSSOVER'), ('SMA', 'CROSSOVER'), ('RSI', 'OVERBOUGHT')])
+def test_strategy_signals_match_original_loops(indicator, strategy):
+    st = Strategy(indicator, strategy, 'ETHUSDT', '1m', synthetic_frame(5000, seed=3))
+    result = [(np.datetime64(date), value, signal, close) for date, value, signal, close in st.get_result()]
+    expected = [(np.datetime64(date), value, signal, close) for date, value, signal, close in reference_signals(st.get_dataframe(), indicator)]
+    assert len(result) > 10
+    assert result == expected
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pandas as pd
+from synthetic import synthetic_klines, FakeClient, START_TIME
+from kline_store import KlineStore, klines_to_frame, PAGE_LIMIT, COLUMNS
+
+MINUTE = 60000
+
+
+class PagingClient(FakeClient):
+    '''
+    Fake client honoring endTime and limit like get_klines does, requests are recorded
+    '''
+    def __init__(self, klines):
+        super().__init__(klines)
+        self.requests = []
+
+    def get_klines(self, symbol, interval, limit=500, startTime=None, endTime=None):
+        self.requests.append((startTime, endTime, limit))
+        rows = [line for line in self.klines if (startTime is None or line[0] >= startTime) and (endTime is None or line[0] <= endTime)]
+        return rows[:limit]
+
+
+def test_klines_to_frame():
+    klines = synthetic_klines(3)
+    df = klines_to_frame(klines)
+    assert list(df.columns) == ['open', 'high', 'low', 'close']
+    assert df.index.name == 'date'
+    assert df.index[0] == pd.Timestamp(START_TIME, unit='ms')
+    assert df.close.tolist() == [float(line[4]) for line in klines]
+    assert klines_to_frame(klines, volume=True).volume.tolist() == [float(line[5]) for line in klines]
+    assert len(klines_to_frame([])) == 0
+
+
+def test_update_downloads_page_by_page(tmp_path):
+    klines = synthetic_klines(2*PAGE_LIMIT + 500)
+    client = PagingClient(klines)
+    store = KlineStore(str(tmp_path))
+    assert store.update(client, 'ETHUSDT', '1m', start=START_TIME) == len(klines)
+    assert len(client.requests) == 3
+    # Each page starts after the last kline of the previous one
+    assert [start for start, _, _ in client.requests] == [START_TIME + i*PAGE_LIMIT*MINUTE for i in range(3)]
+    arrays = store.load_arrays('ETHUSDT', '1m')
+    assert arrays['open_time'].tolist() == [line[0] for line in klines]
+    assert np.array_equal(arrays['close'], [float(line[4]) for line in klines])
+
+
+def test_update_only_appends_new_klines(tmp_path):
+    klines = synthetic_klines(1500)
+    store = KlineStore(str(tmp_path))
+    client = PagingClient(klines[:1000])
+    store.update(client, 'ETHUSDT', '1m', start=START_TIME)
+    path = store.path('ETHUSDT', '1m', 'close')
+    before = open(path, 'rb').read()
+    client = PagingClient(klines)
+    assert store.update(client, 'ETHUSDT', '1m') == 500
+    # Download resumes after the last stored kline and old bytes are kept
+    assert client.requests[0][0] == klines[999][0] + 1
+    assert open(path, 'rb').read()[:len(before)] == before
+    # Klines that are already stored are skipped
+    assert store.append('ETHUSDT', '1m', klines[1200:]) == 0
+    assert store.length('ETHUSDT', '1m') == 1500
+
+
+def test_interrupted_append_is_repaired(tmp_path):
+    klines = synthetic_klines(100)
+    store = KlineStore(str(tmp_path))
+    store.append('ETHUSDT', '1m', klines[:50])
+    # Interrupted append left a partial close column
+    with open(store.path('ETHUSDT', '1m', 'close'), 'ab') as f:
+        f.write(b'\x00'*12)
+    assert store.length('ETHUSDT', '1m') == 50
+    store.append('ETHUSDT', '1m', klines[50:])
+    for column, dtype in COLUMNS.items():
+        assert os.path.getsize(store.path('ETHUSDT', '1m', column)) == 100*dtype.itemsize
+    assert store.load_arrays('ETHUSDT', '1m')['close'].tolist() == [float(line[4]) for line in klines]
+
+
+def test_load_date_range(tmp_path):
+    klines = synthetic_klines(24*60)
+    store = KlineStore(str(tmp_path))
+    store.append('ETHUSDT', '1m', klines)
+    start, end = '2021-01-01 01:00', '2021-01-01 02:00'
+    arrays = store.load_arrays('ETHUSDT', '1m', start, end)
+    # Both ends are inclusive
+    assert arrays['open_time'][0] == START_TIME + 60*MINUTE
+    assert arrays['open_time'][-1] == START_TIME + 120*MINUTE
+    assert len(arrays['close']) == 61
+    assert isinstance(arrays['close'], np.memmap)
+    df = store.load_frame('ETHUSDT', '1m', start, end)
+    expected = klines_to_frame(klines[60:121], volume=True)
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    assert len(store.load_arrays('BTCUSDT', '1m')['close']) == 0
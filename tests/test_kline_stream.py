@@ -0,0 +1,140 @@
+import time
+import pytest
+from synthetic import synthetic_klines, FakeClient
+from user import User
+from trade_bot import TradeBot
+from kline_stream import KlineStream, ReplaySocketManager
+
+MINUTE = 60000
+
+
+'''
+Returns n one minute klines that have all closed by now
+'''
+def closed_klines(n):
+    start = (int(time.time()*1000)//MINUTE - n - 1)*MINUTE
+    return synthetic_klines(n, start_time=start)
+
+
+'''
+Returns a bot seeded from the first seeded klines, REST serves all klines afterwards.
+Open times of klines fed to on_kline are collected in bot.fed.
+'''
+def seeded_bot(klines, seeded=300):
+    client = FakeClient(klines[:seeded])
+    bot = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False)
+    assert bot.seed_indicators()
+    client.klines = klines
+    bot.fed = []
+    on_kline = bot.on_kline
+    bot.on_kline = lambda open_time, *args, **kwargs: (bot.fed.append(open_time), on_kline(open_time, *args, **kwargs))
+    bot.trade = lambda *args: None
+    return bot
+
+
+'''
+Returns a KlineStream replaying given socket messages
+'''
+def replay_stream(messages):
+    return KlineStream(None, 'ETHUSDT', '1m', socket_manager=ReplaySocketManager(messages))
+
+
+def kline_messages(klines):
+    return ReplaySocketManager.from_klines('ETHUSDT', '1m', klines).messages
+
+
+'''
+Replays the stream to its end and processes every queued event
+'''
+def drain(bot, stream):
+    stream.start()
+    stream.manager.join(5)
+    while not stream.queue.empty():
+        bot.process_stream(stream)
+
+
+def test_stream_feeds_closed_klines_in_order():
+    klines = closed_klines(320)
+    bot = seeded_bot(klines)
+    drain(bot, replay_stream(kline_messages(klines[300:])))
+    assert bot.fed == [line[0] for line in klines[300:]]
+
+
+def test_stream_skips_klines_already_processed():
+    klines = closed_klines(320)
+    bot = seeded_bot(klines)
+    # Socket resends klines the bot was seeded with
+    drain(bot, replay_stream(kline_messages(klines[290:310])))
+    assert bot.fed == [line[0] for line in klines[300:310]]
+
+
+def test_stream_gap_is_backfilled_from_rest():
+    klines = closed_klines(320)
+    bot = seeded_bot(klines)
+    drain(bot, replay_stream(kline_messages(klines[300:303] + klines[310:])))
+    assert bot.fed == [line[0] for line in klines[300:]]
+
+
+def test_stream_error_restarts_socket_and_backfills():
+    klines = closed_klines(320)
+    bot = seeded_bot(klines)
+    stream = replay_stream(kline_messages(klines[300:305]) + [{'e': 'error', 'm': 'gave up reconnecting'}])
+    restarts = []
+    restart = stream.restart
+    stream.restart = lambda: (restarts.append(True), restart())
+    drain(bot, stream)
+    assert restarts == [True]
+    assert bot.fed == [line[0] for line in klines[300:]]
+
+
+def test_run_stops_stream_on_errors():
+    klines = closed_klines(320)
+    bot = seeded_bot(klines)
+    stream = replay_stream(kline_messages(klines[300:]))
+
+    def fail(stream):
+        raise RuntimeError('boom')
+    bot.process_stream = fail
+    with pytest.raises(RuntimeError):
+        bot.run(stream=stream)
+    assert stream.manager.closed.is_set()
+
+
+'''
+Returns a bot seeded from the first 300 of n klines, the last of which closed
+closed_ago klines before now. REST serves all klines afterwards.
+'''
+def caught_up_bot(n, seed, closed_ago=0):
+    start = (int(time.time()*1000)//MINUTE - n - closed_ago)*MINUTE
+    klines = synthetic_klines(n, seed=seed, start_time=start)
+    client = FakeClient(klines[:300])
+    bot = TradeBot(User(client, verbose=False), 'ETHUSDT', '1m', '1h', verbose=False)
+    assert bot.seed_indicators()
+    client.klines = klines
+    return bot, klines
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_catch_up_places_at_most_one_order(seed):
+    # Gap holds several crossovers, each one used to be traded at today's price
+    bot, klines = caught_up_bot(600, seed)
+    bot.backfill()
+    assert bot.last_kline_time == klines[-1][0]
+    assert len(bot.signals) > 2
+    assert len(bot.trades) <= 1
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_catch_up_without_live_kline_places_no_order(seed):
+    bot, klines = caught_up_bot(600, seed, closed_ago=10)
+    bot.backfill()
+    assert bot.last_kline_time == klines[-1][0]
+    assert len(bot.trades) == 0
+
+
+def test_catch_up_trades_signal_of_newest_live_kline():
+    # Newest of these klines is a BUY crossover with RSI inside a buy tier
+    bot, klines = caught_up_bot(495, 0)
+    bot.backfill()
+    assert bot.signals.last()[0] == klines[-1][0] + MINUTE
+    assert [record.side for record in bot.trades] == ['BUY']
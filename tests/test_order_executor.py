@@ -0,0 +1,108 @@
+from requests import exceptions
+from binance.exceptions import BinanceAPIException
+from synthetic import FakeClient
+from conftest import MissingOrder
+from user import User
+from order_executor import OrderExecutor
+
+
+class OrderClient(FakeClient):
+    '''
+    Fake client trading ETHUSDT and BTCUSDT that remembers orders by client order id.
+    Orders of symbols in timeouts raise ReadTimeout after being placed, that many times.
+    '''
+    def __init__(self, timeouts=None):
+        super().__init__()
+        self.timeouts = dict(timeouts or {})
+        self.placed = {}
+        self.log = []
+
+    def get_exchange_info(self):
+        info = super().get_exchange_info()
+        info['symbols'].append(dict(info['symbols'][0], symbol='BTCUSDT', baseAsset='BTC'))
+        return info
+
+    def fill(self, symbol, side, quantity):
+        order = super().fill(symbol, side, quantity)
+        self.log.append((symbol, side))
+        return order
+
+    def order_market_buy(self, symbol, quoteOrderQty=None, quantity=None, **kwargs):
+        return self.place(symbol, super().order_market_buy(symbol, quoteOrderQty, quantity), kwargs)
+
+    def order_market_sell(self, symbol, quantity, **kwargs):
+        return self.place(symbol, super().order_market_sell(symbol, quantity), kwargs)
+
+    def place(self, symbol, order, kwargs):
+        if 'newClientOrderId' in kwargs:
+            self.placed[kwargs['newClientOrderId']] = order
+        if self.timeouts.get(symbol):
+            self.timeouts[symbol] -= 1
+            raise exceptions.ReadTimeout('timed out')
+        return order
+
+    def get_order(self, symbol, origClientOrderId):
+        if origClientOrderId in self.placed:
+            return self.placed[origClientOrderId]
+        raise BinanceAPIException(MissingOrder())
+
+
+def collect():
+    results = []
+    return results, lambda request, order: results.append((request.symbol, request.side, request.attempts, order != False))
+
+
+def test_orders_of_a_pair_run_in_submission_order():
+    client = OrderClient()
+    executor = OrderExecutor(User(client), topup=None)
+    executor.start()
+    results, callback = collect()
+    for side in ('BUY', 'SELL', 'BUY', 'SELL'):
+        executor.submit('ETHUSDT', side, 10, 1000.0, callback=callback)
+    executor.stop()
+    assert [side for _, side, _, _ in results] == ['BUY', 'SELL', 'BUY', 'SELL']
+    assert [side for _, side in client.log] == ['BUY', 'SELL', 'BUY', 'SELL']
+
+
+def test_timed_out_order_is_not_placed_twice():
+    client = OrderClient(timeouts={'ETHUSDT': 1})
+    executor = OrderExecutor(User(client), backoff=0.01, topup=None)
+    executor.start()
+    results, callback = collect()
+    executor.submit('ETHUSDT', 'BUY', 10, callback=callback)
+    executor.submit('ETHUSDT', 'SELL', 10, 1000.0, callback=callback)
+    executor.stop()
+    # Retry found the first order by its client order id
+    assert results == [('ETHUSDT', 'BUY', 2, True), ('ETHUSDT', 'SELL', 1, True)]
+    assert client.log == [('ETHUSDT', 'BUY'), ('ETHUSDT', 'SELL')]
+
+
+def test_backoff_does_not_hold_a_worker():
+    client = OrderClient(timeouts={'ETHUSDT': 1})
+    executor = OrderExecutor(User(client), workers=1, topup=None)
+    # Fixed backoff long enough for the other pair to run meanwhile
+    executor.retry_delay = lambda attempt: 0.5
+    executor.start()
+    results, callback = collect()
+    executor.submit('ETHUSDT', 'BUY', 10, callback=callback)
+    executor.submit('BTCUSDT', 'BUY', 10, callback=callback)
+    executor.stop()
+    # Only worker executed BTCUSDT while ETHUSDT waited for its retry
+    assert [symbol for symbol, _, _, _ in results] == ['BTCUSDT', 'ETHUSDT']
+
+
+def test_unexpected_errors_fail_the_request_and_keep_workers_running():
+    client = OrderClient()
+    executor = OrderExecutor(User(client), workers=1)
+    executor.user.topup_bnb = lambda *args: 1/0
+    executor.start()
+    results, callback = collect()
+    # Unknown pair raises a KeyError from exchange info
+    executor.submit('XRPUSDT', 'BUY', 10, callback=callback)
+
+    def failing_callback(request, order):
+        raise RuntimeError('callback failed')
+    executor.submit('ETHUSDT', 'BUY', 10, callback=failing_callback)
+    executor.submit('ETHUSDT', 'SELL', 10, 1000.0, callback=callback)
+    executor.stop()
+    assert results == [('XRPUSDT', 'BUY', 1, False), ('ETHUSDT', 'SELL', 1, True)]
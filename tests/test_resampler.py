@@ -0,0 +1,105 @@
+import time
+import numpy as np
+import pytest
+from synthetic import synthetic_klines, aggregate_klines, FakeClient
+from user import User
+from trade_bot import TradeBot
+from resampler import Resampler, TrendFilter
+from indicators import StreamingEMA
+
+MINUTE = 60000
+HOUR = 60*MINUTE
+
+
+def ohlcv(line):
+    return [line[0]] + [float(value) for value in line[1:6]]
+
+
+def test_resampler_builds_bars_like_binance():
+    # Last 5m and 1h bars are in progress
+    klines = synthetic_klines(3*60 + 7)
+    resampler = Resampler(['5m', '1h'], '1m')
+    bars = {'5m': [], '1h': []}
+    for interval in bars:
+        resampler.on_bar(interval, lambda interval, bar: bars[interval].append(list(bar)))
+    for line in klines:
+        resampler.update(*ohlcv(line))
+    for interval, ms in (('5m', 5*MINUTE), ('1h', HOUR)):
+        # Bar in progress isn't emitted
+        expected = [ohlcv(bar) for bar in aggregate_klines(klines, ms)[:-1]]
+        np.testing.assert_allclose(bars[interval], expected, rtol=1e-12, err_msg=interval)
+
+
+def test_resampler_emits_bar_missing_klines():
+    klines = synthetic_klines(120)
+    resampler = Resampler(['1h'], '1m')
+    for line in klines[:30]:
+        assert resampler.update(*ohlcv(line)) == []
+    # Rest of the first hour is missing
+    completed = resampler.update(*ohlcv(klines[90]))
+    assert [(interval, bar[0]) for interval, bar in completed] == [('1h', klines[0][0])]
+    assert completed[0][1][4] == float(klines[29][4])
+
+
+def test_trend_filter_blocks_buys_until_warm():
+    trend = TrendFilter('1h', 3)
+    assert not trend.allows('BUY', 1000.0)
+    assert trend.allows('SELL', 1000.0)
+    for close in (10.0, 11.0, 12.0):
+        trend.on_bar('1h', [0, close, close, close, close, 0.0])
+    assert trend.ready()
+    assert trend.allows('BUY', 12.0)
+    assert not trend.allows('BUY', 10.0)
+
+
+'''
+Returns n one minute klines, the last of which closed just now
+'''
+def live_klines(n):
+    start = (int(time.time()*1000)//MINUTE - n)*MINUTE
+    return synthetic_klines(n, start_time=start)
+
+
+def test_trends_are_seeded_from_their_own_intervals():
+    klines = live_klines(6000)
+    client = FakeClient(klines)
+    bot = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False, trend_intervals=['1h', '4h'], trend_period=10)
+    assert bot.seed_indicators()
+    now = time.time()*1000
+    for trend, ms in zip(bot.trends, (HOUR, 4*HOUR)):
+        assert trend.ready()
+        # Client returned 2 periods and one bar, the open bar is being built
+        bars = aggregate_klines(klines, ms)[-21:]
+        ema = StreamingEMA(10)
+        for bar in bars:
+            if bar[6] < now:
+                ema.update(float(bar[4]))
+        assert trend.ema.value == pytest.approx(ema.value, rel=1e-12)
+        building = bot.resampler.bars[trend.interval]
+        assert (building[0] if building else None) == (bars[-1][0] if bars[-1][6] >= now else None)
+
+
+def test_seeded_bar_is_completed_by_later_klines():
+    klines = live_klines(600)
+    client = FakeClient(klines)
+    bot = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False, trend_intervals=['1h'], trend_period=5)
+    assert bot.seed_indicators()
+    trend = bot.trends[0]
+    value = trend.ema.value
+    # Klines up to the end of the hour in progress complete its bar
+    next_time = klines[-1][0] + MINUTE
+    later = synthetic_klines(60, seed=1, start_time=next_time)
+    for line in later[:(HOUR - next_time % HOUR)//MINUTE]:
+        assert trend.ema.value == value
+        bot.on_kline(*ohlcv(line), trade=False)
+    assert bot.resampler.bars['1h'] is None
+    assert trend.ema.value == pytest.approx(value + 2/6*(bot.last_close - value), rel=1e-12)
+
+
+def test_new_listing_trend_warns_and_blocks_buys(capsys):
+    client = FakeClient(live_klines(4*60))
+    bot = TradeBot(User(client), 'ETHUSDT', '1m', '1h', verbose=False, trend_intervals=['1h'])
+    assert bot.seed_indicators()
+    assert 'BUYs wait' in capsys.readouterr().out
+    assert not bot.trends[0].ready()
+    assert not bot.trends[0].allows('BUY', 1e9)
@@ -0,0 +1,153 @@
+import hashlib
+import hmac
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qsl
+import pytest
+from binance.exceptions import BinanceAPIException
+import rest_client
+from rest_client import RateLimitedClient
+from rest_benchmark import MockBinance, mock_client
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockBinance(latency=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+'''
+Returns a client of the mock server with given attributes, the server is reset
+after the client's construction ping
+'''
+def client_of(server, api_secret=None, **attrs):
+    if api_secret is None:
+        client = mock_client(RateLimitedClient, server)
+    else:
+        client = type('MockRateLimitedClient', (RateLimitedClient,), {'API_URL': server.url})('key', api_secret)
+    for name, value in attrs.items():
+        setattr(client, name, value)
+    server.reset()
+    return client
+
+
+class FakeClock:
+    '''
+    Stands in for the time module in rest_client, sleeping moves the clock forward
+    '''
+    def __init__(self):
+        self.now = time.time()
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rest_client, 'time', types.SimpleNamespace(time=clock.time, sleep=clock.sleep))
+    return clock
+
+
+def test_waits_for_next_minute_near_weight_limit(server, clock):
+    client = client_of(server, weight_limit=100, reserve=10)
+    # Binance reports weight spent by other clients of the account
+    server.script = [(200, {'x-mbx-used-weight-1m': '95'})]
+    client.get_klines(symbol='ETHUSDT', interval='1m')
+    assert clock.sleeps == []
+    client.get_klines(symbol='ETHUSDT', interval='1m')
+    assert len(clock.sleeps) == 1
+    assert 0 < clock.sleeps[0] <= 60
+    assert round(clock.now) % 60 == 0
+    assert server.requests == 2
+
+
+@pytest.mark.parametrize('status', [429, 418])
+def test_rate_limit_waits_retry_after(server, clock, status):
+    client = client_of(server)
+    start = clock.now
+    server.script = [(status, {'Retry-After': '7'})]
+    assert len(client.get_klines(symbol='ETHUSDT', interval='1m')) == 500
+    # Every request waits until then, not only the retried one
+    assert client.blocked_until == start + 7
+    assert clock.sleeps == [7]
+    assert server.requests == 2
+
+
+def test_retries_get_requests_on_server_errors(server):
+    client = client_of(server)
+    server.script = [(503, {}), (502, {})]
+    assert len(client.get_klines(symbol='ETHUSDT', interval='1m')) == 500
+    assert server.requests == 3
+    # Gives up after the last retry
+    server.reset()
+    server.script = [(503, {})]*(client.retries + 1)
+    with pytest.raises(BinanceAPIException) as e:
+        client.get_klines(symbol='ETHUSDT', interval='1m')
+    assert e.value.status_code == 503
+    assert server.requests == client.retries + 1
+
+
+def test_orders_are_never_retried(server):
+    client = client_of(server, 'secret')
+    server.script = [(503, {})]
+    with pytest.raises(BinanceAPIException):
+        client.order_market_buy(symbol='ETHUSDT', quantity=1)
+    assert server.requests == 1
+
+
+def test_identical_unsigned_gets_are_coalesced(server):
+    client = client_of(server)
+    server.latency = 0.3
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: client.get_exchange_info(), range(8)))
+    finally:
+        server.latency = 0
+    assert server.requests == 1
+    assert all(result == results[0] for result in results)
+    # Each caller got its own copy
+    assert len({id(result) for result in results}) == 8
+
+
+def test_signed_gets_are_not_coalesced(server):
+    client = client_of(server, 'secret')
+    server.latency = 0.3
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: client.get_account(), range(4)))
+    finally:
+        server.latency = 0
+    assert server.requests == 4
+
+
+def test_signed_requests_are_signed_like_binance_expects(server):
+    client = client_of(server, 'secret')
+    client.get_account(recvWindow=5000)
+    query = urlparse(server.log[-1]).query
+    params = dict(parse_qsl(query))
+    assert params['recvWindow'] == '5000'
+    assert abs(int(params['timestamp']) - time.time()*1000) < 5000
+    # Signature covers the query string before it
+    unsigned = query[:query.index('&signature=')]
+    assert params['signature'] == hmac.new(b'secret', unsigned.encode(), hashlib.sha256).hexdigest()
+
+
+def test_responses_are_kept_per_thread(server):
+    client = client_of(server)
+    client.get_klines(symbol='ETHUSDT', interval='1m')
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(client.response))
+    thread.start()
+    thread.join()
+    assert responses == [None]
+    assert client.response.status_code == 200
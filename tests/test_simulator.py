@@ -0,0 +1,28 @@
+import pytest
+from synthetic import synthetic_frame, synthetic_klines
+from kline_store import KlineStore
+from simulator import replay
+
+
+def test_replay_needs_klines_after_warmup():
+    with pytest.raises(ValueError, match='warmup'):
+        replay(synthetic_frame(100), 'ETHUSDT', 'ETH', 'USDT')
+
+
+def test_replay_is_silent(capsys):
+    # Without BNB every order tops it up
+    result = replay(synthetic_frame(3000), 'ETHUSDT', 'ETH', 'USDT', bnb_balance=0)
+    assert result.final_equity > 0
+    assert capsys.readouterr().out == ''
+
+
+def test_replay_orders_follow_stored_kline_times(tmp_path):
+    store = KlineStore(str(tmp_path))
+    klines = synthetic_klines(3000, seed=3)
+    store.append('ETHUSDT', '1m', klines)
+    result = replay(store.load_frame('ETHUSDT', '1m'), 'ETHUSDT', 'ETH', 'USDT')
+    open_times = {line[0] for line in klines[300:]}
+    orders = [order for order in result.orders if order['symbol'] == 'ETHUSDT']
+    assert orders
+    # Orders are made when their kline closes
+    assert all(order['transactTime'] - 60000 in open_times for order in orders)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from synthetic import synthetic_frame
+from signals import BUY, SELL, HOLD
+from indicator_cache import IndicatorCache
+from strategies import compile_strategy, combine_signals, signal_state
+
+
+def test_signal_state_holds_last_signal():
+    codes = [HOLD, BUY, HOLD, HOLD, SELL, HOLD, SELL, BUY]
+    assert signal_state(codes).tolist() == [HOLD, BUY, BUY, BUY, SELL, SELL, SELL, BUY]
+    assert signal_state([]).tolist() == []
+
+
+def test_combine_any_holds_disagreements():
+    codes = [[BUY, HOLD, SELL, BUY, HOLD],
+             [HOLD, HOLD, SELL, SELL, BUY]]
+    assert combine_signals(codes, 'any').tolist() == [BUY, HOLD, SELL, HOLD, BUY]
+
+
+def test_combine_all_buys_on_agreement_and_sells_on_any():
+    codes = [[BUY, HOLD, HOLD, HOLD, SELL, HOLD, BUY, HOLD],
+             [HOLD, HOLD, BUY, HOLD, HOLD, HOLD, HOLD, SELL]]
+    # Second strategy's BUY completes the agreement, first one's SELL breaks it,
+    # first one's BUY restores it until the second one sells
+    assert combine_signals(codes, 'all').tolist() == [HOLD, HOLD, BUY, HOLD, SELL, HOLD, BUY, SELL]
+
+
+def test_combine_single_strategy_and_unknown_mode():
+    codes = np.array([BUY, HOLD, SELL], dtype=np.int8)
+    assert combine_signals([codes], 'all').tolist() == codes.tolist()
+    with pytest.raises(ValueError):
+        combine_signals([codes, codes], 'majority')
+
+
+'''
+Combination loop over the last signal of each strategy, signals are made where
+the combined state changes
+'''
+def reference_combine(codes, mode):
+    codes = np.asarray(codes)
+    last = [HOLD]*len(codes)
+    state, combined = HOLD, []
+    for column in codes.T:
+        if mode == 'any':
+            buy, sell = BUY in column, SELL in column
+            combined.append(BUY if buy and not sell else SELL if sell and not buy else HOLD)
+            continue
+        last = [code if code != HOLD else previous for code, previous in zip(column, last)]
+        new = BUY if all(code == BUY for code in last) else SELL if SELL in last else HOLD
+        combined.append(new if new != state else HOLD)
+        state = new
+    return combined
+
+
+@pytest.mark.parametrize('mode', ['all', 'any'])
+def test_compiled_strategies_combine_like_loop(mode):
+    closes = synthetic_frame(5000, seed=5).close.to_numpy()
+    parts = [('MACD', 'CROSSOVER'), ('SMA', 'CROSSOVER', {'fast': 5, 'slow': 30}), ('RSI', 'OVERBOUGHT')]
+    compiled = compile_strategy(*parts, mode=mode)
+    single = [compile_strategy(part).evaluate(closes) for part in parts]
+    codes = compiled.evaluate(closes)
+    assert codes.tolist() == reference_combine(single, mode)
+    assert (codes == BUY).any() and (codes == SELL).any()
+
+
+def test_compiled_strategies_share_indicators():
+    closes = synthetic_frame(500).close.to_numpy()
+    compiled = compile_strategy(('MACD', 'CROSSOVER'), ('MACD', 'CROSSOVER', {'pfast': 12}), ('SMA', 'CROSSOVER'))
+    assert len(compiled.lines(closes)) == 2
+
+
+def test_shared_cache_needs_dataset_key():
+    first, second = (synthetic_frame(500, seed=seed).close.to_numpy() for seed in (1, 2))
+    compiled = compile_strategy(('MACD', 'CROSSOVER'))
+    cache = IndicatorCache()
+    compiled.evaluate(first, cache)
+    # Second closes without a key aren't served the first ones' indicators
+    assert compiled.evaluate(second, cache).tolist() == compiled.evaluate(second).tolist()
+    compiled.evaluate(first, cache, 'first')
+    assert compiled.evaluate(second, cache, 'second').tolist() == compiled.evaluate(second).tolist()
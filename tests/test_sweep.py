@@ -0,0 +1,46 @@
+from multiprocessing import shared_memory
+import pytest
+from synthetic import synthetic_frame
+import sweep
+from sweep import ParameterSweep, grid, random_configs, valid_config, strategy_signals
+from backtest import run_backtest
+
+
+def test_grid_and_random_configs_are_valid():
+    configs = grid()
+    assert len(configs) == len({repr(config) for config in configs})
+    assert all(valid_config(params) for _, _, params in configs)
+    sampled = random_configs(n=20, seed=1)
+    assert len(sampled) == 20
+    assert all(valid_config(params) for _, _, params in sampled)
+    assert sampled == random_configs(n=20, seed=1)
+
+
+def test_pooled_sweep_matches_in_process_backtests(monkeypatch):
+    klines = {'ETHUSDT': synthetic_frame(3000, seed=1), 'BTCUSDT': synthetic_frame(2000, seed=2).close.to_numpy()}
+    configs = random_configs(n=6, seed=0) + [('MACD', 'CROSSOVER', {'pfast': 12, 'pslow': 26, 'psignal': 9})]
+    # Shared memory blocks of the run are recorded to check they're removed
+    blocks = []
+
+    class RecordedCloses(sweep.SharedCloses):
+        def __init__(self, closes):
+            super().__init__(closes)
+            blocks.extend(name for name, _ in self.specs.values())
+    monkeypatch.setattr(sweep, 'SharedCloses', RecordedCloses)
+
+    results = ParameterSweep(klines, workers=2).run(configs)
+    assert len(results) == 2*len(configs)
+    assert results == sorted(results, key=lambda r: (r['final_balance'], r['success_rate']), reverse=True)
+    for result in results:
+        data = klines[result['symbol']]
+        closes = getattr(data, 'close', data)
+        codes = strategy_signals(closes, result['indicator'], result['strategy'], result['params'])
+        expected = run_backtest(closes, codes, 1000, fee=sweep.TRADING_FEE)
+        assert result['final_balance'] == pytest.approx(expected.final_balance, rel=1e-12)
+        assert result['success_rate'] == expected.success_rate
+        assert result['trades'] == expected.sells
+        assert result['max_drawdown'] == pytest.approx(expected.max_drawdown, rel=1e-12)
+    assert len(blocks) == 2
+    for name in blocks:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,29 @@
+import threading
+from signals import BUY, SELL
+from trade_log import RingBuffer, TradeRecord, TRADE_DTYPE
+
+
+def test_ring_buffer_keeps_newest_records():
+    buffer = RingBuffer(3, TRADE_DTYPE, TradeRecord)
+    assert buffer.last() is None
+    for i in range(5):
+        buffer.append(i, BUY, 1000.0 + i, 1.0, 1000.0 + i)
+    assert len(buffer) == 3
+    assert [record.time for record in buffer] == [2, 3, 4]
+    assert buffer.last().price == 1004.0
+
+
+def test_ring_buffer_appends_from_threads():
+    buffer = RingBuffer(10000, TRADE_DTYPE, TradeRecord)
+
+    def append(start):
+        for i in range(start, start + 2000):
+            buffer.append(i, SELL, 1.0, 1.0, 1.0)
+    threads = [threading.Thread(target=append, args=(i*2000,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # No append was lost or overwrote another
+    assert buffer.count == 8000
+    assert sorted(buffer.array()['time'].tolist()) == list(range(8000))